@@ -0,0 +1,254 @@
+# als_training.py
+#
+# Collaborative-filtering (ALS-style matrix factorization) training, moved
+# out of the notebook.
+#
+# Interactions come from the columnar store written by interaction_store.py,
+# already de-duplicated and sorted, and are memory-mapped rather than loaded
+# into a DataFrame. Ids are coded with dense lookup tables, the 70/15/15
+# split is a row-index permutation, and batches are gathered from the coded
+# columns by a shuffled index sampler.
+#
+#   python interaction_store.py data/synthetic_profiles_with_reviews.csv data/interactions
+#   python als_training.py --store data/interactions
+
+import argparse
+import copy
+import logging
+import os
+import pickle
+from typing import Dict, Tuple
+import numpy as np
+import torch
+from torch import nn, optim
+
+from hybrid_training import ShuffledBatchSampler
+from interaction_store import factorize_ids, load_interaction_store, log_peak_rss, write_columns
+
+# -----------------------------
+# Configuration Section
+# -----------------------------
+class ALSConfig:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    LOG_FILE = os.path.join(BASE_DIR, 'logs', 'collaborative_filtering.log')
+    INTERACTION_STORE_PATH = os.path.join(BASE_DIR, 'data', 'interactions')
+    TEST_STORE_PATH = os.path.join(BASE_DIR, 'data', 'als_test_interactions')
+    ALS_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'als_model.pth')
+    USER_MAPPING_PATH = os.path.join(BASE_DIR, 'mappings', 'user_id_mapping.pkl')
+    STRAIN_MAPPING_PATH = os.path.join(BASE_DIR, 'mappings', 'strain_id_mapping.pkl')
+    USER_EMB_PATH = os.path.join(BASE_DIR, 'data', 'user_embeddings.npy')
+    STRAIN_EMB_PATH = os.path.join(BASE_DIR, 'data', 'strain_embeddings.npy')
+    STRAIN_BIAS_PATH = os.path.join(BASE_DIR, 'data', 'strain_bias.npy')
+
+    LATENT_FACTORS = 50
+    EPOCHS = 100
+    LEARNING_RATE = 0.005
+    BATCH_SIZE = 512
+    PATIENCE = 10
+    EVAL_BATCH_SIZE = 1_000_000
+
+    # Split fractions (train / validation / test = 70 / 15 / 15)
+    VAL_FRACTION = 0.15
+    TEST_FRACTION = 0.15
+    RANDOM_STATE = 42
+
+logger = logging.getLogger(__name__)
+
+def configure_logging(log_file_path: str) -> logging.Logger:
+    """Logs to both console and a rotating log file."""
+    from logging.handlers import RotatingFileHandler
+
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+        formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+        for handler in (logging.StreamHandler(),
+                        RotatingFileHandler(log_file_path, maxBytes=5 * 1024 * 1024, backupCount=5)):
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+    return logger
+
+# -----------------------------
+# ALS Model with Bias Terms
+# -----------------------------
+class ALSModel(nn.Module):
+    def __init__(self, num_users: int, num_strains: int, latent_factors: int = 10):
+        """Initialize the ALS model with user and strain embeddings, including bias terms."""
+        super(ALSModel, self).__init__()
+        self.user_factors = nn.Embedding(num_users, latent_factors, sparse=True)
+        self.strain_factors = nn.Embedding(num_strains, latent_factors, sparse=True)
+        self.user_bias = nn.Embedding(num_users, 1, sparse=True)
+        self.strain_bias = nn.Embedding(num_strains, 1, sparse=True)
+
+        nn.init.normal_(self.user_factors.weight, 0, 0.1)
+        nn.init.normal_(self.strain_factors.weight, 0, 0.1)
+        nn.init.constant_(self.user_bias.weight, 0)
+        nn.init.constant_(self.strain_bias.weight, 0)
+
+    def forward(self, user_indices: torch.Tensor, strain_indices: torch.Tensor) -> torch.Tensor:
+        user_embedding = self.user_factors(user_indices)
+        strain_embedding = self.strain_factors(strain_indices)
+        user_bias = self.user_bias(user_indices).squeeze(1)
+        strain_bias = self.strain_bias(strain_indices).squeeze(1)
+        return torch.sum(user_embedding * strain_embedding, dim=1) + user_bias + strain_bias
+
+# -----------------------------
+# Data Preparation
+# -----------------------------
+class CodedInteractions:
+    """Interaction columns with ids replaced by contiguous int32 codes."""
+
+    def __init__(self, store_dir: str):
+        store = load_interaction_store(store_dir)
+        self.user_ids, self.user_codes = factorize_ids(store.user_id)
+        self.strain_ids, self.strain_codes = factorize_ids(store.strain_id)
+        # Ratings stay memory-mapped; only the gathered batches are read.
+        self.ratings = store.rating
+        logger.info(f"Number of unique users: {len(self.user_ids)}, "
+                    f"Number of unique strains: {len(self.strain_ids)}")
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    def mappings(self) -> Tuple[Dict, Dict]:
+        user_mapping = {int(user_id): code for code, user_id in enumerate(self.user_ids)}
+        strain_mapping = {int(strain_id): code for code, strain_id in enumerate(self.strain_ids)}
+        return user_mapping, strain_mapping
+
+    def batch(self, rows: np.ndarray) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        rows = np.sort(rows)  # Sorted rows read the mmap sequentially
+        return (torch.from_numpy(self.user_codes[rows].astype(np.int64)),
+                torch.from_numpy(self.strain_codes[rows].astype(np.int64)),
+                torch.from_numpy(np.asarray(self.ratings[rows], dtype=np.float32)))
+
+def split_rows(num_rows: int, val_fraction: float, test_fraction: float,
+               seed: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Random train / validation / test row indices."""
+    order = np.random.default_rng(seed).permutation(num_rows)
+    num_test = int(round(num_rows * test_fraction))
+    num_val = int(round(num_rows * val_fraction))
+    return order[num_test + num_val:], order[num_test:num_test + num_val], order[:num_test]
+
+def save_mappings(user_mapping: Dict, strain_mapping: Dict):
+    os.makedirs(os.path.dirname(ALSConfig.USER_MAPPING_PATH), exist_ok=True)
+    with open(ALSConfig.USER_MAPPING_PATH, 'wb') as f:
+        pickle.dump(user_mapping, f)
+    with open(ALSConfig.STRAIN_MAPPING_PATH, 'wb') as f:
+        pickle.dump(strain_mapping, f)
+    logger.info(f"Saved id mappings to '{os.path.dirname(ALSConfig.USER_MAPPING_PATH)}'")
+
+# -----------------------------
+# Training and Evaluation
+# -----------------------------
+def evaluate_als_model(model: ALSModel, data: CodedInteractions, rows: np.ndarray, device: torch.device,
+                       batch_size: int = ALSConfig.EVAL_BATCH_SIZE) -> float:
+    """RMSE of clamped predictions over `rows`, evaluated in batches."""
+    model.eval()
+    squared_error = 0.0
+    with torch.no_grad():
+        for start in range(0, len(rows), batch_size):
+            users, strains, ratings = (t.to(device) for t in data.batch(rows[start:start + batch_size]))
+            predictions = torch.clamp(model(users, strains), min=1, max=5)
+            squared_error += (predictions - ratings).double().pow(2).sum().item()
+    return float(np.sqrt(squared_error / max(len(rows), 1)))
+
+def train_als_model(data: CodedInteractions, train_rows: np.ndarray, val_rows: np.ndarray, device: torch.device,
+                    latent_factors: int = ALSConfig.LATENT_FACTORS, epochs: int = ALSConfig.EPOCHS,
+                    lr: float = ALSConfig.LEARNING_RATE, batch_size: int = ALSConfig.BATCH_SIZE,
+                    patience: int = ALSConfig.PATIENCE) -> ALSModel:
+    """Train the ALS model with early stopping on validation RMSE."""
+    model = ALSModel(len(data.user_ids), len(data.strain_ids), latent_factors).to(device)
+    optimizer = optim.SparseAdam(model.parameters(), lr=lr)
+    criterion = nn.MSELoss()
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.1, patience=5)
+    sampler = ShuffledBatchSampler(len(train_rows), batch_size, shuffle=True, seed=ALSConfig.RANDOM_STATE)
+
+    best_rmse = float('inf')
+    best_model_state = copy.deepcopy(model.state_dict())
+    counter = 0
+
+    for epoch in range(1, epochs + 1):
+        model.train()
+        epoch_loss = 0.0
+        for batch_idx in sampler:
+            users, strains, ratings = (t.to(device) for t in data.batch(train_rows[batch_idx.numpy()]))
+            optimizer.zero_grad()
+            loss = criterion(model(users, strains), ratings)
+            loss.backward()
+            optimizer.step()
+            epoch_loss += loss.item() * len(ratings)
+
+        logger.info(f"Epoch [{epoch}/{epochs}], Loss: {epoch_loss / len(train_rows):.4f}")
+        rmse_val = evaluate_als_model(model, data, val_rows, device)
+        logger.info(f"Validation RMSE: {rmse_val:.4f}")
+        scheduler.step(rmse_val)
+        if epoch == 1:
+            log_peak_rss("first epoch", logger)
+
+        if rmse_val < best_rmse:
+            best_rmse = rmse_val
+            best_model_state = copy.deepcopy(model.state_dict())
+            counter = 0
+            logger.info(f"New best RMSE: {best_rmse:.4f} at epoch {epoch}")
+        else:
+            counter += 1
+            logger.info(f"No improvement in RMSE for {counter} epochs.")
+            if counter >= patience:
+                logger.info("Early stopping triggered.")
+                break
+
+    model.load_state_dict(best_model_state)
+    logger.info(f"Best RMSE achieved: {best_rmse:.4f}")
+    return model
+
+def save_embeddings(model: ALSModel):
+    """Saves user/strain factors and strain biases for the hybrid trainer and fold-in."""
+    np.save(ALSConfig.USER_EMB_PATH, model.user_factors.weight.detach().cpu().numpy())
+    np.save(ALSConfig.STRAIN_EMB_PATH, model.strain_factors.weight.detach().cpu().numpy())
+    np.save(ALSConfig.STRAIN_BIAS_PATH, model.strain_bias.weight.detach().cpu().numpy()[:, 0])
+    logger.info(f"Saved ALS embeddings to '{ALSConfig.USER_EMB_PATH}' and '{ALSConfig.STRAIN_EMB_PATH}'.")
+
+def save_test_data(data: CodedInteractions, test_rows: np.ndarray, output_dir: str):
+    """Writes the held-out split with raw ids, in the interaction store layout."""
+    test_rows = np.sort(test_rows)
+    write_columns(output_dir, data.user_ids[data.user_codes[test_rows]],
+                  data.strain_ids[data.strain_codes[test_rows]], data.ratings[test_rows], split="test")
+    logger.info(f"Saved ALS test data to '{output_dir}'.")
+
+# -----------------------------
+# Main Execution
+# -----------------------------
+def main_als():
+    parser = argparse.ArgumentParser(description="Train the ALS collaborative-filtering model.")
+    parser.add_argument("--store", default=ALSConfig.INTERACTION_STORE_PATH,
+                        help="Interaction store directory written by interaction_store.py")
+    parser.add_argument("--batch-size", type=int, default=ALSConfig.BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=ALSConfig.EPOCHS)
+    parser.add_argument("--latent-factors", type=int, default=ALSConfig.LATENT_FACTORS)
+    args = parser.parse_args()
+
+    configure_logging(ALSConfig.LOG_FILE)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    logger.info(f"Using device: {device}")
+
+    try:
+        data = CodedInteractions(args.store)
+        save_mappings(*data.mappings())
+        train_rows, val_rows, test_rows = split_rows(len(data), ALSConfig.VAL_FRACTION,
+                                                     ALSConfig.TEST_FRACTION, ALSConfig.RANDOM_STATE)
+        logger.info(f"Training rows: {len(train_rows)}, Validation rows: {len(val_rows)}, Test rows: {len(test_rows)}")
+        log_peak_rss("data preparation", logger)
+
+        model = train_als_model(data, train_rows, val_rows, device, latent_factors=args.latent_factors,
+                                epochs=args.epochs, batch_size=args.batch_size)
+        torch.save(model.state_dict(), ALSConfig.ALS_MODEL_PATH)
+        logger.info(f"ALS model saved to '{ALSConfig.ALS_MODEL_PATH}'.")
+        save_embeddings(model)
+        save_test_data(data, test_rows, ALSConfig.TEST_STORE_PATH)
+        log_peak_rss("ALS training", logger)
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during ALS training: {e}")
+        raise
+
+if __name__ == "__main__":
+    main_als()
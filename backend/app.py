@@ -3,24 +3,34 @@
 import os
 import logging
 import json
-import datetime
+import time
 import traceback
 from typing import List, Optional, Literal
 import numpy as np
 import pandas as pd
-import torch
 import pickle
 import faiss
-import redis
 import bcrypt
 import uvicorn
-from torch import nn
 from sklearn.metrics.pairwise import cosine_similarity
-from fastapi import FastAPI, HTTPException, Body, Depends, status
+from fastapi import FastAPI, HTTPException, Body, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from rapidfuzz import process as fuzzy_process
+from strain_search import StrainSearchIndex
+from profile_codec import ProfileCodec, now_epoch, format_epoch, format_profile_timestamps
+from trending import TrendingStrains
+from badges import FAVORITE_BADGES
+from event_stream import EVENT_REVIEW, EVENT_FEEDBACK, publish_user_event, stream_lag, combined_stream_lag
+from profile_store import ProfileScripts, load_profile, profile_key, save_new_profile, update_profile
+from redis_shards import RedisShards, parse_nodes
+from fold_in import collect_user_signals, fold_in_user
+from scoring_executor import ScoringExecutor, ScoringRejected
+from cold_start_cache import ColdStartCache, catalog_version, preference_signature, ranking_fingerprint
+from strain_signals import StrainSignals
+from strain_neighbors import load_neighbors
 
 # ---------------------------
 # Configurations and Paths
@@ -28,12 +38,25 @@ from rapidfuzz import process as fuzzy_process
 class Config:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     LOG_FILE = os.path.join(BASE_DIR, 'logs', 'deep_hybrid_recommender.log')
+    ACCESS_LOG_FILE = os.getenv("ACCESS_LOG_FILE")  # JSON-lines request log for traffic_replay.py; off if unset
+    REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+    REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+    # Comma-separated host:port shards for user state; global keys stay on REDIS_GLOBAL_NODE (default: first)
+    REDIS_NODES = parse_nodes(os.getenv("REDIS_NODES", f"{REDIS_HOST}:{REDIS_PORT}"))
+    REDIS_GLOBAL_NODE = os.getenv("REDIS_GLOBAL_NODE", REDIS_NODES[0])
     USER_EMB_PATH = os.path.join(BASE_DIR, 'data', 'user_embeddings.npy')
     STRAIN_EMB_PATH = os.path.join(BASE_DIR, 'data', 'strain_embeddings.npy')
+    STRAIN_BIAS_PATH = os.path.join(BASE_DIR, 'data', 'strain_bias.npy')  # Optional ALS strain biases
     STRAIN_DATA_PATH = os.path.join(BASE_DIR, 'data', 'cleaned_strain_data_final_with_embeddings.csv')
     USER_MAPPING_PATH = os.path.join(BASE_DIR, 'mappings', 'user_id_mapping.pkl')
     STRAIN_MAPPING_PATH = os.path.join(BASE_DIR, 'mappings', 'strain_mapping.pkl')
     FAISS_INDEX_PATH = os.path.join(BASE_DIR, 'models', 'faiss_index.bin')
+    TERPENE_INFO_PATH = os.path.join(BASE_DIR, 'data', 'terpene_info.json')
+    STRAIN_NEIGHBORS_DIR = os.path.join(BASE_DIR, 'data', 'strain_neighbors')  # Built by strain_neighbors.py
+    # TorchScript hybrid model built by model_export.py; a .pth path loads the float checkpoint instead.
+    HYBRID_MODEL_PATH = os.getenv("HYBRID_MODEL_PATH", os.path.join(BASE_DIR, 'models', 'hybrid_model_int8.pt'))
+    # Off until requests are scored with it: loading pulls in torch and the model in every process.
+    HYBRID_MODEL_ENABLED = os.getenv("HYBRID_MODEL_ENABLED", "false").lower() in ("1", "true", "yes")
     EPOCHS = 12
     LEARNING_RATE = 0.0005
     BATCH_SIZE = 256
@@ -41,6 +64,27 @@ class Config:
     PATIENCE = 4
     K = 10  # Top K recommendations
     FUZZY_MATCH_THRESHOLD = 85  # Threshold for fuzzy matching confidence
+    FOLD_IN_REG = 0.1  # Ridge strength (per unit of signal weight) for user fold-in
+    SEARCH_FUZZY_THRESHOLD = 70  # Looser threshold for typeahead typo fallback
+    SEARCH_POPULARITY_TTL = 30  # Seconds between popularity refreshes for search ranking
+    SEARCH_MAX_LIMIT = 100
+    PROFILE_CODEC = os.getenv("PROFILE_CODEC", "orjson")  # orjson, msgpack or json
+    PROFILE_COMPRESS_THRESHOLD = 1024  # Bytes; larger encoded profiles are zstd-compressed
+    SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "4"))  # Dedicated threads for recommendation scoring
+    SCORING_QUEUE_LIMIT = int(os.getenv("SCORING_QUEUE_LIMIT", "16"))  # Waiting requests before shedding
+    SCORING_DEADLINE_SECONDS = float(os.getenv("SCORING_DEADLINE_SECONDS", "2.0"))
+    SCORING_SHED_MODE = os.getenv("SCORING_SHED_MODE", "degrade")  # degrade (popular strains) or reject (503)
+    SCORING_RETRY_AFTER_SECONDS = 1
+    COLD_START_PRECOMPUTE = 50  # Most requested preference signatures warmed at startup
+    COLD_START_TTL = 7 * 24 * 3600
+    # Weights of the ranking signals: embedding similarity, desired-terpene match,
+    # relief-target match and synergy with the desired terpenes.
+    SCORE_WEIGHTS = {"similarity": 1.0, "terpene": 0.3, "relief": 0.3, "synergy": 0.1}
+    # "catalog" scores every strain with a desired effect; "neighbors" only the
+    # precomputed neighbors of the user's liked strains (falls back to catalog).
+    CANDIDATE_SOURCE = os.getenv("CANDIDATE_SOURCE", "catalog")
+    LIKED_TARGET = 4.0  # Minimum signal rating for a strain to seed neighbor candidates
+    SIMILAR_STRAINS_MAX = 50
 
 # ---------------------------
 # FastAPI App Initialization with Lifespan
@@ -56,7 +100,29 @@ async def lifespan(app: FastAPI):
         with open(Config.STRAIN_MAPPING_PATH, 'rb') as f:
             app.state.strain_mapping = pickle.load(f)
         logging.info("Strain mapping loaded successfully.")
+        app.state.strain_names = {strain_id: name for name, strain_id in app.state.strain_mapping.items()}
+        if os.path.exists(Config.STRAIN_NEIGHBORS_DIR):
+            app.state.strain_neighbors = load_neighbors(Config.STRAIN_NEIGHBORS_DIR)
+            logging.info(f"Strain neighbor lists loaded: {app.state.strain_neighbors.ids.shape}.")
+        else:
+            app.state.strain_neighbors = None
+            logging.warning("Strain neighbor lists not found; similar strains are unavailable.")
+        app.state.hybrid_model = load_hybrid_model() if Config.HYBRID_MODEL_ENABLED else None
+        app.state.strain_search = StrainSearchIndex(
+            app.state.strain_mapping.keys(),
+            redis_client=redis_client,
+            popularity_ttl=Config.SEARCH_POPULARITY_TTL,
+            fuzzy_threshold=Config.SEARCH_FUZZY_THRESHOLD,
+        )
+        app.state.strain_search.start_refresher()
+        try:
+            cold_start_cache.sync_catalog_version()
+            precompute_cold_start_recommendations()
+        except Exception as e:
+            logging.warning(f"Cold-start cache warm-up skipped: {e}")
         yield
+        app.state.strain_search.stop_refresher()
+        scoring_executor.shutdown()
     except Exception as e:
         logging.error(f"Error during lifespan events: {e}")
         raise e
@@ -74,7 +140,29 @@ app.add_middleware(
 # ---------------------------
 # Redis Setup for In-Memory Storage
 # ---------------------------
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+# User-scoped keys are routed to their shard; `redis_client` is the global node.
+redis_shards = RedisShards(Config.REDIS_NODES, Config.REDIS_GLOBAL_NODE, db=0, decode_responses=True)
+# Profiles are stored as binary records, so they are read without response decoding.
+profile_shards = RedisShards(Config.REDIS_NODES, Config.REDIS_GLOBAL_NODE, db=0, decode_responses=False)
+redis_client = redis_shards.global_client
+profile_codec = ProfileCodec(Config.PROFILE_CODEC, compress_threshold=Config.PROFILE_COMPRESS_THRESHOLD)
+# Atomic favorites, notifications and validated event writes (Lua, run via EVALSHA)
+profile_scripts = redis_shards.per_shard(ProfileScripts)
+trending_strains = TrendingStrains(redis_client)
+# The catalog version is re-read per request (like get_strain_catalog), so replaced
+# catalog files take effect without a restart.
+cold_start_cache = ColdStartCache(
+    redis_client,
+    lambda: catalog_version([Config.STRAIN_DATA_PATH, Config.STRAIN_EMB_PATH, Config.STRAIN_MAPPING_PATH,
+                             Config.TERPENE_INFO_PATH]),
+    ranking_fingerprint({"score_weights": Config.SCORE_WEIGHTS, "k": Config.K}),
+    ttl=Config.COLD_START_TTL,
+)
+scoring_executor = ScoringExecutor(
+    max_workers=Config.SCORING_WORKERS,
+    max_queue=Config.SCORING_QUEUE_LIMIT,
+    deadline_seconds=Config.SCORING_DEADLINE_SECONDS,
+)
 
 # ---------------------------
 # Logging Setup
@@ -88,6 +176,48 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+# ---------------------------
+# Structured Access Log
+# ---------------------------
+# One JSON object per request (ts, method, path, body, status, duration_ms),
+# in the trace format traffic_replay.py reads. Passwords are redacted.
+access_logger = logging.getLogger("access")
+if Config.ACCESS_LOG_FILE:
+    access_handler = logging.FileHandler(Config.ACCESS_LOG_FILE)
+    access_handler.setFormatter(logging.Formatter("%(message)s"))
+    access_logger.addHandler(access_handler)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+
+def redact_body(body):
+    if isinstance(body, dict):
+        return {key: "***" if "password" in key else value for key, value in body.items()}
+    return body
+
+async def log_access(request, call_next):
+    raw_body = await request.body()
+    received = time.time()
+    start = time.perf_counter()
+    response = await call_next(request)
+    try:
+        body = json.loads(raw_body) if raw_body else None
+    except ValueError:
+        body = None
+    path = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    access_logger.info(json.dumps({
+        "ts": round(received, 3),
+        "method": request.method,
+        "path": path,
+        "body": redact_body(body),
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - start) * 1e3, 2),
+    }))
+    return response
+
+# Registered only when enabled: the middleware reads every request body.
+if Config.ACCESS_LOG_FILE:
+    app.middleware("http")(log_access)
+
 # ---------------------------
 # Global Exception Handler
 # ---------------------------
@@ -152,33 +282,6 @@ class FavoriteRequest(BaseModel):
 class FavoriteResponse(BaseModel):
     favorites: List[str] = Field(..., description="List of favorite strains")
 
-# ---------------------------
-# Define Deep Hybrid Recommender Model
-# ---------------------------
-class DeepHybridRecommender(nn.Module):
-    def __init__(self, input_size: int):
-        super(DeepHybridRecommender, self).__init__()
-        self.network = nn.Sequential(
-            nn.Linear(input_size, 512),
-            nn.BatchNorm1d(512),
-            nn.ReLU(),
-            nn.Dropout(0.4),
-            nn.Linear(512, 256),
-            nn.BatchNorm1d(256),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(256, 128),
-            nn.BatchNorm1d(128),
-            nn.ReLU(),
-            nn.Linear(128, 64),
-            nn.BatchNorm1d(64),
-            nn.ReLU(),
-            nn.Linear(64, 1)
-        )
-
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        return self.network(x)
-
 # ---------------------------
 # Helper Functions
 # ---------------------------
@@ -222,6 +325,26 @@ def load_embeddings():
         logging.error(f"Error loading embeddings: {e}")
         raise HTTPException(status_code=500, detail=f"Error loading embeddings: {str(e)}")
 
+def load_strain_bias():
+    """Load ALS strain biases if they were exported alongside the factors."""
+    if not os.path.exists(Config.STRAIN_BIAS_PATH):
+        return None
+    return np.load(Config.STRAIN_BIAS_PATH, mmap_mode='r')
+
+def load_hybrid_model():
+    """Loads the exported hybrid model for CPU scoring, or returns None if it is unavailable."""
+    if not os.path.exists(Config.HYBRID_MODEL_PATH):
+        logging.info("Hybrid model artifact not found; hybrid scoring is disabled.")
+        return None
+    try:
+        from model_export import load_scoring_model  # Imports torch; only when the model is enabled
+        model = load_scoring_model(Config.HYBRID_MODEL_PATH)
+        logging.info(f"Hybrid model loaded from {Config.HYBRID_MODEL_PATH}.")
+        return model
+    except Exception as e:
+        logging.warning(f"Could not load hybrid model from {Config.HYBRID_MODEL_PATH}: {e}")
+        return None
+
 def get_new_user_id():
     """Generates a new numeric user ID."""
     try:
@@ -232,17 +355,26 @@ def get_new_user_id():
         logging.error(f"Error generating new user ID: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating new user ID: {str(e)}")
 
+def user_not_found(user_id: int) -> HTTPException:
+    logging.error(f"User profile not found for user {user_id}")
+    return HTTPException(status_code=404, detail="User profile not found!")
+
 def get_user_profile(user_id: int):
-    """Fetch user profile from Redis"""
-    user_profile_data = redis_client.get(f"user_profile_{user_id}")
-    if not user_profile_data:
-        logging.error(f"User profile not found for user {user_id}")
-        raise HTTPException(status_code=404, detail="User profile not found!")
-    return json.loads(user_profile_data)
+    """Fetch user profile (record plus favorites, badges and notifications) from Redis"""
+    user_profile = load_profile(profile_shards.for_user(user_id), profile_codec, user_id)
+    if user_profile is None:
+        raise user_not_found(user_id)
+    return user_profile
 
 def save_user_profile(user_id: int, profile_data: dict):
-    """Save user profile to Redis"""
-    redis_client.set(f"user_profile_{user_id}", json.dumps(profile_data))
+    """Save a new user profile to Redis"""
+    save_new_profile(profile_shards.for_user(user_id), profile_codec, user_id, profile_data)
+    logging.info(f"User profile saved for user {user_id}")
+
+def update_user_profile(user_id: int, mutate):
+    """Apply `mutate` to the stored profile record without losing concurrent writes"""
+    if update_profile(profile_shards.for_user(user_id), profile_codec, user_id, mutate) is None:
+        raise user_not_found(user_id)
     logging.info(f"User profile saved for user {user_id}")
 
 def get_user_id_from_email(email: str):
@@ -280,17 +412,15 @@ def get_fuzzy_match(query: str, choices: set, threshold=Config.FUZZY_MATCH_THRES
 
 def reset_user_cache(user_id: int):
     """Resets the cache for a specific user."""
-    keys = redis_client.keys(f"user_*_{user_id}")
+    user_redis_client = redis_shards.for_user(user_id)
+    keys = user_redis_client.keys(f"user_*_{user_id}")
     if keys:
-        redis_client.delete(*keys)
+        user_redis_client.delete(*keys)
         logging.info(f"Cache reset for user {user_id}")
 
-def award_badge(user_profile: dict, badge_name: str):
-    """Awards a badge to the user if not already awarded."""
-    if badge_name not in user_profile.get("badges", []):
-        user_profile.setdefault("badges", []).append(badge_name)
-        user_profile.setdefault("notifications", []).append(f"Congratulations! You've earned the '{badge_name}' badge.")
-        logging.info(f"Awarded badge '{badge_name}' to user {user_profile['user_id']}.")
+def user_scripts(user_id: int) -> ProfileScripts:
+    """The profile scripts bound to the user's shard."""
+    return profile_scripts[redis_shards.node_for_user(user_id)]
 
 # ---------------------------
 # API Endpoints
@@ -322,7 +452,7 @@ def onboarding(signup: SignupRequest):
             "reviews": [],
             "notifications": [],
             "favorites": [],
-            "last_login": str(datetime.datetime.now()),
+            "last_login": now_epoch(),
             "survey_completed": False,
             "strain_feedback": {},
         }
@@ -362,8 +492,7 @@ def login(login: LoginRequest):
                 detail="Invalid email or password."
             )
 
-        user_profile["last_login"] = str(datetime.datetime.now())
-        save_user_profile(user_id, user_profile)
+        update_user_profile(user_id, lambda profile: profile.update(last_login=now_epoch()))
 
         logging.info(f"User {login.email} logged in successfully.")
         return {"message": "Login successful.", "user": {"user_id": user_id, "email": login.email}}
@@ -378,41 +507,40 @@ def login(login: LoginRequest):
         )
 
 @app.post("/submit_survey/")
-def submit_survey(survey: SurveyRequest):
+async def submit_survey(survey: SurveyRequest):
     try:
-        logging.info(f"Received survey submission: {survey.json()}")
-        user_id = survey.user_id
-        user_profile = get_user_profile(user_id)
-
-        desired_effects = [normalize_strain_name(effect) for effect in survey.desired_effects]
-        experience_level = normalize_strain_name(survey.experience_level)
-        familiar_strains = [normalize_strain_name(s) for s in survey.familiar_strains]
-        terpenes = [normalize_strain_name(t) for t in survey.terpenes] if survey.terpenes else []
-        may_relieve = [normalize_strain_name(m) for m in survey.may_relieve] if survey.may_relieve else []
-
-        user_profile["preferences"] = {
-            "desired_effects": desired_effects,
-            "experience_level": experience_level,
-            "familiar_strains": familiar_strains,
-            "terpenes": terpenes,
-            "may_relieve": may_relieve
-        }
-        user_profile["survey_completed"] = True
-        save_user_profile(user_id, user_profile)
-        logging.info(f"Survey data submitted for user {user_id}")
-
-        return recommend_internal(user_id)
-
+        await run_in_threadpool(save_survey, survey)
+        return await score_recommendations(survey.user_id)
     except HTTPException as he:
         raise he
     except Exception as e:
         logging.error(f"Error submitting survey for user {survey.user_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Survey submission failed: {str(e)}")
 
+def save_survey(survey: SurveyRequest):
+    logging.info(f"Received survey submission: {survey.json()}")
+    user_id = survey.user_id
+
+    desired_effects = [normalize_strain_name(effect) for effect in survey.desired_effects]
+    experience_level = normalize_strain_name(survey.experience_level)
+    familiar_strains = [normalize_strain_name(s) for s in survey.familiar_strains]
+    terpenes = [normalize_strain_name(t) for t in survey.terpenes] if survey.terpenes else []
+    may_relieve = [normalize_strain_name(m) for m in survey.may_relieve] if survey.may_relieve else []
+
+    preferences = {
+        "desired_effects": desired_effects,
+        "experience_level": experience_level,
+        "familiar_strains": familiar_strains,
+        "terpenes": terpenes,
+        "may_relieve": may_relieve
+    }
+    update_user_profile(user_id, lambda profile: profile.update(preferences=preferences, survey_completed=True))
+    logging.info(f"Survey data submitted for user {user_id}")
+
 @app.get("/recommend/{user_id}")
-def recommend(user_id: int):
+async def recommend(user_id: int):
     try:
-        return recommend_internal(user_id)
+        return await score_recommendations(user_id)
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -420,132 +548,242 @@ def recommend(user_id: int):
         raise HTTPException(status_code=500, detail=f"Recommendation failed: {str(e)}")
 
 @app.post("/recommend/")
-def recommend_post(user_id: int = Body(...)):
+async def recommend_post(user_id: int = Body(...)):
     try:
-        return recommend_internal(user_id)
+        return await score_recommendations(user_id)
     except HTTPException as he:
         raise he
     except Exception as e:
         logging.error(f"Error in recommend_post endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Recommendation failed: {str(e)}")
 
-def recommend_internal(user_id: int):
+async def score_recommendations(user_id: int):
+    """Runs recommend_internal on the bounded scoring executor, shedding load when it is saturated."""
     try:
-        logging.info(f"Generating recommendations for user {user_id}")
-
-        user_profile = get_user_profile(user_id)
-        preferences = user_profile.get("preferences", {})
-        tried_strains = set(preferences.get("familiar_strains", []))
-        desired_effects = preferences.get("desired_effects", [])
-
-        familiar_strains_normalized = set([normalize_strain_name(s) for s in tried_strains])
-
-        user_embeddings, strain_embeddings = load_embeddings()
-        strain_data = pd.read_csv(Config.STRAIN_DATA_PATH, header=0)
-        strain_data.columns = [col.strip() for col in strain_data.columns]
-
-        strain_data['Effects_List'] = consolidate_columns(strain_data, 'Effects_')
-        strain_data['Terpene_List'] = consolidate_columns(strain_data, 'Terpene Profile_')
-        strain_data['May_Relieve_List'] = consolidate_columns(strain_data, 'May Relieve_')
-
-        strain_data['Strain_Name'] = strain_data['Strain_Name'].fillna('').astype(str).apply(normalize_strain_name)
-        strain_data['Effects_List'] = strain_data['Effects_List'].apply(
-            lambda x: [normalize_strain_name(effect) for effect in x])
-        strain_data['Terpene_List'] = strain_data['Terpene_List'].apply(
-            lambda x: [normalize_strain_name(terpene) for terpene in x])
-        strain_data['May_Relieve_List'] = strain_data['May_Relieve_List'].apply(
-            lambda x: [normalize_strain_name(relief) for relief in x])
-
-        strain_mapping = app.state.strain_mapping
+        return await scoring_executor.run(recommend_internal, user_id)
+    except ScoringRejected as rejected:
+        logging.warning(f"Shedding recommendation request for user {user_id} ({rejected.reason}).")
+        if Config.SCORING_SHED_MODE == "degrade":
+            try:
+                return await run_in_threadpool(popular_fallback_recommendations, rejected.reason)
+            except Exception as e:
+                logging.error(f"Popularity fallback failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Recommendation service is busy. Please retry shortly.",
+            headers={"Retry-After": str(Config.SCORING_RETRY_AFTER_SECONDS)},
+        )
 
-        found_strains = set()
-        missing_strains = set()
-        available_strain_names = set(strain_mapping.keys())
-        for strain in familiar_strains_normalized:
-            matched_strain = get_fuzzy_match(strain, available_strain_names)
-            if matched_strain:
-                found_strains.add(matched_strain)
-            else:
-                missing_strains.add(strain)
-
-        logging.info(f"Familiar strains found: {found_strains}")
-        logging.info(f"Familiar strains not found: {missing_strains}")
-
-        if found_strains:
-            strain_ids = [strain_mapping[s] for s in found_strains]
-            user_emb = np.mean(strain_embeddings[strain_ids], axis=0).reshape(1, -1)
+def popular_fallback_recommendations(reason: str):
+    """
+    Degraded response: the all-time popular strains, without personalization.
+
+    Items have the same fields as rank_strains; the popularity relative to
+    the most popular strain stands in for the similarity and match scores.
+    """
+    popular_strains = trending_strains.top("all", count=Config.K)
+    if not popular_strains:
+        raise ValueError("No popular strains available")
+    strain_data, _ = get_strain_catalog()
+    names = [strain_name for strain_name, _ in popular_strains]
+    rows = strain_data[strain_data['Strain_Name'].isin(names)].drop_duplicates('Strain_Name') \
+        .set_index('Strain_Name', drop=False)
+    top_score = max(float(popular_strains[0][1]), 1.0)
+
+    recommended_strains = []
+    for strain_name, score in popular_strains:
+        row = rows.loc[strain_name] if strain_name in rows.index else {}
+        popularity = round(float(score) / top_score, 4)
+        recommended_strains.append({
+            'name': strain_name,
+            'type': str(row.get('Type', 'Hybrid')),
+            'effects': row.get('Effects_List', []),
+            'terpenes': row.get('Terpene_List', []),
+            'may_relieve': row.get('May_Relieve_List', []),
+            'similarity_score': popularity,
+            'match_score': popularity,
+            'popularity_score': int(score),
+        })
+    return {"recommended_strains": recommended_strains, "degraded": True, "degraded_reason": reason}
+
+def load_strain_catalog() -> pd.DataFrame:
+    """Loads strain data with normalized names and consolidated effect, terpene and relief lists."""
+    strain_data = pd.read_csv(Config.STRAIN_DATA_PATH, header=0)
+    strain_data.columns = [col.strip() for col in strain_data.columns]
+
+    strain_data['Effects_List'] = consolidate_columns(strain_data, 'Effects_')
+    strain_data['Terpene_List'] = consolidate_columns(strain_data, 'Terpene Profile_')
+    strain_data['May_Relieve_List'] = consolidate_columns(strain_data, 'May Relieve_')
+
+    strain_data['Strain_Name'] = strain_data['Strain_Name'].fillna('').astype(str).apply(normalize_strain_name)
+    strain_data['Effects_List'] = strain_data['Effects_List'].apply(
+        lambda x: [normalize_strain_name(effect) for effect in x])
+    strain_data['Terpene_List'] = strain_data['Terpene_List'].apply(
+        lambda x: [normalize_strain_name(terpene) for terpene in x])
+    strain_data['May_Relieve_List'] = strain_data['May_Relieve_List'].apply(
+        lambda x: [normalize_strain_name(relief) for relief in x])
+    return strain_data
+
+# Catalog and signal matrices shared by all requests; rebuilt when the catalog files change.
+_strain_catalog = (None, None, None)
+
+def get_strain_catalog():
+    """Returns (strain_data, StrainSignals), loading them once per catalog version."""
+    global _strain_catalog
+    version = catalog_version([Config.STRAIN_DATA_PATH, Config.TERPENE_INFO_PATH])
+    if _strain_catalog[0] != version:
+        strain_data = load_strain_catalog()
+        if os.path.exists(Config.TERPENE_INFO_PATH):
+            signals = StrainSignals.from_files(strain_data, Config.TERPENE_INFO_PATH)
+        else:
+            signals = StrainSignals(strain_data)
+        _strain_catalog = (version, strain_data, signals)
+        logging.info(f"Loaded strain catalog {version}: {len(strain_data)} strains, "
+                     f"{len(signals.terpenes)} terpenes, {len(signals.conditions)} conditions.")
+    return _strain_catalog[1], _strain_catalog[2]
+
+def rank_strains(user_emb: np.ndarray, strain_embeddings: np.ndarray, strain_data: pd.DataFrame,
+                 signals: StrainSignals, preferences: dict,
+                 candidate_strain_ids: Optional[np.ndarray] = None) -> List[dict]:
+    """
+    Ranks strains matching the desired effects by embedding similarity plus
+    terpene, relief and synergy matches, weighted by Config.SCORE_WEIGHTS.
+
+    With `candidate_strain_ids`, only those strains are considered, unless
+    none of them has a desired effect.
+    """
+    if not os.path.exists(Config.FAISS_INDEX_PATH):
+        logging.error("FAISS index file not found.")
+        raise HTTPException(status_code=500, detail="Recommendation system is unavailable.")
+
+    faiss_index = faiss.read_index(Config.FAISS_INDEX_PATH)
+    if faiss_index is None:
+        logging.error("FAISS index is unavailable.")
+        raise HTTPException(status_code=500, detail="Recommendation system is unavailable.")
+
+    candidate_rows = signals.effect_candidates(preferences.get("desired_effects", []))
+    if candidate_strain_ids is not None:
+        restricted_rows = np.intersect1d(candidate_rows, signals.rows_for_strains(candidate_strain_ids),
+                                         assume_unique=True)
+        if len(restricted_rows):
+            candidate_rows = restricted_rows
         else:
-            logging.warning(f"No valid familiar strain indices found for user {user_id}. Using average embedding.")
-            user_emb = np.mean(strain_embeddings, axis=0).reshape(1, -1)
+            logging.info("No neighbor candidates matched the desired effects; using the full catalog.")
 
-        # Incorporate favorites into user embeddings
-        favorites = user_profile.get("favorites", [])
-        if favorites:
-            favorite_normalized = [normalize_strain_name(s) for s in favorites]
-            favorite_indices = []
-            for s in favorite_normalized:
-                matched_strain = get_fuzzy_match(s, available_strain_names)
-                if matched_strain:
-                    favorite_indices.append(strain_mapping[matched_strain])
-            if favorite_indices:
-                favorite_emb = np.mean(strain_embeddings[favorite_indices], axis=0).reshape(1, -1)
-                user_emb = 0.6 * user_emb + 0.4 * favorite_emb
-                logging.info(f"Favorites incorporated into user embeddings for user {user_id}")
-
-        if "reviews" in user_profile and user_profile["reviews"]:
-            liked_strains = [normalize_strain_name(review['Strain_Name']) for review in user_profile["reviews"] if
-                             review['rating'] >= 4]
-            liked_indices = []
-            for s in liked_strains:
-                matched_strain = get_fuzzy_match(s, available_strain_names)
-                if matched_strain:
-                    liked_indices.append(strain_mapping[matched_strain])
-            if liked_indices:
-                feedback_emb = np.mean(strain_embeddings[liked_indices], axis=0).reshape(1, -1)
-                user_emb = 0.7 * user_emb + 0.3 * feedback_emb
-                logging.info(f"Feedback incorporated for user {user_id}")
-
-        if not os.path.exists(Config.FAISS_INDEX_PATH):
-            logging.error("FAISS index file not found.")
-            raise HTTPException(status_code=500, detail="Recommendation system is unavailable.")
-
-        faiss_index = faiss.read_index(Config.FAISS_INDEX_PATH)
-        if faiss_index is None:
-            logging.error("FAISS index is unavailable.")
-            raise HTTPException(status_code=500, detail="Recommendation system is unavailable.")
-
-        filtered_strain_data = strain_data[
-            strain_data['Effects_List'].apply(lambda effects: any(effect in desired_effects for effect in effects))
-        ]
+    logging.info(f"Number of strains after filtering by effects: {len(candidate_rows)}")
 
-        logging.info(f"Number of strains after filtering by effects: {len(filtered_strain_data)}")
+    if not len(candidate_rows):
+        logging.warning("No strains matched the desired effects.")
+        raise HTTPException(status_code=404, detail="No strains found matching your preferences.")
 
-        if filtered_strain_data.empty:
-            logging.warning("No strains matched the desired effects.")
-            raise HTTPException(status_code=404, detail="No strains found matching your preferences.")
+    candidate_embeddings = strain_embeddings[strain_data['strain_id'].to_numpy()[candidate_rows]]
+    similarities = cosine_similarity(user_emb, candidate_embeddings).flatten()
+    scores = signals.score(candidate_rows, similarities, preferences, Config.SCORE_WEIGHTS)
 
-        filtered_strain_ids = filtered_strain_data['strain_id'].tolist()
-        filtered_embeddings = strain_embeddings[filtered_strain_ids]
+    top = np.argsort(-scores["score"], kind="stable")[:Config.K]
 
-        similarities = cosine_similarity(user_emb, filtered_embeddings).flatten()
+    recommended_strains = []
+    for position, (_, row) in zip(top, strain_data.iloc[candidate_rows[top]].iterrows()):
+        strain_info = {
+            'name': row['Strain_Name'],
+            'type': str(row.get('Type', 'Hybrid')),
+            'effects': row.get('Effects_List', []),
+            'terpenes': row.get('Terpene_List', []),
+            'may_relieve': row.get('May_Relieve_List', []),
+            'similarity_score': round(float(similarities[position]), 4),
+            'match_score': round(float(scores["score"][position]), 4),
+        }
+        recommended_strains.append(strain_info)
+    return recommended_strains
+
+def cold_start_recommendations(signature: str, strain_embeddings: np.ndarray) -> dict:
+    """
+    Recommendations for a user without strain signals, shared through the cold-start cache.
+
+    The ranking uses the catalog-mean embedding, so it depends only on the
+    preference fields in the signature and is computed from the signature
+    itself. Results (including "no match") are cached per signature and
+    catalog version.
+    """
+    cached = cold_start_cache.get(signature)
+    if cached is None:
+        strain_data, signals = get_strain_catalog()
+        user_emb = np.mean(strain_embeddings, axis=0).reshape(1, -1)
+        try:
+            cached = {"recommended_strains": rank_strains(user_emb, strain_embeddings, strain_data, signals,
+                                                          json.loads(signature))}
+        except HTTPException as he:
+            if he.status_code != 404:
+                raise
+            cached = {"not_found": he.detail}
+        cold_start_cache.put(signature, cached)
+    else:
+        logging.info("Cold-start recommendations served from cache.")
+
+    if "not_found" in cached:
+        raise HTTPException(status_code=404, detail=cached["not_found"])
+    return cached
+
+def precompute_cold_start_recommendations():
+    """Fills the cold-start cache for the most requested preference signatures."""
+    signatures = cold_start_cache.most_common(Config.COLD_START_PRECOMPUTE)
+    missing = [signature for signature in signatures if cold_start_cache.get(signature) is None]
+    if not missing:
+        return
+    _, strain_embeddings = load_embeddings()
+    for signature in missing:
+        try:
+            cold_start_recommendations(signature, strain_embeddings)
+        except HTTPException:
+            pass
+    logging.info(f"Precomputed cold-start recommendations for {len(missing)} preference signature(s).")
+
+def recommend_internal(user_id: int):
+    try:
+        logging.info(f"Generating recommendations for user {user_id}")
 
-        filtered_strain_data = filtered_strain_data.copy()
-        filtered_strain_data['similarity'] = similarities
+        user_profile = get_user_profile(user_id)
+        preferences = user_profile.get("preferences", {})
 
-        filtered_strain_data = filtered_strain_data.sort_values(by='similarity', ascending=False)
+        strain_mapping = app.state.strain_mapping
 
-        recommended_strains = []
-        for _, row in filtered_strain_data.head(Config.K).iterrows():
-            strain_info = {
-                'name': row['Strain_Name'],
-                'type': str(row.get('Type', 'Hybrid')),
-                'effects': row.get('Effects_List', []),
-                'terpenes': row.get('Terpene_List', []),
-                'may_relieve': row.get('May_Relieve_List', []),
-                'similarity_score': round(row['similarity'], 4)
-            }
-            recommended_strains.append(strain_info)
+        available_strain_names = set(strain_mapping.keys())
+        resolved_strains = {}
+
+        def resolve_strain(strain_name):
+            strain_name = normalize_strain_name(strain_name)
+            if strain_name not in resolved_strains:
+                matched_strain = strain_name if strain_name in strain_mapping else get_fuzzy_match(
+                    strain_name, available_strain_names)
+                resolved_strains[strain_name] = strain_mapping[matched_strain] if matched_strain else None
+            return resolved_strains[strain_name]
+
+        # Fold the user into the ALS space from every rating, like/dislike, favorite and familiar strain.
+        strain_ids, targets, weights = collect_user_signals(user_profile, resolve_strain)
+        user_embeddings, strain_embeddings = load_embeddings()
 
+        if not len(strain_ids):
+            logging.warning(f"No resolvable strain signals found for user {user_id}. Using average embedding.")
+            signature = preference_signature(preferences)
+            cold_start_cache.record_request(signature)
+            return cold_start_recommendations(signature, strain_embeddings)
+
+        user_vector, _ = fold_in_user(strain_embeddings, strain_ids, targets, weights,
+                                      reg=Config.FOLD_IN_REG, strain_bias=load_strain_bias())
+        user_emb = user_vector.reshape(1, -1)
+        logging.info(f"Folded in user {user_id} from {len(strain_ids)} signal(s).")
+
+        candidate_strain_ids = None
+        if Config.CANDIDATE_SOURCE == "neighbors" and app.state.strain_neighbors is not None:
+            liked_strain_ids = strain_ids[targets >= Config.LIKED_TARGET]
+            if len(liked_strain_ids):
+                candidate_strain_ids = app.state.strain_neighbors.candidates(liked_strain_ids)
+                logging.info(f"{len(candidate_strain_ids)} neighbor candidates from "
+                             f"{len(np.unique(liked_strain_ids))} liked strain(s).")
+
+        strain_data, signals = get_strain_catalog()
+        recommended_strains = rank_strains(user_emb, strain_embeddings, strain_data, signals, preferences,
+                                           candidate_strain_ids)
         logging.info(f"Recommendations generated: {recommended_strains}")
         return {"recommended_strains": recommended_strains}
     except HTTPException as he:
@@ -558,37 +796,19 @@ def recommend_internal(user_id: int):
 def submit_feedback(feedback: FeedbackRequest):
     try:
         user_id = feedback.user_id
-        user_profile = get_user_profile(user_id)
-
-        if "strain_feedback" not in user_profile:
-            user_profile["strain_feedback"] = {}
-
         normalized_strain_name = normalize_strain_name(feedback.strain_id)
 
-        user_profile["strain_feedback"][normalized_strain_name] = {
-            "type": feedback.feedback_type,
-            "date": str(datetime.datetime.now())
-        }
-
-        save_user_profile(user_id, user_profile)
-
-        feedback_key = f"strain_feedback_{normalized_strain_name}"
-        if feedback.feedback_type == "like":
-            redis_client.hincrby(feedback_key, "likes", 1)
-            redis_client.zincrby('strain_popularity', 1, normalized_strain_name)
-        else:
-            redis_client.hincrby(feedback_key, "dislikes", 1)
-
-        # Award badges based on feedback count
-        feedback_count = len(user_profile["strain_feedback"])
-        if feedback_count == 5:
-            award_badge(user_profile, "Feedback Contributor")
-
-        save_user_profile(user_id, user_profile)
+        # Profile, aggregates, trending and badges are applied by the event stream workers.
+        event_id = publish_user_event(user_scripts(user_id), EVENT_FEEDBACK, user_id, {
+            "strain_name": normalized_strain_name,
+            "feedback_type": feedback.feedback_type,
+        })
+        if event_id is None:
+            raise user_not_found(user_id)
 
         logging.info(
             f"Feedback recorded for strain '{normalized_strain_name}' by user {user_id}: {feedback.feedback_type}")
-        return {"message": "Feedback recorded successfully"}
+        return {"message": "Feedback recorded successfully", "event_id": event_id}
 
     except HTTPException as he:
         raise he
@@ -607,7 +827,7 @@ def get_user_feedbacks(user_id: int):
             {
                 "strain_name": strain_name,
                 "feedback_type": feedback_data["type"],
-                "date": feedback_data["date"]
+                "date": format_epoch(feedback_data["date"])
             }
             for strain_name, feedback_data in strain_feedback.items()
         ]
@@ -682,6 +902,36 @@ def get_strain_details(strain_name: str):
         logging.error(f"Error fetching strain details: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching strain details: {str(e)}")
 
+@app.get("/strain/{strain_name}/similar")
+def get_similar_strains(strain_name: str, limit: int = Query(10, ge=1, le=Config.SIMILAR_STRAINS_MAX)):
+    """Precomputed most similar strains, read from the offline neighbor lists."""
+    try:
+        strain_neighbors = app.state.strain_neighbors
+        if strain_neighbors is None:
+            raise HTTPException(status_code=503, detail="Similar strains are unavailable.")
+
+        strain_mapping = app.state.strain_mapping
+        normalized_strain_name = normalize_strain_name(strain_name)
+        matched_strain = normalized_strain_name if normalized_strain_name in strain_mapping else get_fuzzy_match(
+            normalized_strain_name, set(strain_mapping.keys()))
+        if not matched_strain:
+            logging.warning(f"Strain '{strain_name}' not found.")
+            raise HTTPException(status_code=404, detail="Strain not found.")
+
+        neighbor_ids, neighbor_scores = strain_neighbors.similar(int(strain_mapping[matched_strain]), limit)
+        similar_strains = [
+            {"name": app.state.strain_names[neighbor_id], "similarity_score": round(float(score), 4)}
+            for neighbor_id, score in zip(neighbor_ids.tolist(), neighbor_scores.tolist())
+            if neighbor_id in app.state.strain_names
+        ]
+        return {"strain": matched_strain, "similar_strains": similar_strains}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.error(f"Error fetching similar strains: {e}")
+        raise HTTPException(status_code=500, detail=f"Error fetching similar strains: {str(e)}")
+
 @app.get("/strains_list/")
 def get_strains_list():
     try:
@@ -697,17 +947,31 @@ def get_strains_list():
         logging.error(f"Error fetching strains list: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching strains list: {str(e)}")
 
+@app.get("/strains/search")
+def search_strains(prefix: str = "",
+                   limit: int = Query(20, ge=1, le=Config.SEARCH_MAX_LIMIT),
+                   cursor: Optional[str] = None):
+    try:
+        return app.state.strain_search.search(normalize_strain_name(prefix), limit=limit, cursor=cursor)
+    except ValueError as ve:
+        logging.warning(f"Bad strain search request: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logging.error(f"Error searching strains for prefix '{prefix}': {e}")
+        raise HTTPException(status_code=500, detail=f"Error searching strains: {str(e)}")
+
 @app.get("/leaderboard/")
 def get_leaderboard():
     try:
-        top_users = redis_client.zrevrange('leaderboard', 0, 9, withscores=True)
+        # Each shard ranks its own users; merge the per-shard top 10s.
+        top_users = redis_shards.gather_top('leaderboard', 10)
         leaderboard = []
         for user_id_str, score in top_users:
             user_id = int(user_id_str)
-            user_profile_data = redis_client.get(f"user_profile_{user_id}")
+            user_profile_data = profile_shards.for_user(user_id).get(profile_key(user_id))
             email = 'Unknown'
             if user_profile_data:
-                user_profile = json.loads(user_profile_data)
+                user_profile = profile_codec.decode(user_profile_data)
                 email = user_profile.get('email', 'Unknown')
             leaderboard.append({"user_id": user_id, "email": email, "score": int(score)})
         logging.info("Leaderboard retrieved successfully.")
@@ -719,10 +983,9 @@ def get_leaderboard():
 @app.get("/notifications/{user_id}")
 def get_notifications(user_id: int):
     try:
-        user_profile = get_user_profile(user_id)
-        notifications = user_profile.get("notifications", [])
-        user_profile["notifications"] = []
-        save_user_profile(user_id, user_profile)
+        notifications = user_scripts(user_id).pop_notifications(user_id)
+        if notifications is None:
+            raise user_not_found(user_id)
         logging.info(f"Notifications retrieved for user {user_id}.")
         return {"notifications": notifications}
     except HTTPException as he:
@@ -737,7 +1000,7 @@ def get_profile(user_id: int):
         user_profile = get_user_profile(user_id)
         user_profile.pop('password', None)
         logging.info(f"Profile retrieved for user {user_id}.")
-        return {"profile": user_profile}
+        return {"profile": format_profile_timestamps(user_profile)}
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -749,45 +1012,28 @@ def get_profile(user_id: int):
 def submit_review(review: ReviewRequest):
     try:
         user_id = review.user_id
-        user_profile = get_user_profile(user_id)
-
         normalized_strain_name = normalize_strain_name(review.strain_name)
 
-        review_entry = {
-            "Strain_Name": normalized_strain_name,
+        payload = {
+            "strain_name": normalized_strain_name,
             "rating": review.rating,
             "text": review.text,
-            "date": str(datetime.datetime.now())
         }
-
         if review.metrics:
-            review_entry["metrics"] = {
+            payload["metrics"] = {
                 "potency": review.metrics.potency,
                 "taste": review.metrics.taste,
                 "aroma": review.metrics.aroma,
                 "value": review.metrics.value
             }
 
-        user_profile.setdefault("reviews", []).append(review_entry)
-        save_user_profile(user_id, user_profile)
-
-        strain_reviews_key = f"strain_reviews_{normalized_strain_name}"
-        redis_client.hincrby(strain_reviews_key, "review_count", 1)
-        redis_client.hincrbyfloat(strain_reviews_key, "rating_sum", review.rating)
-
-        redis_client.zincrby('leaderboard', 1, user_id)
-
-        # Award badges based on review count
-        review_count = len(user_profile["reviews"])
-        if review_count == 1:
-            award_badge(user_profile, "First Review")
-        elif review_count == 10:
-            award_badge(user_profile, "Review Enthusiast")
-
-        save_user_profile(user_id, user_profile)
+        # Profile, aggregates, leaderboard and badges are applied by the event stream workers.
+        event_id = publish_user_event(user_scripts(user_id), EVENT_REVIEW, user_id, payload)
+        if event_id is None:
+            raise user_not_found(user_id)
 
         logging.info(f"Review submitted for strain '{normalized_strain_name}' by user {user_id}.")
-        return {"message": "Review submitted successfully"}
+        return {"message": "Review submitted successfully", "event_id": event_id}
 
     except HTTPException as he:
         raise he
@@ -796,19 +1042,34 @@ def submit_review(review: ReviewRequest):
         raise HTTPException(status_code=500, detail=f"Error submitting review: {str(e)}")
 
 @app.get("/popular_strains/")
-def get_popular_strains():
+def get_popular_strains(window: Literal["all", "24h", "7d", "30d"] = "all"):
     try:
-        popular_strains = redis_client.zrevrange('strain_popularity', 0, 9, withscores=True)
+        popular_strains = trending_strains.top(window, count=10)
         result = []
         for strain_name, score in popular_strains:
-            result.append({"strain_name": strain_name, "popularity_score": int(score)})
+            # All-time scores are like counts; windowed scores are decay-weighted.
+            popularity_score = int(score) if window == "all" else round(score, 4)
+            result.append({"strain_name": strain_name, "popularity_score": popularity_score})
 
-        logging.info("Popular strains retrieved successfully.")
-        return {"popular_strains": result}
+        logging.info(f"Popular strains retrieved successfully for window '{window}'.")
+        return {"popular_strains": result, "window": window}
     except Exception as e:
         logging.error(f"Error retrieving popular strains: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve popular strains")
 
+@app.get("/metrics/")
+def get_metrics():
+    try:
+        hybrid_model = getattr(app.state, "hybrid_model", None)
+        return {
+            "event_stream": combined_stream_lag(redis_shards.scatter(stream_lag)),
+            "scoring": scoring_executor.stats(),
+            "hybrid_model": Config.HYBRID_MODEL_PATH if hybrid_model is not None else None,
+        }
+    except Exception as e:
+        logging.error(f"Error retrieving metrics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve metrics")
+
 # ---------------------------
 # Favorites Endpoints
 # ---------------------------
@@ -818,24 +1079,18 @@ def add_favorite(favorite: FavoriteRequest):
         user_id = favorite.user_id
         strain_name = normalize_strain_name(favorite.strain_name)
 
-        user_profile = get_user_profile(user_id)
-
-        favorites = user_profile.get("favorites", [])
-        if strain_name in favorites:
+        # Existence check, duplicate check, append and badge award in one atomic script
+        result = user_scripts(user_id).add_favorite(user_id, strain_name, FAVORITE_BADGES)
+        if result is None:
+            raise user_not_found(user_id)
+        if not result["added"]:
             logging.info(f"Strain '{strain_name}' is already in favorites for user {user_id}.")
             raise HTTPException(
                 status_code=400,
                 detail="Strain is already in favorites."
             )
-
-        favorites.append(strain_name)
-        user_profile["favorites"] = favorites
-
-        # Award badge for adding favorites
-        if len(favorites) == 5:
-            award_badge(user_profile, "Favorites Collector")
-
-        save_user_profile(user_id, user_profile)
+        if result["badge"]:
+            logging.info(f"Awarded badge '{result['badge']}' to user {user_id}.")
 
         logging.info(f"Strain '{strain_name}' added to favorites for user {user_id}.")
         return {"message": "Strain added to favorites successfully."}
@@ -852,20 +1107,16 @@ def remove_favorite(favorite: FavoriteRequest):
         user_id = favorite.user_id
         strain_name = normalize_strain_name(favorite.strain_name)
 
-        user_profile = get_user_profile(user_id)
-
-        favorites = user_profile.get("favorites", [])
-        if strain_name not in favorites:
+        removed = user_scripts(user_id).remove_favorite(user_id, strain_name)
+        if removed is None:
+            raise user_not_found(user_id)
+        if not removed:
             logging.warning(f"Strain '{strain_name}' not found in favorites for user {user_id}.")
             raise HTTPException(
                 status_code=404,
                 detail="Strain not found in favorites."
             )
 
-        favorites.remove(strain_name)
-        user_profile["favorites"] = favorites
-        save_user_profile(user_id, user_profile)
-
         logging.info(f"Strain '{strain_name}' removed from favorites for user {user_id}.")
         return {"message": "Strain removed from favorites successfully."}
 
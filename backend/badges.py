@@ -0,0 +1,14 @@
+# badges.py
+
+# ---------------------------
+# Badge Thresholds
+# ---------------------------
+# Count reached -> badge awarded at that exact count. Awarding happens in
+# Redis (profile_store.py) so it is atomic with the write that reached the count.
+REVIEW_BADGES = {1: "First Review", 10: "Review Enthusiast"}
+FEEDBACK_BADGES = {5: "Feedback Contributor"}
+FAVORITE_BADGES = {5: "Favorites Collector"}
+
+def badge_message(badge_name: str) -> str:
+    """The notification sent when a badge is awarded."""
+    return f"Congratulations! You've earned the '{badge_name}' badge."
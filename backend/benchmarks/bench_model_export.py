@@ -0,0 +1,62 @@
+# bench_model_export.py
+#
+# CPU latency of the DeepHybridRecommender in its eager float32 form against
+# the exported TorchScript artifacts (model_export.py): BatchNorm folded,
+# with and without dynamic int8 quantization, for batch sizes 1-4096.
+#
+#   python benchmarks/bench_model_export.py --checkpoint models/best_hybrid_model.pth --threads 1
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_export import export_model, load_checkpoint, parity_report, sample_features  # noqa: E402
+
+BATCH_SIZES = [1, 8, 64, 256, 1024, 4096]
+
+def time_model(model, features: torch.Tensor, min_seconds: float) -> float:
+    """Median seconds per forward pass over at least `min_seconds` of calls."""
+    timings = []
+    with torch.no_grad():
+        for _ in range(3):
+            model(features)
+        while sum(timings) < min_seconds or len(timings) < 5:
+            start = time.perf_counter()
+            model(features)
+            timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exported hybrid model inference latency.")
+    parser.add_argument("--checkpoint", default=os.path.join("models", "best_hybrid_model.pth"))
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Timing budget per model and batch size")
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    model = load_checkpoint(args.checkpoint)
+    variants = {
+        "eager fp32": model,
+        "folded fp32": export_model(model, quantize=False),
+        "folded int8": export_model(model, quantize=True),
+    }
+    input_size = model.network[0].in_features
+    report = parity_report(model, variants["folded int8"], sample_features(input_size, 100_000))
+    print(f"int8 parity: mean |dev| {report['mean_abs_deviation']:.4f}, p99 {report['p99_abs_deviation']:.4f}, "
+          f"top-10 overlap {report['top_k_overlap']:.3f}")
+
+    print(f"{'batch':>6}  " + "  ".join(f"{name:>20}" for name in variants) + "  (ms/batch, speedup vs eager)")
+    for batch_size in BATCH_SIZES:
+        features = sample_features(input_size, batch_size, seed=batch_size)
+        timings = {name: time_model(variant, features, args.min_seconds) for name, variant in variants.items()}
+        baseline = timings["eager fp32"]
+        print(f"{batch_size:>6}  " + "  ".join(
+            f"{timings[name] * 1e3:>12.3f} ({baseline / timings[name]:4.2f}x)" for name in variants))
+
+if __name__ == "__main__":
+    main()
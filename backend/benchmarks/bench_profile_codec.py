@@ -0,0 +1,109 @@
+# bench_profile_codec.py
+#
+# Compares stored bytes and encode/decode time of user profiles under the
+# legacy json.dumps format and each ProfileCodec configuration.
+#
+#   python benchmarks/bench_profile_codec.py --reviews 100 300 1000
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profile_codec import ProfileCodec, now_epoch, format_profile_timestamps  # noqa: E402
+
+EFFECTS = ["relaxed", "happy", "sleepy", "euphoric", "uplifted", "creative", "focused", "hungry"]
+WORDS = "smooth earthy citrus heavy body high mellow clear headed piney sweet skunky couch lock".split()
+
+def make_profile(num_reviews: int, seed: int = 42) -> dict:
+    """Builds a realistic profile with `num_reviews` reviews and matching feedback."""
+    rng = random.Random(seed)
+    start = now_epoch() - 365 * 24 * 3600
+    reviews = []
+    feedback = {}
+    for i in range(num_reviews):
+        strain_name = f"strain {rng.randrange(35000)}"
+        reviews.append({
+            "Strain_Name": strain_name,
+            "rating": rng.choice([1.0, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0]),
+            "text": " ".join(rng.choices(WORDS, k=rng.randint(5, 30))),
+            "date": start + i * 3600,
+            "metrics": {key: rng.randint(1, 10) for key in ("potency", "taste", "aroma", "value")},
+        })
+        feedback[strain_name] = {"type": rng.choice(["like", "dislike"]), "date": start + i * 3600}
+    return {
+        "user_id": 134,
+        "email": "user@example.com",
+        "password": "$2b$12$" + "x" * 53,
+        "preferences": {
+            "desired_effects": rng.sample(EFFECTS, 3),
+            "experience_level": "experienced",
+            "familiar_strains": ["afghan ghost", "blue dream"],
+            "terpenes": ["myrcene"],
+            "may_relieve": ["stress"],
+        },
+        "badges": ["First Review", "Review Enthusiast", "Feedback Contributor"],
+        "achievements": {},
+        "reviews": reviews,
+        "notifications": [],
+        "favorites": [f"strain {rng.randrange(35000)}" for _ in range(20)],
+        "last_login": now_epoch(),
+        "survey_completed": True,
+        "strain_feedback": feedback,
+    }
+
+def legacy_profile(profile: dict) -> dict:
+    """The same profile with `str(datetime.now())` style timestamps, as the old format stored it."""
+    legacy = format_profile_timestamps(profile)
+    # str(datetime) includes microseconds for most real timestamps.
+    micro = datetime.timedelta(microseconds=123456)
+    legacy["last_login"] = str(datetime.datetime.fromisoformat(legacy["last_login"]) + micro)
+    for review in legacy["reviews"]:
+        review["date"] = str(datetime.datetime.fromisoformat(review["date"]) + micro)
+    for entry in legacy["strain_feedback"].values():
+        entry["date"] = str(datetime.datetime.fromisoformat(entry["date"]) + micro)
+    return legacy
+
+def time_call(fn, repeat: int) -> float:
+    """Best-of-5 mean time per call in microseconds."""
+    return min(timeit.repeat(fn, number=repeat, repeat=5)) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark profile codecs.")
+    parser.add_argument("--reviews", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    configs = [
+        ("json (legacy)", None),
+        ("json", ProfileCodec("json", compress_threshold=None)),
+        ("orjson", ProfileCodec("orjson", compress_threshold=None)),
+        ("msgpack", ProfileCodec("msgpack", compress_threshold=None)),
+        ("orjson+zstd", ProfileCodec("orjson", compress_threshold=1024)),
+        ("msgpack+zstd", ProfileCodec("msgpack", compress_threshold=1024)),
+    ]
+
+    print(f"{'reviews':>7}  {'codec':<14} {'bytes':>9} {'encode us':>10} {'decode us':>10}")
+    for num_reviews in args.reviews:
+        profile = make_profile(num_reviews)
+        legacy = legacy_profile(profile)
+        for name, codec in configs:
+            if codec is None:
+                data = json.dumps(legacy)
+                encode = lambda: json.dumps(legacy)  # noqa: E731
+                decode = lambda: json.loads(data)  # noqa: E731
+            else:
+                data = codec.encode(profile)
+                encode = lambda: codec.encode(profile)  # noqa: E731
+                decode = lambda: codec.decode(data)  # noqa: E731
+                assert codec.decode(data) == profile
+            print(f"{num_reviews:>7}  {name:<14} {len(data):>9} "
+                  f"{time_call(encode, args.repeat):>10.1f} {time_call(decode, args.repeat):>10.1f}")
+
+if __name__ == "__main__":
+    main()
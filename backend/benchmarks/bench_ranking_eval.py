@@ -0,0 +1,72 @@
+# bench_ranking_eval.py
+#
+# Times full-population ranking evaluation (ranking_eval.py) against the
+# notebook-style loop that scores one user at a time and intersects Python
+# sets, on synthetic factors shaped like production (114k users, 35k strains).
+#
+#   python benchmarks/bench_ranking_eval.py --users 114420 --workers 4
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking_eval import build_csr, evaluate_ranking, relevance_csr  # noqa: E402
+
+def legacy_precision_recall(user_vectors, item_vectors, truth_sets, seen_sets, k):
+    """Per-user scoring plus set intersections, as in precision_recall_at_k_per_user."""
+    precisions, recalls = [], []
+    for user, true_items in truth_sets.items():
+        scores = item_vectors @ user_vectors[user]
+        for item in seen_sets.get(user, ()):
+            scores[item] = -np.inf
+        predicted = set(np.argsort(-scores)[:k].tolist())
+        relevant = len(predicted & true_items)
+        precisions.append(relevant / k)
+        recalls.append(relevant / len(true_items))
+    return np.mean(precisions), np.mean(recalls)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline ranking evaluation.")
+    parser.add_argument("--users", type=int, default=114_420)
+    parser.add_argument("--strains", type=int, default=34_971)
+    parser.add_argument("--factors", type=int, default=50)
+    parser.add_argument("--ratings-per-user", type=int, default=175)
+    parser.add_argument("--legacy-users", type=int, default=500, help="Users to time for the slow baseline")
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    user_vectors = rng.standard_normal((args.users, args.factors), dtype=np.float32)
+    item_vectors = rng.standard_normal((args.strains, args.factors), dtype=np.float32)
+    num_ratings = args.users * args.ratings_per_user
+    users = np.repeat(np.arange(args.users), args.ratings_per_user)
+    items = rng.integers(0, args.strains, num_ratings)
+    ratings = rng.integers(1, 6, num_ratings)
+    is_test = rng.random(num_ratings) < 0.15
+    truth = relevance_csr(users[is_test], items[is_test], ratings[is_test], args.users)
+    seen = build_csr(users[~is_test], items[~is_test], args.users)
+    print(f"{num_ratings:,} ratings, {np.count_nonzero(truth.lengths()):,} users with test positives")
+
+    sample = np.flatnonzero(truth.lengths() > 0)[:args.legacy_users]
+    truth_sets = {int(u): set(truth.indices[truth.indptr[u]:truth.indptr[u + 1]].tolist()) for u in sample}
+    seen_sets = {int(u): seen.indices[seen.indptr[u]:seen.indptr[u + 1]].tolist() for u in sample}
+    start = time.perf_counter()
+    legacy_precision_recall(user_vectors, item_vectors, truth_sets, seen_sets, args.k)
+    per_user = (time.perf_counter() - start) / len(sample)
+    print(f"before  per-user loop:      {per_user * 1e3:8.2f} ms/user "
+          f"(~{per_user * args.users / 60:.1f} min for the population)")
+
+    for use_faiss in (False, True):
+        metrics = evaluate_ranking(truth, item_vectors, user_vectors, k=args.k, exclude=seen,
+                                   use_faiss=use_faiss, workers=args.workers)
+        label = "faiss search" if use_faiss else "batched matmul"
+        print(f"after   {label:<18}  {metrics['seconds'] * 1e3 / metrics['users_evaluated']:8.2f} ms/user "
+              f"({metrics['seconds']:.1f}s for {metrics['users_evaluated']:,} users)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_training_dataset.py
+#
+# Measures training-input throughput (samples/sec) of the notebook's per-row
+# HybridFeatureDataset + DataLoader against the batch-level gather dataset
+# in hybrid_training.py, on synthetic embeddings shaped like production
+# (114k users x 128, 35k strains x 128 + 64 CBF).
+#
+#   python benchmarks/bench_training_dataset.py --rows 2000000
+
+import argparse
+import logging
+import os
+import sys
+import time
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hybrid_training import HybridFeatureTables, InteractionBatchDataset, create_batch_loader  # noqa: E402
+
+class LegacyHybridFeatureDataset(Dataset):
+    """The notebook's per-row dataset, kept here as the baseline."""
+
+    def __init__(self, user_ids, strain_ids, ratings, user_embeddings, strain_embeddings, strain_embeddings_cbf):
+        self.user_ids = user_ids
+        self.strain_ids = strain_ids
+        self.ratings = ratings.astype(np.float32)
+        self.user_embeddings = user_embeddings
+        self.strain_embeddings = strain_embeddings
+        self.strain_embeddings_cbf = strain_embeddings_cbf
+        self.logger = logging.getLogger(__name__)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, idx):
+        user_id = self.user_ids[idx]
+        strain_id = self.strain_ids[idx]
+        user_emb = self.user_embeddings[user_id]
+        strain_emb = self.strain_embeddings[strain_id]
+        strain_emb_cbf = self.strain_embeddings_cbf[strain_id]
+        if np.isnan(user_emb).any() or np.isnan(strain_emb).any() or np.isnan(strain_emb_cbf).any():
+            user_emb = np.nan_to_num(user_emb)
+            strain_emb = np.nan_to_num(strain_emb)
+            strain_emb_cbf = np.nan_to_num(strain_emb_cbf)
+        hybrid_feature = np.concatenate([user_emb, strain_emb, strain_emb_cbf]).astype(np.float32)
+        return hybrid_feature, self.ratings[idx], user_id, strain_id
+
+def throughput(loader, max_rows: int) -> float:
+    rows = 0
+    start = time.perf_counter()
+    for features, ratings, _, _ in loader:
+        rows += len(ratings)
+        if rows >= max_rows:
+            break
+    return rows / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark training input pipelines.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=200_000, help="Rows to time for the slow baseline")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    user_emb = rng.standard_normal((114_420, 128), dtype=np.float32)
+    strain_emb = rng.standard_normal((34_971, 128), dtype=np.float32)
+    strain_cbf = rng.standard_normal((34_971, 64), dtype=np.float32)
+    user_ids = rng.integers(0, len(user_emb), args.rows)
+    strain_ids = rng.integers(0, len(strain_emb), args.rows)
+    ratings = rng.uniform(1, 5, args.rows).astype(np.float32)
+
+    legacy = LegacyHybridFeatureDataset(user_ids, strain_ids, ratings, user_emb, strain_emb, strain_cbf)
+    for workers in sorted({0, args.workers}):
+        loader = DataLoader(legacy, batch_size=256, shuffle=True, num_workers=workers)
+        print(f"before  per-row dataset, batch 256, {workers} workers: "
+              f"{throughput(loader, args.legacy_rows):>12,.0f} samples/sec")
+
+    tables = HybridFeatureTables(user_emb, strain_emb, strain_cbf)
+    dataset = InteractionBatchDataset(user_ids, strain_ids, ratings, tables)
+    expected = np.concatenate([user_emb[user_ids[:5]], strain_emb[strain_ids[:5]], strain_cbf[strain_ids[:5]]], axis=1)
+    assert np.array_equal(dataset[torch.arange(5)][0].numpy(), expected)
+    for batch_size in (256, 4096, 16384):
+        loader = create_batch_loader(dataset, batch_size, shuffle=True)
+        print(f"after   batch gather, batch {batch_size:>5}, 0 workers: "
+              f"{throughput(loader, args.rows):>12,.0f} samples/sec")
+
+if __name__ == "__main__":
+    main()
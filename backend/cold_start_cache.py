@@ -0,0 +1,106 @@
+# cold_start_cache.py
+
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Iterable, List, Optional
+
+# ---------------------------
+# Preference Signatures
+# ---------------------------
+# Survey fields that cold-start ranking depends on. A user with no
+# resolvable strain signals is scored from the catalog-mean embedding, so
+# two such users with equal values for these fields get the same result.
+COLD_START_FIELDS = ("desired_effects", "terpenes", "may_relieve")
+# Bump when the ranking code (rank_strains, StrainSignals.score) changes the
+# results for the same catalog and settings, so cached rankings are not reused.
+SCORING_VERSION = 1
+
+CACHE_PREFIX = "cold_start_recs"
+SIGNATURE_COUNTS_KEY = "cold_start_signature_counts"
+CATALOG_VERSION_KEY = "cold_start_catalog_version"
+SIGNATURE_COUNTS_KEPT = 1000  # Distinct signatures whose request counts are tracked
+
+def preference_signature(preferences: dict, fields: Iterable[str] = COLD_START_FIELDS) -> str:
+    """Canonical form of the preferences cold-start ranking reads: sorted, de-duplicated, lowercased."""
+    canonical = {field: sorted({str(value).lower().strip() for value in preferences.get(field) or []})
+                 for field in fields}
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+def catalog_version(paths: Iterable[str]) -> str:
+    """Fingerprint of the catalog files (size and mtime); changes whenever any of them is replaced."""
+    fingerprint = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        else:
+            fingerprint.update(f"{path}:missing;".encode())
+    return fingerprint.hexdigest()[:16]
+
+def ranking_fingerprint(settings: dict, fields: Iterable[str] = COLD_START_FIELDS,
+                        scoring_version: int = SCORING_VERSION) -> str:
+    """Fingerprint of what decides a cold-start ranking besides the catalog: settings, fields, scoring code."""
+    payload = json.dumps({"settings": settings, "fields": list(fields), "scoring_version": scoring_version},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+# ---------------------------
+# Shared Cache
+# ---------------------------
+class ColdStartCache:
+    """
+    Redis-backed cache of cold-start recommendations, shared by all workers.
+
+    Entries are keyed by catalog version, ranking fingerprint and preference
+    signature. `catalog_version_fn` is called on every lookup, so a replaced
+    catalog or changed ranking makes old entries unreachable at once; they
+    expire with their TTL, and `sync_catalog_version` deletes them at
+    startup. Request counts per signature are kept in a sorted set so the
+    most common combinations can be precomputed at startup.
+    """
+
+    def __init__(self, redis_client, catalog_version_fn: Callable[[], str], ranking: str = "",
+                 ttl: int = 86400):
+        self.redis_client = redis_client
+        self.catalog_version_fn = catalog_version_fn
+        self.ranking = ranking
+        self.ttl = ttl
+
+    @property
+    def version(self) -> str:
+        return f"{self.catalog_version_fn()}-{self.ranking}" if self.ranking else self.catalog_version_fn()
+
+    def key(self, signature: str) -> str:
+        digest = hashlib.sha1(signature.encode()).hexdigest()[:20]
+        return f"{CACHE_PREFIX}:{self.version}:{digest}"
+
+    def get(self, signature: str) -> Optional[dict]:
+        cached = self.redis_client.get(self.key(signature))
+        return json.loads(cached) if cached else None
+
+    def put(self, signature: str, result: dict):
+        self.redis_client.set(self.key(signature), json.dumps(result), ex=self.ttl)
+
+    def record_request(self, signature: str):
+        self.redis_client.zincrby(SIGNATURE_COUNTS_KEY, 1, signature)
+
+    def most_common(self, count: int) -> List[str]:
+        """The `count` most requested signatures; older, rarer ones are trimmed."""
+        self.redis_client.zremrangebyrank(SIGNATURE_COUNTS_KEY, 0, -SIGNATURE_COUNTS_KEPT - 1)
+        return self.redis_client.zrevrange(SIGNATURE_COUNTS_KEY, 0, count - 1)
+
+    def sync_catalog_version(self) -> bool:
+        """Drops entries from other catalog versions or rankings; returns True if the version changed."""
+        version = self.version
+        previous = self.redis_client.getset(CATALOG_VERSION_KEY, version)
+        if previous == version:
+            return False
+        stale = [key for key in self.redis_client.scan_iter(match=f"{CACHE_PREFIX}:*", count=1000)
+                 if not key.startswith(f"{CACHE_PREFIX}:{version}:")]
+        if stale:
+            self.redis_client.delete(*stale)
+        logging.info(f"Cold-start cache moved to catalog version {version}; "
+                     f"dropped {len(stale)} stale entries.")
+        return True
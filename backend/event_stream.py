@@ -0,0 +1,589 @@
+# event_stream.py
+#
+# Write-behind event stream for reviews and feedback.
+#
+# API handlers append one event per write with `publish_user_event`, which
+# checks that the user exists and appends in one scripted round trip, and
+# return.
+# Consumer-group workers (`python event_stream.py work`) apply the profile
+# change and every derived update for that event: strain aggregates,
+# leaderboard, trending buckets and badges/notifications. Adding a derived
+# feature means adding to `EventProcessor`, not to the request path.
+#
+# Entries that cannot be decoded or applied are copied to a dead-letter
+# stream (`events_user_writes_dead`) with the error and acknowledged, so one
+# bad entry does not stall its batch or get redelivered forever.
+#
+# `replay` re-applies a range of the stream and skips events already
+# applied. `rebuild` recomputes the leaderboard, strain aggregates and
+# trending from the streams without touching profiles.
+#
+# With sharded Redis (redis_shards.py) every shard node has its own stream,
+# holding the events of the users it owns, and needs its own workers. The
+# global node comes from --global-node, else from REDIS_GLOBAL_NODE or the
+# first of REDIS_NODES, as in the API:
+#   python event_stream.py --host shard2 --global-node shard1:6379 work
+
+import argparse
+import json
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import redis
+
+from badges import REVIEW_BADGES, FEEDBACK_BADGES
+from profile_codec import ProfileCodec
+from profile_store import ProfileScripts
+from redis_shards import RedisShards, parse_nodes
+from trending import TrendingStrains
+
+# ---------------------------
+# Stream Configuration
+# ---------------------------
+STREAM_KEY = 'events_user_writes'
+DEAD_LETTER_KEY = 'events_user_writes_dead'
+DEAD_LETTER_MAXLEN = 100_000
+CONSUMER_GROUP = 'derived_writers'
+STREAM_MAXLEN = 5_000_000  # Approximate cap; keep well above worst-case backlog
+LEADERBOARD_KEY = 'leaderboard'
+# Keys computed only from events, rebuilt by `rebuild_derived`: the per-node
+# leaderboard and, on the global node, strain aggregates, all-time
+# popularity, trending buckets and cached trending views.
+GLOBAL_DERIVED_PATTERNS = ('strain_reviews_*', 'strain_feedback_*', 'strain_popularity*', 'strain_trending_*')
+APPLIED_RETENTION = 7 * 24 * 3600  # Seconds an event id is remembered for de-duplication
+CLAIM_IDLE_MS = 60_000  # Pending events idle this long are reclaimed from dead consumers
+RETRY_BACKOFF_SECONDS = (0.5, 30.0)  # First and longest wait after losing the Redis connection
+
+EVENT_REVIEW = 'review'
+EVENT_FEEDBACK = 'feedback'
+
+def applied_events_key(user_id) -> str:
+    return f"user_applied_events_{user_id}"
+
+def global_applied_events_key(user_id) -> str:
+    # Not a user_* key: it lives on the global node beside the aggregates it guards.
+    return f"global_applied_events_{user_id}"
+
+# ---------------------------
+# Publishing
+# ---------------------------
+def event_fields(event_type: str, user_id: int, payload: dict) -> Dict[str, str]:
+    return {"type": event_type, "user_id": str(user_id), "ts": str(int(time.time())), "payload": json.dumps(payload)}
+
+def publish_event(redis_client, event_type: str, user_id: int, payload: dict) -> str:
+    """Appends one write event to the stream and returns its id."""
+    event_id = redis_client.xadd(STREAM_KEY, event_fields(event_type, user_id, payload),
+                                 maxlen=STREAM_MAXLEN, approximate=True)
+    return event_id.decode() if isinstance(event_id, bytes) else event_id
+
+def publish_user_event(scripts: ProfileScripts, event_type: str, user_id: int, payload: dict) -> Optional[str]:
+    """Appends a write event only if the user's profile exists; returns its id, or None if it does not."""
+    return scripts.publish_event(STREAM_KEY, STREAM_MAXLEN, user_id, event_fields(event_type, user_id, payload))
+
+def ensure_consumer_group(redis_client, group: str = CONSUMER_GROUP, start_id: str = '0'):
+    """Creates the consumer group (and the stream) if it does not exist yet."""
+    try:
+        redis_client.xgroup_create(STREAM_KEY, group, id=start_id, mkstream=True)
+        logging.info(f"Created consumer group '{group}' on stream '{STREAM_KEY}'.")
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+# ---------------------------
+# Lag Metric
+# ---------------------------
+def _id_millis(stream_id) -> int:
+    if isinstance(stream_id, bytes):
+        stream_id = stream_id.decode()
+    return int(str(stream_id).split('-')[0])
+
+def stream_lag(redis_client, group: str = CONSUMER_GROUP) -> dict:
+    """
+    Reports how far the consumer group is behind the stream.
+
+    `lag` is the number of undelivered entries (Redis >= 7, else None),
+    `pending` the delivered-but-unacknowledged count, and `lag_seconds` the
+    age gap between the newest event and the last one handed to a worker.
+    """
+    try:
+        stream_info = redis_client.xinfo_stream(STREAM_KEY)
+    except redis.ResponseError:
+        return {"length": 0, "lag": 0, "pending": 0, "lag_seconds": 0.0}
+
+    groups = {}
+    for info in redis_client.xinfo_groups(STREAM_KEY):
+        name = info["name"].decode() if isinstance(info["name"], bytes) else info["name"]
+        groups[name] = info
+    group_info = groups.get(group)
+    if group_info is None:
+        return {"length": stream_info["length"], "lag": stream_info["length"], "pending": 0, "lag_seconds": None}
+
+    last_generated = stream_info.get("last-generated-id")
+    last_delivered = group_info.get("last-delivered-id")
+    lag_seconds = 0.0
+    if last_generated and last_delivered:
+        delivered_ms = _id_millis(last_delivered)
+        if delivered_ms == 0 and stream_info.get("first-entry"):
+            # Nothing delivered yet: the backlog starts at the oldest entry.
+            delivered_ms = _id_millis(stream_info["first-entry"][0])
+        lag_seconds = max(_id_millis(last_generated) - delivered_ms, 0) / 1000.0
+    return {
+        "length": stream_info["length"],
+        "lag": group_info.get("lag"),
+        "pending": group_info["pending"],
+        "lag_seconds": lag_seconds,
+    }
+
+def combined_stream_lag(lags: Dict[str, dict]) -> dict:
+    """Sums per-shard `stream_lag` reports (the lag in seconds is the worst shard's) and keeps them by node."""
+    reports = list(lags.values())
+    combined = {
+        "length": sum(report["length"] for report in reports),
+        "lag": None if any(report["lag"] is None for report in reports) else sum(report["lag"] for report in reports),
+        "pending": sum(report["pending"] for report in reports),
+        "lag_seconds": None if any(report["lag_seconds"] is None for report in reports)
+        else max(report["lag_seconds"] for report in reports),
+    }
+    if len(lags) > 1:
+        combined["shards"] = lags
+    return combined
+
+# ---------------------------
+# Event Processor
+# ---------------------------
+class EventProcessor:
+    """
+    Applies write events with at-least-once delivery and exactly-once effect.
+
+    Events are grouped per user and applied in one WATCH/MULTI transaction
+    per user that also records the applied event ids, so a redelivered or
+    replayed event is detected and skipped instead of being counted twice.
+
+    `redis_client` is the node holding the stream and its users' keys. With
+    sharding (redis_shards.py) the strain aggregates and trending live on a
+    separate `global_client`. They are then written in a second transaction
+    on that node, de-duplicated by their own applied-event set, so a crash
+    between the two transactions neither loses nor repeats an update.
+    """
+
+    def __init__(self, redis_client, profile_codec: ProfileCodec, group: str = CONSUMER_GROUP,
+                 global_client=None):
+        # Needs clients without response decoding: profiles are binary.
+        self.redis_client = redis_client
+        self.global_client = global_client if global_client is not None else redis_client
+        self.profile_codec = profile_codec
+        self.scripts = ProfileScripts(redis_client)
+        self.trending = TrendingStrains(self.global_client)
+        self.group = group
+
+    @property
+    def colocated(self) -> bool:
+        return self.global_client is self.redis_client
+
+    def apply_batch(self, entries: List[Tuple], ack: bool = True) -> int:
+        """
+        Applies a batch of (event_id, fields) stream entries; returns how many took effect.
+
+        An entry that fails to decode or apply is dead-lettered when `ack` is
+        set and only logged otherwise (replays), and the rest of the batch
+        still applies. Connection errors propagate so the caller can retry.
+        """
+        by_user = defaultdict(list)
+        raw_fields = {}
+        for event_id, fields in entries:
+            try:
+                event = decode_event(event_id, fields)
+            except Exception as e:
+                self._reject(event_id, fields, e, ack)
+                continue
+            raw_fields[event["id"]] = fields
+            by_user[event["user_id"]].append(event)
+
+        applied = 0
+        for user_id, events in by_user.items():
+            events.sort(key=lambda event: tuple(int(part) for part in event["id"].split('-')))
+            try:
+                applied += self._apply_user_events(user_id, events, ack=ack)
+            except (redis.ConnectionError, redis.TimeoutError):
+                raise
+            except Exception:
+                # Find the bad event: apply the user's events one at a time.
+                for event in events:
+                    try:
+                        applied += self._apply_user_events(user_id, [event], ack=ack)
+                    except (redis.ConnectionError, redis.TimeoutError):
+                        raise
+                    except Exception as e:
+                        self._reject(event["id"], raw_fields[event["id"]], e, ack)
+        return applied
+
+    def _reject(self, event_id, fields: dict, error: Exception, ack: bool):
+        """Moves a poison entry to the dead-letter stream and acknowledges it (only logs it without `ack`)."""
+        event_id = event_id.decode() if isinstance(event_id, bytes) else event_id
+        if not ack:
+            logging.error(f"Skipping event {event_id} that cannot be applied: {error!r}")
+            return
+        logging.error(f"Moving event {event_id} to '{DEAD_LETTER_KEY}': {error!r}")
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(DEAD_LETTER_KEY, {**fields, "source_id": event_id, "error": repr(error)[:1000]},
+                      maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+            pipe.xack(STREAM_KEY, self.group, event_id)
+            pipe.execute()
+
+    def _apply_user_events(self, user_id: int, events: List[dict], ack: bool) -> int:
+        profile_key = f"user_profile_{user_id}"
+        applied_key = applied_events_key(user_id)
+        event_ids = [event["id"] for event in events]
+
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(profile_key, applied_key)
+                    profile_data = pipe.get(profile_key)
+                    seen = pipe.zmscore(applied_key, event_ids)
+                    pending_events = [event for event, score in zip(events, seen) if score is None]
+                    if profile_data is None:
+                        logging.warning(f"Dropping {len(events)} event(s) for missing user profile {user_id}.")
+                        pending_events = []
+
+                    pipe.multi()
+                    if pending_events:
+                        profile = self.profile_codec.decode(profile_data)
+                        for event in pending_events:
+                            self._apply_user_event(pipe, profile, event)
+                            if self.colocated:
+                                self._apply_global_event(pipe, event)
+                        pipe.set(profile_key, self.profile_codec.encode(profile))
+
+                    now = time.time()
+                    pipe.zadd(applied_key, {event_id: now for event_id in event_ids})
+                    pipe.zremrangebyscore(applied_key, '-inf', now - APPLIED_RETENTION)
+                    if ack and self.colocated:
+                        pipe.xack(STREAM_KEY, self.group, *event_ids)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    continue
+
+        if not self.colocated:
+            # Every event of an existing user, not only the new ones: a previous
+            # attempt may have stopped after the user transaction.
+            if profile_data is not None:
+                self._apply_global_events(user_id, events)
+            if ack:
+                self.redis_client.xack(STREAM_KEY, self.group, *event_ids)
+
+        if pending_events:
+            logging.info(f"Applied {len(pending_events)} event(s) for user {user_id}.")
+        return len(pending_events)
+
+    def _apply_global_events(self, user_id: int, events: List[dict]):
+        applied_key = global_applied_events_key(user_id)
+        event_ids = [event["id"] for event in events]
+        with self.global_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(applied_key)
+                    seen = pipe.zmscore(applied_key, event_ids)
+                    pipe.multi()
+                    for event, score in zip(events, seen):
+                        if score is None:
+                            self._apply_global_event(pipe, event)
+                    now = time.time()
+                    pipe.zadd(applied_key, {event_id: now for event_id in event_ids})
+                    pipe.zremrangebyscore(applied_key, '-inf', now - APPLIED_RETENTION)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def _apply_user_event(self, pipe, profile: dict, event: dict):
+        """Profile, leaderboard and badges: keys on the user's own node."""
+        payload = event["payload"]
+        strain_name = payload["strain_name"]
+
+        if event["type"] == EVENT_REVIEW:
+            review_entry = {
+                "Strain_Name": strain_name,
+                "rating": payload["rating"],
+                "text": payload.get("text", ""),
+                "date": event["ts"],
+            }
+            if payload.get("metrics"):
+                review_entry["metrics"] = payload["metrics"]
+            profile.setdefault("reviews", []).append(review_entry)
+
+            # Each shard ranks its own users; readers merge the shards (RedisShards.gather_top).
+            pipe.zincrby(LEADERBOARD_KEY, 1, event["user_id"])
+            self.scripts.award_count_badge(event["user_id"], REVIEW_BADGES, len(profile["reviews"]), client=pipe)
+
+        elif event["type"] == EVENT_FEEDBACK:
+            feedback_type = payload["feedback_type"]
+            profile.setdefault("strain_feedback", {})[strain_name] = {"type": feedback_type, "date": event["ts"]}
+            self.scripts.award_count_badge(event["user_id"], FEEDBACK_BADGES, len(profile["strain_feedback"]),
+                                           client=pipe)
+
+        else:
+            logging.warning(f"Skipping event {event['id']} with unknown type '{event['type']}'.")
+
+    def _apply_global_event(self, pipe, event: dict):
+        """Strain aggregates and trending: keys on the global node."""
+        payload = event["payload"]
+        strain_name = payload["strain_name"]
+
+        if event["type"] == EVENT_REVIEW:
+            strain_reviews_key = f"strain_reviews_{strain_name}"
+            pipe.hincrby(strain_reviews_key, "review_count", 1)
+            pipe.hincrbyfloat(strain_reviews_key, "rating_sum", payload["rating"])
+
+        elif event["type"] == EVENT_FEEDBACK:
+            feedback_key = f"strain_feedback_{strain_name}"
+            if payload["feedback_type"] == "like":
+                pipe.hincrby(feedback_key, "likes", 1)
+                self.trending.record_like(strain_name, timestamp=event["ts"], pipe=pipe)
+            else:
+                pipe.hincrby(feedback_key, "dislikes", 1)
+
+def decode_event(event_id, fields: dict) -> dict:
+    """Turns a raw stream entry into an event dict."""
+    def text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    fields = {text(key): text(value) for key, value in fields.items()}
+    event = {
+        "id": text(event_id),
+        "type": fields["type"],
+        "user_id": int(fields["user_id"]),
+        "ts": int(fields["ts"]),
+        "payload": json.loads(fields["payload"]),
+    }
+    # Checked here rather than half-way through a transaction on the global node.
+    payload = event["payload"]
+    if not isinstance(payload, dict) or not isinstance(payload.get("strain_name"), str):
+        raise ValueError("payload has no strain_name")
+    if event["type"] == EVENT_REVIEW:
+        payload["rating"] = float(payload["rating"])
+    elif event["type"] == EVENT_FEEDBACK and not isinstance(payload.get("feedback_type"), str):
+        raise ValueError("payload has no feedback_type")
+    return event
+
+# ---------------------------
+# Worker and Replay
+# ---------------------------
+def run_worker(processor: EventProcessor, consumer: str, batch_size: int = 500, block_ms: int = 1000):
+    """
+    Consumes the stream forever, reclaiming events left pending by dead consumers.
+
+    Lost connections are retried with exponential backoff; events that were
+    read but not acknowledged are redelivered by the reclaim pass.
+    """
+    backoff = RETRY_BACKOFF_SECONDS[0]
+    while True:
+        started = time.monotonic()
+        try:
+            _consume(processor, consumer, batch_size, block_ms)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            if time.monotonic() - started > RETRY_BACKOFF_SECONDS[1]:
+                backoff = RETRY_BACKOFF_SECONDS[0]  # Was connected for a while: start over
+            logging.warning(f"Event worker '{consumer}' lost Redis ({e}); retrying in {backoff:g}s.")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, RETRY_BACKOFF_SECONDS[1])
+
+def _consume(processor: EventProcessor, consumer: str, batch_size: int, block_ms: int):
+    redis_client = processor.redis_client
+    ensure_consumer_group(redis_client, processor.group)
+    logging.info(f"Event worker '{consumer}' started on group '{processor.group}'.")
+    last_claim = 0.0
+
+    while True:
+        if time.monotonic() - last_claim > CLAIM_IDLE_MS / 1000:
+            last_claim = time.monotonic()
+            claim_start = '0-0'
+            while True:
+                claim_start, claimed, *_ = redis_client.xautoclaim(
+                    STREAM_KEY, processor.group, consumer, CLAIM_IDLE_MS, start_id=claim_start, count=batch_size)
+                if claimed:
+                    logging.info(f"Reclaimed {len(claimed)} stale event(s).")
+                    processor.apply_batch(claimed)
+                if _id_millis(claim_start) == 0:
+                    break
+
+        response = redis_client.xreadgroup(
+            processor.group, consumer, {STREAM_KEY: '>'}, count=batch_size, block=block_ms)
+        for _, entries in response or []:
+            if entries:
+                processor.apply_batch(entries)
+
+def _read_range(redis_client, key: str, start: str = '-', end: str = '+', batch_size: int = 1000):
+    """Yields the entries of a stream in [start, end], `batch_size` at a time."""
+    cursor = start
+    while True:
+        entries = redis_client.xrange(key, min=cursor, max=end, count=batch_size)
+        if not entries:
+            return
+        yield entries
+        last_id = entries[-1][0]
+        last_id = last_id.decode() if isinstance(last_id, bytes) else last_id
+        cursor = '(' + last_id
+        if len(entries) < batch_size:
+            return
+
+def replay(processor: EventProcessor, start: str = '-', end: str = '+', batch_size: int = 1000) -> int:
+    """
+    Re-applies stream events in [start, end].
+
+    Already-applied events are skipped, so a replay only fills in anything
+    missing. To recompute derived keys that were wiped or drifted, use
+    `rebuild_derived`.
+    """
+    applied = 0
+    for entries in _read_range(processor.redis_client, STREAM_KEY, start, end, batch_size):
+        applied += processor.apply_batch(entries, ack=False)
+    logging.info(f"Replay of [{start}, {end}] applied {applied} event(s).")
+    return applied
+
+def stream_drained(redis_client) -> bool:
+    """True when the consumer group has received and acknowledged every event on this node's stream."""
+    lag = stream_lag(redis_client)
+    return not (lag["pending"] or lag["lag"] or lag["lag_seconds"] != 0.0)
+
+def rebuild_derived(processors: List[EventProcessor], batch_size: int = 1000) -> int:
+    """
+    Recomputes the derived keys from the event streams of every node; returns the events counted.
+
+    The leaderboard of each node and the global keys matching
+    GLOBAL_DERIVED_PATTERNS are deleted and rebuilt from the events still
+    in the streams. Profiles, favorites, badges and applied-event sets are
+    not touched, so running it again gives the same result. Events of users
+    without a profile and dead-lettered events are skipped, as the workers
+    skip them. Run it with API writes and workers stopped; it refuses while
+    any stream has undelivered or pending events, which the workers would
+    count a second time. With sharding, pass one processor per shard so the
+    global keys are rebuilt from all of them.
+    """
+    undrained = [processor for processor in processors if not stream_drained(processor.redis_client)]
+    if undrained:
+        raise ValueError(f"{len(undrained)} event stream(s) are not drained; stop writes and let the workers "
+                         f"finish before rebuilding derived keys.")
+
+    global_clients = list({id(processor.global_client): processor.global_client for processor in processors}.values())
+    for processor in processors:
+        processor.redis_client.delete(LEADERBOARD_KEY)
+    for global_client in global_clients:
+        for pattern in GLOBAL_DERIVED_PATTERNS:
+            stale = list(global_client.scan_iter(match=pattern, count=1000))
+            for start in range(0, len(stale), 1000):
+                global_client.delete(*stale[start:start + 1000])
+
+    counted = 0
+    for processor in processors:
+        redis_client = processor.redis_client
+        dead = set()
+        for entries in _read_range(redis_client, DEAD_LETTER_KEY, batch_size=batch_size):
+            for _, fields in entries:
+                source_id = fields.get(b"source_id", fields.get("source_id"))
+                dead.add(source_id.decode() if isinstance(source_id, bytes) else source_id)
+        for entries in _read_range(redis_client, STREAM_KEY, batch_size=batch_size):
+            events = []
+            for event_id, fields in entries:
+                try:
+                    event = decode_event(event_id, fields)
+                except Exception:
+                    continue
+                if event["id"] not in dead:
+                    events.append(event)
+            user_ids = sorted({event["user_id"] for event in events})
+            with redis_client.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.exists(f"user_profile_{user_id}")
+                existing = {user_id for user_id, exists in zip(user_ids, pipe.execute()) if exists}
+            events = [event for event in events if event["user_id"] in existing]
+
+            with redis_client.pipeline(transaction=False) as pipe:
+                for event in events:
+                    if event["type"] == EVENT_REVIEW:
+                        pipe.zincrby(LEADERBOARD_KEY, 1, event["user_id"])
+                pipe.execute()
+            with processor.global_client.pipeline(transaction=False) as pipe:
+                for event in events:
+                    processor._apply_global_event(pipe, event)
+                pipe.execute()
+            counted += len(events)
+    logging.info(f"Rebuilt derived keys from {counted} event(s) on {len(processors)} stream(s).")
+    return counted
+
+def resolve_global_node(node: str, global_node: Optional[str] = None) -> str:
+    """
+    The global node for a worker on `node`: `global_node` if given, else the
+    API's REDIS_GLOBAL_NODE / REDIS_NODES configuration, else `node` itself
+    (unsharded). Exits if `node` is not one of REDIS_NODES, since its
+    events would then be applied against the wrong global node.
+    """
+    if global_node:
+        return global_node
+    nodes = os.getenv("REDIS_NODES")
+    if nodes and node not in parse_nodes(nodes):
+        raise SystemExit(f"{node} is not one of REDIS_NODES ({nodes}); pass --global-node to run a worker on it.")
+    return os.getenv("REDIS_GLOBAL_NODE") or (parse_nodes(nodes)[0] if nodes else node)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write-behind event stream worker and tools.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--global-node", help="host:port of the global node when sharded "
+                             "(default: REDIS_GLOBAL_NODE, else the first of REDIS_NODES, else this node)")
+    parser.add_argument("--profile-codec", default=os.getenv("PROFILE_CODEC", "orjson"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    work = subparsers.add_parser("work", help="Run a consumer-group worker")
+    work.add_argument("--consumer", default=f"{socket.gethostname()}-{os.getpid()}")
+    work.add_argument("--batch-size", type=int, default=500)
+
+    subparsers.add_parser("lag", help="Print consumer group lag")
+
+    replay_parser = subparsers.add_parser("replay", help="Re-apply events from the stream")
+    replay_parser.add_argument("--start", default="-")
+    replay_parser.add_argument("--end", default="+")
+
+    subparsers.add_parser("rebuild", help="Recompute leaderboard, strain aggregates and trending from the streams "
+                                          "of every node in REDIS_NODES (workers and writes stopped)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    redis_client = redis.Redis(host=args.host, port=args.port, db=args.db, decode_responses=False)
+    if args.command == "lag":
+        print(json.dumps(stream_lag(redis_client), indent=2, default=str))
+        return
+
+    node = f"{args.host}:{args.port}"
+    global_node = resolve_global_node(node, args.global_node)
+    if args.command == "rebuild":
+        shards = RedisShards(parse_nodes(os.getenv("REDIS_NODES", node)), global_node, db=args.db,
+                             decode_responses=False)
+        codec = ProfileCodec(args.profile_codec)
+        try:
+            rebuild_derived([EventProcessor(shards.clients[shard], codec, global_client=shards.global_client)
+                             for shard in shards.nodes])
+        except ValueError as e:
+            raise SystemExit(str(e))
+        return
+
+    global_client = None
+    if global_node != node:
+        logging.info(f"Strain aggregates and trending go to the global node {global_node}.")
+        global_host, global_port = global_node.rsplit(":", 1)
+        global_client = redis.Redis(host=global_host, port=int(global_port), db=args.db, decode_responses=False)
+    processor = EventProcessor(redis_client, ProfileCodec(args.profile_codec), global_client=global_client)
+    if args.command == "work":
+        run_worker(processor, args.consumer, batch_size=args.batch_size)
+    else:
+        replay(processor, args.start, args.end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# fold_in.py
+#
+# Least-squares fold-in of users against fixed ALS strain factors.
+#
+# The ALS model predicts r(u, i) = p_u . q_i + b_u + b_i. With the strain
+# factors q_i (and optionally biases b_i) held fixed, the best user vector
+# for a set of weighted ratings is a k+1 dimensional ridge regression on
+# ratings centered at the global mean mu:
+#
+#   [p_u; b_u] = argmin  sum_i w_i (r_i - mu - b_i - p_u . q_i - b_u)^2 + reg * W * ||[p_u; b_u]||^2
+#
+# where W is the user's total signal weight (ALS-WR style regularization,
+# so heavy users are not shrunk as hard as new ones). The bias is ridged
+# too, otherwise a user whose signals are all positive would be explained
+# by b_u alone and get a zero vector. This places new and active users in
+# the CF latent space without retraining.
+
+from typing import Callable, Optional, Tuple
+import numpy as np
+
+# ---------------------------
+# Signal Weights
+# ---------------------------
+# Each profile signal becomes a (target rating, confidence weight) pair.
+LIKE_TARGET = 5.0
+DISLIKE_TARGET = 1.0
+FAVORITE_TARGET = 5.0
+FAMILIAR_TARGET = 4.0
+
+REVIEW_WEIGHT = 1.0
+FEEDBACK_WEIGHT = 0.8
+FAVORITE_WEIGHT = 0.8
+FAMILIAR_WEIGHT = 0.3
+
+DEFAULT_REG = 0.1
+RATING_MIDPOINT = 3.0  # Default global mean on the 1-5 scale
+
+def collect_user_signals(user_profile: dict, resolve_strain: Callable[[str], Optional[int]]
+                         ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Gathers every rating-like signal in a profile as (strain_ids, targets, weights).
+
+    Uses all review ratings (not only >= 4), like/dislike feedback, favorites
+    and survey familiar strains. `resolve_strain` maps a strain name to its
+    row in the strain factor matrix, or None if it cannot be resolved.
+    Repeated signals for the same strain are kept; their weights add up.
+    """
+    strain_ids, targets, weights = [], [], []
+
+    def add(strain_name, target, weight):
+        strain_id = resolve_strain(strain_name)
+        if strain_id is not None:
+            strain_ids.append(strain_id)
+            targets.append(target)
+            weights.append(weight)
+
+    for review in user_profile.get("reviews", []):
+        add(review["Strain_Name"], float(review["rating"]), REVIEW_WEIGHT)
+    for strain_name, feedback in user_profile.get("strain_feedback", {}).items():
+        add(strain_name, LIKE_TARGET if feedback["type"] == "like" else DISLIKE_TARGET, FEEDBACK_WEIGHT)
+    for strain_name in user_profile.get("favorites", []):
+        add(strain_name, FAVORITE_TARGET, FAVORITE_WEIGHT)
+    for strain_name in user_profile.get("preferences", {}).get("familiar_strains", []):
+        add(strain_name, FAMILIAR_TARGET, FAMILIAR_WEIGHT)
+
+    return (np.asarray(strain_ids, dtype=np.int64),
+            np.asarray(targets, dtype=np.float64),
+            np.asarray(weights, dtype=np.float64))
+
+# ---------------------------
+# Single-User Fold-In
+# ---------------------------
+def fold_in_user(strain_factors: np.ndarray, strain_ids: np.ndarray, targets: np.ndarray,
+                 weights: Optional[np.ndarray] = None, reg: float = DEFAULT_REG,
+                 strain_bias: Optional[np.ndarray] = None, global_mean: float = RATING_MIDPOINT
+                 ) -> Tuple[np.ndarray, float]:
+    """Solves the regularized least-squares user vector and bias for one user."""
+    num_factors = strain_factors.shape[1]
+    if len(strain_ids) == 0:
+        return np.zeros(num_factors, dtype=np.float32), 0.0
+    if weights is None:
+        weights = np.ones(len(strain_ids), dtype=np.float64)
+
+    # Design matrix [q_i, 1]: the trailing column fits the user bias.
+    design = np.ones((len(strain_ids), num_factors + 1), dtype=np.float64)
+    design[:, :num_factors] = strain_factors[strain_ids]
+    residual = targets - global_mean
+    if strain_bias is not None:
+        residual = residual - strain_bias[strain_ids]
+
+    weighted = design * weights[:, None]
+    gram = design.T @ weighted
+    rhs = weighted.T @ residual
+    gram[np.arange(num_factors + 1), np.arange(num_factors + 1)] += reg * weights.sum()
+
+    solution = np.linalg.solve(gram, rhs)
+    return solution[:num_factors].astype(np.float32), float(solution[num_factors])
+
+# ---------------------------
+# Batched Fold-In
+# ---------------------------
+def fold_in_users(strain_factors: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                  targets: np.ndarray, weights: Optional[np.ndarray] = None, reg: float = DEFAULT_REG,
+                  strain_bias: Optional[np.ndarray] = None, global_mean: float = RATING_MIDPOINT,
+                  chunk_size: int = 512) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Folds in many users at once from CSR-encoded ratings.
+
+    User u's ratings are `indices[indptr[u]:indptr[u+1]]` with matching
+    `targets` (and `weights`). Users are processed in chunks of similar
+    rating counts, each chunk padded to a dense (B, L, k) gather so all
+    normal equations in a chunk are built with batched matmuls and solved
+    with one batched `np.linalg.solve`. Users without ratings get zero vectors.
+    Returns (user_vectors float32 [n_users, k], user_bias float32 [n_users]).
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    num_users = len(indptr) - 1
+    num_factors = strain_factors.shape[1]
+    if weights is None:
+        weights = np.ones(len(indices), dtype=np.float64)
+    residual_all = targets - global_mean
+    if strain_bias is not None:
+        residual_all = residual_all - strain_bias[indices]
+
+    user_vectors = np.zeros((num_users, num_factors), dtype=np.float32)
+    user_bias = np.zeros(num_users, dtype=np.float32)
+
+    lengths = np.diff(indptr)
+    order = np.argsort(lengths, kind='stable')
+    order = order[lengths[order] > 0]
+    eye = np.eye(num_factors + 1)
+
+    for chunk_start in range(0, len(order), chunk_size):
+        users = order[chunk_start:chunk_start + chunk_size]
+        chunk_lengths = lengths[users]
+        max_length = int(chunk_lengths.max())
+
+        # Padded positions point at the user's first rating with zero weight.
+        offsets = np.arange(max_length)
+        valid = offsets[None, :] < chunk_lengths[:, None]
+        positions = indptr[users][:, None] + np.where(valid, offsets[None, :], 0)
+
+        row_weights = np.where(valid, weights[positions], 0.0)
+        design = np.ones((len(users), max_length, num_factors + 1), dtype=np.float64)
+        design[:, :, :num_factors] = strain_factors[indices[positions]]
+
+        weighted_t = (design * row_weights[:, :, None]).transpose(0, 2, 1)
+        gram = weighted_t @ design
+        rhs = weighted_t @ residual_all[positions][:, :, None]
+        gram += (reg * row_weights.sum(axis=1))[:, None, None] * eye
+
+        solution = np.linalg.solve(gram, rhs)[:, :, 0]
+        user_vectors[users] = solution[:, :num_factors]
+        user_bias[users] = solution[:, num_factors]
+
+    return user_vectors, user_bias
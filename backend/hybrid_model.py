@@ -0,0 +1,35 @@
+# hybrid_model.py
+
+import torch
+from torch import nn
+
+# ---------------------------
+# Define Deep Hybrid Recommender Model
+# ---------------------------
+class DeepHybridRecommender(nn.Module):
+    """
+    Neural network architecture for hybrid recommendations.
+    Shared by the API and the offline trainer so checkpoints load in both.
+    """
+    def __init__(self, input_size: int):
+        super(DeepHybridRecommender, self).__init__()
+        self.network = nn.Sequential(
+            nn.Linear(input_size, 512),
+            nn.BatchNorm1d(512),
+            nn.ReLU(),
+            nn.Dropout(0.4),
+            nn.Linear(512, 256),
+            nn.BatchNorm1d(256),
+            nn.ReLU(),
+            nn.Dropout(0.3),
+            nn.Linear(256, 128),
+            nn.BatchNorm1d(128),
+            nn.ReLU(),
+            nn.Linear(128, 64),
+            nn.BatchNorm1d(64),
+            nn.ReLU(),
+            nn.Linear(64, 1)
+        )
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.network(x)
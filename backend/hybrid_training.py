@@ -0,0 +1,415 @@
+# hybrid_training.py
+#
+# Deep hybrid recommender training, moved out of the notebook.
+#
+# Interactions are memory-mapped from the columnar store written by
+# interaction_store.py instead of being read into a DataFrame.
+#
+# Features for an interaction are [user ALS emb | strain ALS emb | strain CBF emb].
+# Instead of a per-row Dataset fed through a multi-worker DataLoader, the
+# embedding tables are cleaned of NaNs once and kept as contiguous float32
+# tensors; a batch sampler yields index tensors and each batch is assembled
+# with one gather per table. This removes the Python per-item overhead that
+# dominated the old pipeline at 20M interactions.
+#
+#   python hybrid_training.py --batch-size 4096
+
+import argparse
+import logging
+import os
+import pickle
+import time
+from typing import Dict, Iterator, Optional, Tuple
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.decomposition import PCA
+from torch import nn
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from hybrid_model import DeepHybridRecommender
+from interaction_store import load_interaction_store, log_peak_rss, map_codes
+from ranking_eval import CSR, build_csr, evaluate_ranking, relevance_csr, top_k_items
+
+# -----------------------------
+# Configuration Section
+# -----------------------------
+class TrainingConfig:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    LOG_FILE = os.path.join(BASE_DIR, 'logs', 'deep_hybrid_training.log')
+    USER_EMB_PATH = os.path.join(BASE_DIR, 'data', 'user_embeddings.npy')
+    STRAIN_EMB_PATH = os.path.join(BASE_DIR, 'data', 'strain_embeddings.npy')
+    STRAIN_DATA_PATH = os.path.join(BASE_DIR, 'data', 'cleaned_strain_data_final_with_embeddings.csv')
+    INTERACTION_STORE_PATH = os.path.join(BASE_DIR, 'data', 'interactions')  # See interaction_store.py
+    USER_MAPPING_PATH = os.path.join(BASE_DIR, 'mappings', 'user_id_mapping.pkl')
+    STRAIN_MAPPING_PATH = os.path.join(BASE_DIR, 'mappings', 'strain_id_mapping.pkl')
+    BEST_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'best_hybrid_model.pth')
+    PCA_USER_EMB_PATH = os.path.join(BASE_DIR, 'models', 'pca_user_embeddings.pkl')
+    PCA_STRAIN_EMB_PATH = os.path.join(BASE_DIR, 'models', 'pca_strain_embeddings.pkl')
+    PCA_CBF_EMB_PATH = os.path.join(BASE_DIR, 'models', 'pca_cbf_embeddings.pkl')
+
+    # Training parameters. Batches are gathered in-process, so large batches
+    # are cheap and worker processes are not needed.
+    BATCH_SIZE = 4096
+    EPOCHS = 12
+    LEARNING_RATE = 0.0005
+    PATIENCE = 4
+
+    # PCA parameters (Desired components)
+    DESIRED_PCA_USER_COMPONENTS = 128
+    DESIRED_PCA_STRAIN_COMPONENTS = 128
+    DESIRED_PCA_CBF_COMPONENTS = 64
+
+    # Ranking evaluation: ALS factors retrieve candidates, the model re-ranks them
+    RANK_K = 10
+    RANK_CANDIDATES = 100
+    RANK_CHUNK_SIZE = 512
+
+    # Random seed for reproducibility
+    RANDOM_STATE = 42
+
+logger = logging.getLogger('DeepHybridRecommender')
+
+def configure_logging(log_file_path: str) -> logging.Logger:
+    """Logs to both console and a rotating log file."""
+    from logging.handlers import RotatingFileHandler
+
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        for handler in (logging.StreamHandler(),
+                        RotatingFileHandler(log_file_path, maxBytes=5 * 1024 * 1024, backupCount=5)):
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+    return logger
+
+# -----------------------------
+# Data Loading
+# -----------------------------
+def load_embeddings(user_emb_path: str, strain_emb_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Load ALS embeddings, replacing NaNs with zeros once for the whole table."""
+    for path in [user_emb_path, strain_emb_path]:
+        if not os.path.exists(path):
+            logger.error(f"Embedding file not found at path: {path}")
+            raise FileNotFoundError(path)
+
+    user_embeddings = np.nan_to_num(np.load(user_emb_path, mmap_mode='r'))
+    strain_embeddings = np.nan_to_num(np.load(strain_emb_path, mmap_mode='r'))
+    logger.info(f"User Embeddings Shape: {user_embeddings.shape}")
+    logger.info(f"Strain Embeddings Shape: {strain_embeddings.shape}")
+    return user_embeddings, strain_embeddings
+
+def load_strain_data(strain_data_path: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Load content-based strain data and extract its embedding columns."""
+    if not os.path.exists(strain_data_path):
+        logger.error(f"Strain data file not found at path: {strain_data_path}")
+        raise FileNotFoundError(strain_data_path)
+
+    strain_data = pd.read_csv(strain_data_path)
+    embedding_columns = [col for col in strain_data.columns if col.startswith('embedding_')]
+    if not embedding_columns:
+        logger.error("No embedding columns found in strain data.")
+        raise ValueError("No embedding columns found in strain data.")
+
+    strain_embeddings_cbf = np.nan_to_num(strain_data[embedding_columns].to_numpy(dtype=np.float32))
+    logger.info(f"Extracted content-based embeddings shape: {strain_embeddings_cbf.shape}")
+    return strain_data, strain_embeddings_cbf
+
+def load_mappings(user_mapping_path: str, strain_mapping_path: str) -> Tuple[Dict, Dict]:
+    """Load user and strain id -> code mappings."""
+    with open(user_mapping_path, 'rb') as f:
+        user_mapping = pickle.load(f)
+    with open(strain_mapping_path, 'rb') as f:
+        strain_mapping = pickle.load(f)
+    logger.info(f"Loaded user_mapping with {len(user_mapping)} entries.")
+    logger.info(f"Loaded strain_mapping with {len(strain_mapping)} entries.")
+    return user_mapping, strain_mapping
+
+def load_coded_interactions(store_dir: str, user_mapping: Dict, strain_mapping: Dict
+                            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Open the interaction store and map ids to embedding row codes.
+
+    Ratings stay memory-mapped; rows without a mapping are dropped.
+    Returns (user_codes, strain_codes, ratings).
+    """
+    store = load_interaction_store(store_dir)
+    logger.info(f"Loaded interaction store with {len(store):,} rows.")
+    user_codes = map_codes(store.user_id, user_mapping)
+    strain_codes = map_codes(store.strain_id, strain_mapping)
+    valid = (user_codes >= 0) & (strain_codes >= 0)
+    if not valid.all():
+        logger.warning(f"Dropping {np.count_nonzero(~valid)} rows with missing mappings.")
+        rows = np.flatnonzero(valid)
+        return user_codes[rows], strain_codes[rows], store.rating[rows]
+    return user_codes, strain_codes, store.rating
+
+def split_rows(num_rows: int, test_size: float, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Random (train, validation) row indices, sorted so mmap reads stay sequential."""
+    order = np.random.default_rng(seed).permutation(num_rows)
+    num_val = int(round(num_rows * test_size))
+    return np.sort(order[num_val:]), np.sort(order[:num_val])
+
+def apply_pca(embeddings: np.ndarray, desired_components: int, save_path: str) -> np.ndarray:
+    """Reduce embeddings to min(desired, n_samples, n_features) components and save the PCA."""
+    n_samples, n_features = embeddings.shape
+    actual_components = min(desired_components, n_samples, n_features)
+    pca = PCA(n_components=actual_components, random_state=TrainingConfig.RANDOM_STATE)
+    reduced_embeddings = pca.fit_transform(embeddings)
+    logger.info(f"PCA reduced {embeddings.shape} -> {reduced_embeddings.shape}, "
+                f"explained variance {np.sum(pca.explained_variance_ratio_):.4f}")
+    with open(save_path, 'wb') as f:
+        pickle.dump(pca, f)
+    return reduced_embeddings
+
+# -----------------------------
+# Batch-Level Dataset
+# -----------------------------
+class HybridFeatureTables:
+    """
+    NaN-free, contiguous float32 feature tables for batch gathering.
+
+    The two strain tables (ALS and CBF) share an index, so they are
+    concatenated once up front and a batch needs only one gather per side.
+    """
+
+    def __init__(self, user_embeddings: np.ndarray, strain_embeddings: np.ndarray,
+                 strain_embeddings_cbf: np.ndarray, device: Optional[torch.device] = None):
+        device = device or torch.device('cpu')
+        strain_features = np.concatenate([strain_embeddings, strain_embeddings_cbf], axis=1)
+        self.user_features = _clean_tensor(user_embeddings, device)
+        self.strain_features = _clean_tensor(strain_features, device)
+        self.input_size = self.user_features.shape[1] + self.strain_features.shape[1]
+
+    def gather(self, user_idx: torch.Tensor, strain_idx: torch.Tensor) -> torch.Tensor:
+        """Builds the [batch, input_size] feature matrix for the given index tensors."""
+        out = torch.empty((len(user_idx), self.input_size), dtype=torch.float32, device=self.user_features.device)
+        user_dim = self.user_features.shape[1]
+        torch.index_select(self.user_features, 0, user_idx, out=out[:, :user_dim])
+        torch.index_select(self.strain_features, 0, strain_idx, out=out[:, user_dim:])
+        return out
+
+def _clean_tensor(array: np.ndarray, device: torch.device) -> torch.Tensor:
+    array = np.ascontiguousarray(np.nan_to_num(np.asarray(array, dtype=np.float32)))
+    return torch.from_numpy(array).to(device)
+
+class InteractionBatchDataset(Dataset):
+    """
+    Dataset indexed by a whole batch of row indices rather than a single row.
+
+    `__getitem__` takes an index tensor (from `ShuffledBatchSampler`) and
+    returns (features, ratings, user_ids, strain_ids) for the batch, so the
+    same tuple layout as the old per-row dataset reaches the training loop.
+    """
+
+    def __init__(self, user_ids: np.ndarray, strain_ids: np.ndarray, ratings: np.ndarray,
+                 tables: HybridFeatureTables):
+        device = tables.user_features.device
+        self.user_ids = torch.as_tensor(np.asarray(user_ids, dtype=np.int64), device=device)
+        self.strain_ids = torch.as_tensor(np.asarray(strain_ids, dtype=np.int64), device=device)
+        self.ratings = torch.as_tensor(np.asarray(ratings, dtype=np.float32), device=device)
+        self.tables = tables
+
+    @classmethod
+    def from_rows(cls, user_codes: np.ndarray, strain_codes: np.ndarray, ratings: np.ndarray, rows: np.ndarray,
+                  tables: HybridFeatureTables) -> 'InteractionBatchDataset':
+        return cls(user_codes[rows], strain_codes[rows], ratings[rows], tables)
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    def __getitem__(self, batch_idx: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        user_ids = self.user_ids[batch_idx]
+        strain_ids = self.strain_ids[batch_idx]
+        return self.tables.gather(user_ids, strain_ids), self.ratings[batch_idx], user_ids, strain_ids
+
+class ShuffledBatchSampler(Sampler):
+    """
+    Yields index tensors of `batch_size` rows, reshuffled every epoch when `shuffle` is set.
+
+    A final batch of a single row is merged into the one before it:
+    BatchNorm1d cannot compute batch statistics from one sample in train mode.
+    """
+
+    def __init__(self, num_rows: int, batch_size: int, shuffle: bool = True, seed: int = 42):
+        self.num_rows = num_rows
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = torch.Generator().manual_seed(seed)
+
+    def __len__(self) -> int:
+        num_batches = (self.num_rows + self.batch_size - 1) // self.batch_size
+        return num_batches - 1 if self._merges_tail() else num_batches
+
+    def _merges_tail(self) -> bool:
+        return self.num_rows > self.batch_size and self.num_rows % self.batch_size == 1
+
+    def __iter__(self) -> Iterator[torch.Tensor]:
+        if self.shuffle:
+            order = torch.randperm(self.num_rows, generator=self.generator)
+        else:
+            order = torch.arange(self.num_rows)
+        batches = list(torch.split(order, self.batch_size))
+        if self._merges_tail():
+            batches[-2:] = [torch.cat(batches[-2:])]
+        return iter(batches)
+
+def create_batch_loader(dataset: InteractionBatchDataset, batch_size: int, shuffle: bool,
+                        pin_memory: bool = False) -> DataLoader:
+    """
+    Wraps a batch-level dataset in a DataLoader with automatic batching off.
+
+    Gathers are a couple of memcpy-speed ops per batch, so worker processes
+    would only add IPC cost; loading stays in the main process.
+    """
+    sampler = ShuffledBatchSampler(len(dataset), batch_size, shuffle=shuffle, seed=TrainingConfig.RANDOM_STATE)
+    return DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=0, pin_memory=pin_memory)
+
+# -----------------------------
+# Training and Evaluation
+# -----------------------------
+def evaluate_regression(model: nn.Module, loader: DataLoader, device: torch.device) -> Tuple[float, float, float]:
+    """Returns (mse, rmse, mae) over the loader, accumulated on-device."""
+    model.eval()
+    squared_error = torch.zeros((), dtype=torch.float64, device=device)
+    absolute_error = torch.zeros((), dtype=torch.float64, device=device)
+    count = 0
+    with torch.no_grad():
+        for features, ratings, _, _ in loader:
+            features = features.to(device, non_blocking=True)
+            ratings = ratings.to(device, non_blocking=True)
+            errors = model(features).squeeze(1) - ratings
+            squared_error += errors.double().pow(2).sum()
+            absolute_error += errors.double().abs().sum()
+            count += len(ratings)
+    mse = (squared_error / max(count, 1)).item()
+    return mse, float(np.sqrt(mse)), (absolute_error / max(count, 1)).item()
+
+def train_model(train_loader: DataLoader, val_loader: DataLoader, input_size: int, device: torch.device,
+                epochs: int = TrainingConfig.EPOCHS, lr: float = TrainingConfig.LEARNING_RATE,
+                patience: int = TrainingConfig.PATIENCE,
+                best_model_path: str = TrainingConfig.BEST_MODEL_PATH) -> nn.Module:
+    """Train the hybrid recommender with early stopping on validation RMSE."""
+    model = DeepHybridRecommender(input_size=input_size).to(device)
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=1e-5)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
+
+    best_val_rmse = float('inf')
+    early_stop_counter = 0
+
+    for epoch in range(1, epochs + 1):
+        model.train()
+        running_loss = torch.zeros((), device=device)
+        num_rows = 0
+        epoch_start = time.perf_counter()
+        for features, ratings, _, _ in train_loader:
+            features = features.to(device, non_blocking=True)
+            ratings = ratings.to(device, non_blocking=True).unsqueeze(1)
+
+            optimizer.zero_grad(set_to_none=True)
+            loss = criterion(model(features), ratings)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.detach() * len(ratings)
+            num_rows += len(ratings)
+
+        elapsed = time.perf_counter() - epoch_start
+        logger.info(f"Epoch {epoch} Training Loss: {(running_loss / num_rows).item():.4f} "
+                    f"({num_rows / elapsed:,.0f} samples/sec)")
+
+        mse, rmse, mae = evaluate_regression(model, val_loader, device)
+        logger.info(f"Epoch {epoch} Validation RMSE: {rmse:.4f}, MAE: {mae:.4f}")
+        scheduler.step(rmse)
+
+        if rmse < best_val_rmse:
+            best_val_rmse = rmse
+            torch.save(model.state_dict(), best_model_path)
+            logger.info(f"Epoch {epoch}: New best model saved.")
+            early_stop_counter = 0
+        else:
+            early_stop_counter += 1
+            if early_stop_counter >= patience:
+                logger.info(f"Early stopping triggered after {epoch} epochs.")
+                break
+
+    model.load_state_dict(torch.load(best_model_path, map_location=device))
+    return model
+
+def make_hybrid_recommender(model: nn.Module, tables: HybridFeatureTables, user_factors: np.ndarray,
+                            strain_factors: np.ndarray, k: int, num_candidates: int, device: torch.device):
+    """
+    Builds a `recommend(user_codes, exclude)` callable for `ranking_eval.evaluate_ranking`.
+
+    ALS factors pick `num_candidates` unseen strains per user; the hybrid
+    model scores all (user, candidate) pairs of a chunk in one forward pass
+    and the best `k` are returned.
+    """
+    model.eval()
+
+    def recommend(user_codes: np.ndarray, exclude: Optional[CSR]) -> np.ndarray:
+        candidates = top_k_items(user_factors[user_codes], strain_factors, num_candidates, exclude)
+        user_idx = torch.from_numpy(np.repeat(user_codes, candidates.shape[1])).to(device)
+        strain_idx = torch.from_numpy(candidates.ravel().astype(np.int64)).to(device)
+        with torch.no_grad():
+            scores = model(tables.gather(user_idx, strain_idx)).view(candidates.shape).cpu().numpy()
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(candidates, order, axis=1)
+
+    return recommend
+
+# -----------------------------
+# Main Execution
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Train the deep hybrid recommender.")
+    parser.add_argument("--batch-size", type=int, default=TrainingConfig.BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=TrainingConfig.EPOCHS)
+    parser.add_argument("--store", default=TrainingConfig.INTERACTION_STORE_PATH,
+                        help="Interaction store directory written by interaction_store.py")
+    parser.add_argument("--rank-k", type=int, default=TrainingConfig.RANK_K,
+                        help="K for the post-training ranking evaluation (0 to skip)")
+    parser.add_argument("--rank-workers", type=int, default=0)
+    args = parser.parse_args()
+
+    configure_logging(TrainingConfig.LOG_FILE)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    logger.info(f"Using device: {device}")
+
+    user_embeddings, strain_embeddings = load_embeddings(TrainingConfig.USER_EMB_PATH, TrainingConfig.STRAIN_EMB_PATH)
+    _, strain_embeddings_cbf = load_strain_data(TrainingConfig.STRAIN_DATA_PATH)
+    user_mapping, strain_mapping = load_mappings(TrainingConfig.USER_MAPPING_PATH, TrainingConfig.STRAIN_MAPPING_PATH)
+    user_codes, strain_codes, ratings = load_coded_interactions(args.store, user_mapping, strain_mapping)
+    train_rows, val_rows = split_rows(len(ratings), test_size=0.2, seed=TrainingConfig.RANDOM_STATE)
+
+    tables = HybridFeatureTables(
+        apply_pca(user_embeddings, TrainingConfig.DESIRED_PCA_USER_COMPONENTS, TrainingConfig.PCA_USER_EMB_PATH),
+        apply_pca(strain_embeddings, TrainingConfig.DESIRED_PCA_STRAIN_COMPONENTS, TrainingConfig.PCA_STRAIN_EMB_PATH),
+        apply_pca(strain_embeddings_cbf, TrainingConfig.DESIRED_PCA_CBF_COMPONENTS, TrainingConfig.PCA_CBF_EMB_PATH),
+        # Tables are small (users x 192 floats); keeping them on the GPU makes gathers device-side.
+        device=device,
+    )
+    datasets = [InteractionBatchDataset.from_rows(user_codes, strain_codes, ratings, rows, tables)
+                for rows in (train_rows, val_rows)]
+    if args.rank_k:
+        seen = build_csr(user_codes[train_rows], strain_codes[train_rows], len(user_mapping))
+        truth = relevance_csr(user_codes[val_rows], strain_codes[val_rows], ratings[val_rows], len(user_mapping))
+    del user_codes, strain_codes, ratings, train_rows, val_rows
+    train_loader = create_batch_loader(datasets[0], args.batch_size, True)
+    val_loader = create_batch_loader(datasets[1], args.batch_size, False)
+    logger.info(f"Input size for the model: {tables.input_size}")
+    log_peak_rss("data preparation", logger)
+
+    model = train_model(train_loader, val_loader, tables.input_size, device, epochs=args.epochs)
+    logger.info("Training completed successfully.")
+    if args.rank_k:
+        recommend = make_hybrid_recommender(model, tables, user_embeddings, strain_embeddings, args.rank_k,
+                                            TrainingConfig.RANK_CANDIDATES, device)
+        evaluate_ranking(truth, strain_embeddings, k=args.rank_k, exclude=seen, recommend=recommend,
+                         chunk_size=TrainingConfig.RANK_CHUNK_SIZE, workers=args.rank_workers)
+    log_peak_rss("training", logger)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# interaction_store.py
+#
+# Out-of-core columnar store for the (user_id, strain_id, rating) interactions.
+#
+# The converter streams the interaction CSV (or a directory of Parquet
+# shards from synthetic_generator.py) in chunks and never holds the full
+# table in memory:
+#   1. rows with missing values or ratings outside 1-5 are dropped and
+#      counted, each chunk is sorted by the packed (user_id, strain_id) key,
+#      duplicate pairs inside it are reduced to (sum, count), and it is
+#      spilled to disk as a sorted run;
+#   2. the runs are merged block by block (an external sort-merge), reducing
+#      duplicates across runs and writing the mean rating.
+# The result is a directory of int32/int32/float32 `.npy` columns sorted by
+# (user_id, strain_id), which the trainers open with mmap.
+#
+#   python interaction_store.py data/synthetic_profiles_with_reviews.csv data/interactions
+
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import Iterator, List, NamedTuple
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.dataset as pa_dataset
+except ImportError:
+    pa_dataset = None
+
+COLUMNS = {'user_id': np.int32, 'strain_id': np.int32, 'rating': np.float32}
+# Input is read as float64 so a missing id becomes NaN, to be dropped and
+# counted, instead of failing the integer parse of the whole chunk.
+READ_DTYPES = {name: np.float64 for name in COLUMNS}
+META_FILE = 'meta.json'
+DEFAULT_CHUNK_ROWS = 2_000_000
+MERGE_BUDGET_ROWS = 1_000_000  # Keys held in memory per merge step, across all runs
+RATING_MIN, RATING_MAX = 1.0, 5.0
+
+logger = logging.getLogger(__name__)
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def log_peak_rss(stage: str, log: logging.Logger = logger):
+    log.info(f"Peak RSS after {stage}: {peak_rss_mb():,.0f} MiB")
+
+# ---------------------------
+# Key Packing
+# ---------------------------
+def pack_keys(user_ids: np.ndarray, strain_ids: np.ndarray) -> np.ndarray:
+    """Packs (user_id, strain_id) into one int64 that sorts like the pair."""
+    return (user_ids.astype(np.int64) << 32) | strain_ids.astype(np.int64)
+
+def unpack_keys(keys: np.ndarray):
+    return (keys >> 32).astype(np.int32), (keys & 0xFFFFFFFF).astype(np.int32)
+
+def reduce_sorted(keys: np.ndarray, sums: np.ndarray, counts: np.ndarray):
+    """Collapses runs of equal keys in a sorted key array, adding their sums and counts."""
+    if len(keys) == 0:
+        return keys, sums, counts
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], np.add.reduceat(sums, starts), np.add.reduceat(counts, starts)
+
+# ---------------------------
+# Pass 1: Sorted Runs
+# ---------------------------
+def read_chunks(source: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yields interaction chunks from a CSV file or a Parquet file/directory."""
+    if os.path.isdir(source) or source.endswith('.parquet'):
+        if pa_dataset is None:
+            raise RuntimeError("pyarrow is required to read Parquet input (pip install pyarrow).")
+        dataset = pa_dataset.dataset(source, format='parquet')
+        for batch in dataset.to_batches(columns=list(COLUMNS), batch_size=chunk_rows):
+            yield batch.to_pandas().astype(READ_DTYPES)
+    else:
+        yield from pd.read_csv(source, usecols=list(COLUMNS), dtype=READ_DTYPES, chunksize=chunk_rows)
+
+def write_sorted_runs(source: str, run_dir: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                      stats: dict = None) -> List[str]:
+    """
+    Streams the input and spills each chunk as a sorted, locally de-duplicated run.
+
+    Rows with a missing value or a rating outside RATING_MIN..RATING_MAX are
+    dropped before aggregation so they cannot skew a pair's mean; their
+    counts are added to `stats` when given.
+    """
+    run_paths = []
+    stats = stats if stats is not None else {}
+    stats.setdefault('rows_read', 0)
+    stats.setdefault('dropped_missing', 0)
+    stats.setdefault('dropped_out_of_range', 0)
+    for chunk_index, chunk in enumerate(read_chunks(source, chunk_rows)):
+        complete = chunk.dropna()
+        in_range = complete['rating'].between(RATING_MIN, RATING_MAX).to_numpy()
+        stats['rows_read'] += len(chunk)
+        stats['dropped_missing'] += len(chunk) - len(complete)
+        stats['dropped_out_of_range'] += int((~in_range).sum())
+        chunk = complete[in_range].astype(COLUMNS)
+        keys = pack_keys(chunk['user_id'].to_numpy(), chunk['strain_id'].to_numpy())
+        order = np.argsort(keys, kind='stable')
+        keys, sums, counts = reduce_sorted(
+            keys[order], chunk['rating'].to_numpy(dtype=np.float64)[order], np.ones(len(keys), dtype=np.int32))
+
+        run_path = os.path.join(run_dir, f"run_{chunk_index:05d}")
+        os.makedirs(run_path)
+        np.save(os.path.join(run_path, 'keys.npy'), keys)
+        np.save(os.path.join(run_path, 'sums.npy'), sums)
+        np.save(os.path.join(run_path, 'counts.npy'), counts)
+        run_paths.append(run_path)
+        logger.info(f"Wrote sorted run {chunk_index} ({len(keys):,} keys, {stats['rows_read']:,} rows read).")
+    return run_paths
+
+# ---------------------------
+# Pass 2: Block Merge
+# ---------------------------
+class _Run:
+    def __init__(self, run_path: str):
+        self.keys = np.load(os.path.join(run_path, 'keys.npy'), mmap_mode='r')
+        self.sums = np.load(os.path.join(run_path, 'sums.npy'), mmap_mode='r')
+        self.counts = np.load(os.path.join(run_path, 'counts.npy'), mmap_mode='r')
+        self.position = 0
+
+    def remaining(self) -> int:
+        return len(self.keys) - self.position
+
+def merge_runs(run_paths: List[str], output_dir: str, budget_rows: int = MERGE_BUDGET_ROWS) -> int:
+    """
+    Merges sorted runs into the final columns and returns the row count.
+
+    Each step reads up to `budget_rows / len(runs)` keys from every run.
+    Every key up to the smallest "last key read" among runs that still have
+    more data is final: no unread key can be smaller. Those keys are concatenated,
+    sorted, reduced and appended; the rest waits for the next step.
+    """
+    runs = [_Run(path) for path in run_paths]
+    block_rows = max(budget_rows // max(len(runs), 1), 1024)
+    raw_paths = {name: os.path.join(output_dir, f"{name}.raw") for name in COLUMNS}
+    raw_files = {name: open(path, 'wb') for name, path in raw_paths.items()}
+    total = 0
+    # A key equal to the bound may continue into the next step, so carry the
+    # last reduced key over instead of writing it immediately.
+    carry = None
+
+    try:
+        while any(run.remaining() for run in runs):
+            bound = np.iinfo(np.int64).max
+            for run in runs:
+                if run.remaining() > block_rows:
+                    bound = min(bound, int(run.keys[run.position + block_rows - 1]))
+
+            keys, sums, counts = [], [], []
+            for run in runs:
+                if not run.remaining():
+                    continue
+                block = run.keys[run.position:run.position + block_rows]
+                take = int(np.searchsorted(block, bound, side='right'))
+                keys.append(np.asarray(block[:take]))
+                sums.append(np.asarray(run.sums[run.position:run.position + take]))
+                counts.append(np.asarray(run.counts[run.position:run.position + take]))
+                run.position += take
+
+            if carry is not None:
+                keys.append(carry[0])
+                sums.append(carry[1])
+                counts.append(carry[2])
+            keys, sums, counts = np.concatenate(keys), np.concatenate(sums), np.concatenate(counts)
+            order = np.argsort(keys, kind='stable')
+            keys, sums, counts = reduce_sorted(keys[order], sums[order], counts[order])
+
+            carry = (keys[-1:], sums[-1:], counts[-1:])
+            total += _append_columns(raw_files, keys[:-1], sums[:-1], counts[:-1])
+
+        if carry is not None:
+            total += _append_columns(raw_files, *carry)
+    finally:
+        for f in raw_files.values():
+            f.close()
+
+    for name, dtype in COLUMNS.items():
+        raw = np.memmap(raw_paths[name], dtype=dtype, mode='r', shape=(total,)) if total else np.empty(0, dtype)
+        column = np.lib.format.open_memmap(os.path.join(output_dir, f"{name}.npy"), mode='w+',
+                                           dtype=dtype, shape=(total,))
+        for start in range(0, total, budget_rows):
+            column[start:start + budget_rows] = raw[start:start + budget_rows]
+        column.flush()
+        del column, raw
+        os.remove(raw_paths[name])
+    return total
+
+def _append_columns(raw_files, keys, sums, counts) -> int:
+    if len(keys) == 0:
+        return 0
+    user_ids, strain_ids = unpack_keys(keys)
+    ratings = (sums / counts).astype(np.float32)
+    user_ids.tofile(raw_files['user_id'])
+    strain_ids.tofile(raw_files['strain_id'])
+    ratings.tofile(raw_files['rating'])
+    return len(keys)
+
+def convert_csv(csv_path: str, output_dir: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                tmp_dir: str = None) -> dict:
+    """Converts an interaction CSV (or Parquet shards) into a de-duplicated columnar store."""
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    run_dir = tempfile.mkdtemp(prefix='interaction_runs_', dir=tmp_dir or output_dir)
+    try:
+        stats = {}
+        run_paths = write_sorted_runs(csv_path, run_dir, chunk_rows, stats)
+        log_peak_rss("sorted runs")
+        rows = merge_runs(run_paths, output_dir)
+        log_peak_rss("merge")
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    meta = {
+        "source": os.path.abspath(csv_path),
+        "rows": rows,
+        "rows_read": stats["rows_read"],
+        "dropped_missing": stats["dropped_missing"],
+        "dropped_out_of_range": stats["dropped_out_of_range"],
+        "columns": {name: np.dtype(dtype).name for name, dtype in COLUMNS.items()},
+        "sorted_by": ["user_id", "strain_id"],
+        "seconds": round(time.perf_counter() - start, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    with open(os.path.join(output_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    if stats["dropped_missing"] or stats["dropped_out_of_range"]:
+        logger.warning(f"Dropped {stats['dropped_missing']:,} row(s) with missing values and "
+                       f"{stats['dropped_out_of_range']:,} with ratings outside {RATING_MIN:g}-{RATING_MAX:g}.")
+    logger.info(f"Interaction store written to '{output_dir}' with {rows:,} rows in {meta['seconds']}s.")
+    return meta
+
+# ---------------------------
+# Loading
+# ---------------------------
+class InteractionStore(NamedTuple):
+    user_id: np.ndarray
+    strain_id: np.ndarray
+    rating: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rating)
+
+def load_interaction_store(store_dir: str) -> InteractionStore:
+    """Opens the store's columns read-only with mmap; nothing is read until accessed."""
+    if not os.path.exists(os.path.join(store_dir, META_FILE)):
+        logger.error(f"Interaction store not found at path: {store_dir}")
+        raise FileNotFoundError(store_dir)
+    columns = {name: np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode='r') for name in COLUMNS}
+    store = InteractionStore(**columns)
+    logger.info(f"Opened interaction store '{store_dir}' with {len(store):,} rows.")
+    return store
+
+def write_columns(output_dir: str, user_id: np.ndarray, strain_id: np.ndarray, rating: np.ndarray, **meta):
+    """Writes in-memory columns (e.g. a held-out split) in the store layout."""
+    os.makedirs(output_dir, exist_ok=True)
+    for name, column in zip(COLUMNS, (user_id, strain_id, rating)):
+        np.save(os.path.join(output_dir, f"{name}.npy"), np.asarray(column, dtype=COLUMNS[name]))
+    meta.update(rows=len(rating), columns={name: np.dtype(dtype).name for name, dtype in COLUMNS.items()})
+    with open(os.path.join(output_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+# ---------------------------
+# Id Coding
+# ---------------------------
+# Mappings are dense lookup tables indexed by raw id, applied in blocks so a
+# mmap column is never copied whole just to be mapped.
+def _apply_lookup(ids: np.ndarray, lookup: np.ndarray, block_rows: int) -> np.ndarray:
+    codes = np.empty(len(ids), dtype=np.int32)
+    for start in range(0, len(ids), block_rows):
+        codes[start:start + block_rows] = lookup[ids[start:start + block_rows]]
+    return codes
+
+def factorize_ids(ids: np.ndarray, block_rows: int = 10_000_000):
+    """Returns (sorted unique ids, int32 codes), like pandas category codes."""
+    present = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype=bool)
+    for start in range(0, len(ids), block_rows):
+        present[ids[start:start + block_rows]] = True
+    categories = np.flatnonzero(present)
+    lookup = np.cumsum(present, dtype=np.int64).astype(np.int32) - 1
+    return categories, _apply_lookup(ids, lookup, block_rows)
+
+def map_codes(ids: np.ndarray, mapping: dict, block_rows: int = 10_000_000) -> np.ndarray:
+    """Maps raw ids to codes with a saved id -> code mapping; unmapped ids become -1."""
+    lookup = np.full(max(max(mapping), int(ids.max()) if len(ids) else 0) + 1, -1, dtype=np.int32)
+    lookup[np.fromiter(mapping.keys(), dtype=np.int64)] = np.fromiter(mapping.values(), dtype=np.int64)
+    return _apply_lookup(ids, lookup, block_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an interaction CSV into a columnar mmap store.")
+    parser.add_argument("csv_path", help="Interaction CSV, or a Parquet file/directory")
+    parser.add_argument("output_dir")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--tmp-dir", default=None, help="Where to spill sorted runs (default: output_dir)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    print(json.dumps(convert_csv(args.csv_path, args.output_dir, args.chunk_rows, args.tmp_dir), indent=2))
+
+if __name__ == "__main__":
+    main()
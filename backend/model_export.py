@@ -0,0 +1,161 @@
+# model_export.py
+#
+# CPU inference export for DeepHybridRecommender checkpoints.
+#
+# The eager model runs Linear -> BatchNorm1d -> ReLU -> Dropout blocks. In
+# eval mode BatchNorm is a fixed per-channel affine map and Dropout is the
+# identity, so both are folded away:
+#
+#   W' = W * gamma / sqrt(var + eps)        b' = (b - mean) * gamma / sqrt(var + eps) + beta
+#
+# leaving a plain Linear/ReLU stack. Its Linear layers are then dynamically
+# quantized to int8 (weights stored int8, activations quantized per batch)
+# and the result is traced to TorchScript, so serving needs neither the
+# model class nor Python-side module dispatch. The API loads the artifact
+# only with HYBRID_MODEL_ENABLED=true.
+#
+#   python model_export.py models/best_hybrid_model.pth models/hybrid_model_int8.pt
+
+import argparse
+import json
+import logging
+import os
+from typing import Dict, Optional
+import numpy as np
+import torch
+from torch import nn
+from torch.nn.utils.fusion import fuse_linear_bn_eval
+
+from hybrid_model import DeepHybridRecommender
+
+logger = logging.getLogger(__name__)
+
+# Parity bounds of the exported model against the float eager model. Dynamic
+# quantization error is mostly small with a thin tail, so the mean and the
+# 99th percentile of the absolute score deviation are bounded, not the max.
+MAX_MEAN_DEVIATION = 0.05  # On the 1-5 rating scale
+MAX_P99_DEVIATION = 0.15
+MIN_TOP_K_OVERLAP = 0.9  # Mean fraction of each group's float top-k kept
+PARITY_K = 10
+PARITY_GROUP_SIZE = 100  # Candidates scored per simulated user
+
+# ---------------------------
+# Loading
+# ---------------------------
+def load_checkpoint(checkpoint_path: str) -> DeepHybridRecommender:
+    """Loads a DeepHybridRecommender state dict in eval mode, inferring the input size."""
+    state_dict = torch.load(checkpoint_path, map_location='cpu')
+    if 'network.0.weight' not in state_dict:
+        raise ValueError(f"{checkpoint_path} is not a DeepHybridRecommender checkpoint.")
+    model = DeepHybridRecommender(input_size=state_dict['network.0.weight'].shape[1])
+    model.load_state_dict(state_dict)
+    return model.eval()
+
+def load_scoring_model(path: str) -> nn.Module:
+    """Loads an exported TorchScript artifact, or a float checkpoint if given a .pth file."""
+    if path.endswith('.pth'):
+        return load_checkpoint(path)
+    return torch.jit.load(path, map_location='cpu').eval()
+
+# ---------------------------
+# Export
+# ---------------------------
+def fold_batchnorm(model: DeepHybridRecommender) -> nn.Sequential:
+    """An equivalent eval-mode Linear/ReLU stack with BatchNorm folded in and Dropout removed."""
+    layers = []
+    for module in model.eval().network:
+        if isinstance(module, nn.BatchNorm1d):
+            layers[-1] = fuse_linear_bn_eval(layers[-1], module)
+        elif not isinstance(module, nn.Dropout):
+            layers.append(module)
+    return nn.Sequential(*layers).eval()
+
+def export_model(model: DeepHybridRecommender, quantize: bool = True) -> torch.jit.ScriptModule:
+    """Folds, optionally int8-quantizes, and traces the model to TorchScript."""
+    exported = fold_batchnorm(model)
+    if quantize:
+        # Per-channel weight scales: output units of the folded layers differ widely in range.
+        exported = torch.ao.quantization.quantize_dynamic(
+            exported, {nn.Linear: torch.ao.quantization.per_channel_dynamic_qconfig}, dtype=torch.qint8)
+    example = torch.zeros(2, model.network[0].in_features)
+    with torch.no_grad():
+        traced = torch.jit.trace(exported, example)
+    return torch.jit.freeze(traced.eval())
+
+# ---------------------------
+# Parity
+# ---------------------------
+def parity_report(reference: nn.Module, exported: nn.Module, features: torch.Tensor,
+                  k: int = PARITY_K, group_size: int = PARITY_GROUP_SIZE) -> Dict[str, float]:
+    """
+    Score deviation and ranking agreement of `exported` against `reference`.
+
+    Rows of `features` are split into groups of `group_size` candidates (one
+    simulated user each); ranking agreement is the overlap of each group's
+    top-k under both models.
+    """
+    with torch.no_grad():
+        expected = reference(features).view(-1).numpy()
+        actual = exported(features).view(-1).numpy()
+    deviation = np.abs(actual - expected)
+
+    num_groups = len(expected) // group_size
+    expected_groups = expected[:num_groups * group_size].reshape(num_groups, group_size)
+    actual_groups = actual[:num_groups * group_size].reshape(num_groups, group_size)
+    expected_top = np.sort(np.argsort(-expected_groups, axis=1, kind='stable')[:, :k], axis=1)
+    actual_top = np.argsort(-actual_groups, axis=1, kind='stable')[:, :k]
+    overlap = np.mean([np.isin(a, e).mean() for a, e in zip(actual_top, expected_top)]) if num_groups else 1.0
+    return {
+        'max_abs_deviation': float(deviation.max()),
+        'mean_abs_deviation': float(deviation.mean()),
+        'p99_abs_deviation': float(np.percentile(deviation, 99)),
+        'top_k_overlap': float(overlap),
+        'top1_agreement': float(np.mean(expected_groups.argmax(axis=1) == actual_groups.argmax(axis=1)))
+        if num_groups else 1.0,
+    }
+
+def check_parity(report: Dict[str, float], max_mean_deviation: float = MAX_MEAN_DEVIATION,
+                 max_p99_deviation: float = MAX_P99_DEVIATION, min_overlap: float = MIN_TOP_K_OVERLAP) -> bool:
+    return (report['mean_abs_deviation'] <= max_mean_deviation
+            and report['p99_abs_deviation'] <= max_p99_deviation
+            and report['top_k_overlap'] >= min_overlap)
+
+def sample_features(input_size: int, num_rows: int, seed: int = 0,
+                    features: Optional[np.ndarray] = None) -> torch.Tensor:
+    """Parity inputs: rows drawn from real feature rows if given, else standard normal."""
+    rng = np.random.default_rng(seed)
+    if features is not None:
+        return torch.from_numpy(np.ascontiguousarray(features[rng.integers(0, len(features), num_rows)],
+                                                     dtype=np.float32))
+    return torch.from_numpy(rng.standard_normal((num_rows, input_size), dtype=np.float32))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a DeepHybridRecommender checkpoint for CPU inference.")
+    parser.add_argument("checkpoint", help="Float state dict, e.g. models/best_hybrid_model.pth")
+    parser.add_argument("output", help="TorchScript artifact path, e.g. models/hybrid_model_int8.pt")
+    parser.add_argument("--no-quantize", action="store_true", help="Fold BatchNorm and trace only")
+    parser.add_argument("--parity-features", help=".npy of real [rows, input_size] feature rows for parity checks")
+    parser.add_argument("--parity-rows", type=int, default=100_000)
+    parser.add_argument("--max-mean-deviation", type=float, default=MAX_MEAN_DEVIATION)
+    parser.add_argument("--max-p99-deviation", type=float, default=MAX_P99_DEVIATION)
+    parser.add_argument("--min-overlap", type=float, default=MIN_TOP_K_OVERLAP)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    model = load_checkpoint(args.checkpoint)
+    exported = export_model(model, quantize=not args.no_quantize)
+
+    input_size = model.network[0].in_features
+    parity_source = np.load(args.parity_features, mmap_mode='r') if args.parity_features else None
+    report = parity_report(model, exported, sample_features(input_size, args.parity_rows, features=parity_source))
+    logger.info(f"Parity against the float model: {json.dumps(report)}")
+    if not check_parity(report, args.max_mean_deviation, args.max_p99_deviation, args.min_overlap):
+        raise SystemExit(f"Exported model is outside the parity bounds; not writing {args.output}.")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    torch.jit.save(exported, args.output)
+    logger.info(f"Wrote {args.output} ({os.path.getsize(args.output) / 2**10:.0f} KiB, "
+                f"checkpoint {os.path.getsize(args.checkpoint) / 2**10:.0f} KiB).")
+
+if __name__ == "__main__":
+    main()
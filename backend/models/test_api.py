@@ -55,6 +55,31 @@ def test_strains_list():
     assert response.status_code == 200
     assert "strains" in response.json()
 
+# Test strain search endpoint
+def test_strains_search():
+    response = httpx.get(f"{BASE_URL}/strains/search", params={"prefix": "blue", "limit": 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert "strains" in body and "next_cursor" in body
+    assert len(body["strains"]) <= 5
+
+    # Paging through the full list follows next_cursor
+    response = httpx.get(f"{BASE_URL}/strains/search", params={"limit": 2})
+    assert response.status_code == 200
+    cursor = response.json()["next_cursor"]
+    if cursor:
+        response = httpx.get(f"{BASE_URL}/strains/search", params={"limit": 2, "cursor": cursor})
+        assert response.status_code == 200
+
+# Test similar strains endpoint
+def test_similar_strains():
+    response = httpx.get(f"{BASE_URL}/strain/blue dream/similar", params={"limit": 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert "similar_strains" in body
+    assert len(body["similar_strains"]) <= 5
+    assert all(strain["name"] != body["strain"] for strain in body["similar_strains"])
+
 # Test add badge endpoint
 def test_add_badge():
     data = {
@@ -115,6 +140,16 @@ def test_leaderboard():
     assert response.status_code == 200
     assert "leaderboard" in response.json()
 
+# Test popular strains endpoint with trending windows
+def test_popular_strains():
+    for window in ["all", "24h", "7d", "30d"]:
+        response = httpx.get(f"{BASE_URL}/popular_strains/", params={"window": window})
+        assert response.status_code == 200
+        assert "popular_strains" in response.json()
+
+    response = httpx.get(f"{BASE_URL}/popular_strains/", params={"window": "1y"})
+    assert response.status_code == 422
+
 # Test notifications endpoint
 def test_notifications():
     user_id = "some_user_id"
@@ -128,3 +163,11 @@ def test_profile():
     response = httpx.get(f"{BASE_URL}/profile/{user_id}")
     assert response.status_code == 200
     assert "profile" in response.json()
+
+# Test metrics endpoint exposes scoring executor load
+def test_metrics_scoring():
+    response = httpx.get(f"{BASE_URL}/metrics/")
+    assert response.status_code == 200
+    scoring = response.json()["scoring"]
+    for key in ["queue_depth", "running", "shed_saturated", "shed_deadline"]:
+        assert key in scoring
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fold_in import RATING_MIDPOINT, fold_in_user, fold_in_users  # noqa: E402
+
+NUM_STRAINS = 30
+NUM_FACTORS = 4
+
+def make_csr(seed: int = 0):
+    """Seven users with 0-12 weighted ratings each; user 3 has none."""
+    rng = np.random.default_rng(seed)
+    lengths = [5, 1, 12, 0, 7, 3, 9]
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    indices = np.concatenate([rng.choice(NUM_STRAINS, length, replace=False) for length in lengths])
+    targets = rng.uniform(1, 5, len(indices))
+    weights = rng.uniform(0.3, 1.0, len(indices))
+    return indptr, indices.astype(np.int64), targets, weights
+
+# The batched solver matches the single-user solver, across chunk boundaries and with strain biases
+def test_batched_matches_single_user():
+    rng = np.random.default_rng(1)
+    strain_factors = rng.standard_normal((NUM_STRAINS, NUM_FACTORS)).astype(np.float32)
+    strain_bias = rng.normal(0, 0.3, NUM_STRAINS)
+    indptr, indices, targets, weights = make_csr()
+
+    user_vectors, user_bias = fold_in_users(strain_factors, indptr, indices, targets, weights,
+                                            strain_bias=strain_bias, chunk_size=2)
+    for user in range(len(indptr) - 1):
+        rows = slice(indptr[user], indptr[user + 1])
+        vector, bias = fold_in_user(strain_factors, indices[rows], targets[rows], weights[rows],
+                                    strain_bias=strain_bias)
+        np.testing.assert_allclose(user_vectors[user], vector, rtol=1e-4, atol=1e-5)
+        assert abs(user_bias[user] - bias) < 1e-5
+
+# A user without signals falls back to the zero vector and zero bias (the global mean)
+def test_empty_user_falls_back_to_zero():
+    strain_factors = np.ones((NUM_STRAINS, NUM_FACTORS), dtype=np.float32)
+    vector, bias = fold_in_user(strain_factors, np.array([], dtype=np.int64), np.array([]))
+    assert vector.shape == (NUM_FACTORS,) and not vector.any() and bias == 0.0
+
+    indptr, indices, targets, weights = make_csr()
+    user_vectors, user_bias = fold_in_users(strain_factors, indptr, indices, targets, weights)
+    assert not user_vectors[3].any() and user_bias[3] == 0.0
+
+# The ridge term is reg * total weight on every coefficient, bias included
+def test_ridge_regularization():
+    rng = np.random.default_rng(2)
+    strain_factors = rng.standard_normal((NUM_STRAINS, NUM_FACTORS))
+    strain_ids = np.arange(10)
+    weights = rng.uniform(0.5, 1.5, 10)
+    true_vector, true_bias = rng.standard_normal(NUM_FACTORS), 0.4
+    targets = RATING_MIDPOINT + strain_factors[strain_ids] @ true_vector + true_bias
+
+    # Without regularization a noiseless user is recovered exactly.
+    vector, bias = fold_in_user(strain_factors, strain_ids, targets, weights, reg=0.0)
+    np.testing.assert_allclose(vector, true_vector, atol=1e-4)
+    assert abs(bias - true_bias) < 1e-4
+
+    reg = 0.5
+    design = np.hstack([strain_factors[strain_ids], np.ones((10, 1))])
+    gram = design.T @ (design * weights[:, None]) + reg * weights.sum() * np.eye(NUM_FACTORS + 1)
+    expected = np.linalg.solve(gram, (design * weights[:, None]).T @ (targets - RATING_MIDPOINT))
+    vector, bias = fold_in_user(strain_factors, strain_ids, targets, weights, reg=reg)
+    np.testing.assert_allclose(vector, expected[:NUM_FACTORS], rtol=1e-5, atol=1e-6)
+    assert abs(bias - expected[NUM_FACTORS]) < 1e-6
+    assert np.linalg.norm(np.append(vector, bias)) < np.linalg.norm(np.append(true_vector, true_bias))
+
+    indptr = np.array([0, 10])
+    batched_vectors, batched_bias = fold_in_users(strain_factors, indptr, strain_ids, targets, weights, reg=reg)
+    np.testing.assert_allclose(batched_vectors[0], vector, rtol=1e-4, atol=1e-5)
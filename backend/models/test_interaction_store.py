@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interaction_store import convert_csv, load_interaction_store  # noqa: E402
+
+ROWS = pd.DataFrame({
+    "user_id": [1, None, 1, 2, 3, 1, 2],
+    "strain_id": [5, 6, None, 6, 7, 5, 6],
+    "rating": [4.0, 3.0, 5.0, 2.0, 9.0, 2.0, None],
+})
+
+def check_store(store_dir, meta):
+    assert meta["rows_read"] == len(ROWS)
+    assert meta["dropped_missing"] == 3 and meta["dropped_out_of_range"] == 1
+    store = load_interaction_store(store_dir)
+    assert store.user_id.tolist() == [1, 2] and store.strain_id.tolist() == [5, 6]
+    np.testing.assert_allclose(store.rating, [3.0, 2.0])
+    assert store.user_id.dtype == np.int32 and store.rating.dtype == np.float32
+
+# Rows with missing ids or ratings are dropped and counted instead of failing the chunk
+def test_csv_with_missing_ids(tmp_path):
+    csv_path = tmp_path / "interactions.csv"
+    ROWS.to_csv(csv_path, index=False)
+    # Two-row chunks: the duplicate (1, 5) pair is merged across runs.
+    meta = convert_csv(str(csv_path), str(tmp_path / "store"), chunk_rows=2)
+    check_store(str(tmp_path / "store"), meta)
+
+# Parquet shards with null ids are handled the same way
+def test_parquet_with_missing_ids(tmp_path):
+    pytest.importorskip("pyarrow")
+    shards = tmp_path / "shards"
+    shards.mkdir()
+    ROWS.astype({"user_id": "Int32", "strain_id": "Int32"}).to_parquet(shards / "part-00000.parquet")
+    meta = convert_csv(str(shards), str(tmp_path / "store"), chunk_rows=2)
+    check_store(str(tmp_path / "store"), meta)
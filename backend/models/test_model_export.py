@@ -0,0 +1,34 @@
+import os
+import sys
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_export import (check_parity, export_model, fold_batchnorm, load_checkpoint,  # noqa: E402
+                          load_scoring_model, parity_report, sample_features)
+
+CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "best_hybrid_model.pth")
+
+# Folding BatchNorm into the Linear layers does not change scores
+def test_fold_batchnorm_matches_eager():
+    model = load_checkpoint(CHECKPOINT)
+    features = sample_features(model.network[0].in_features, 4096)
+    with torch.no_grad():
+        assert torch.allclose(fold_batchnorm(model)(features), model(features), atol=1e-4)
+
+# The int8 TorchScript export stays within the parity bounds
+def test_quantized_export_parity():
+    model = load_checkpoint(CHECKPOINT)
+    features = sample_features(model.network[0].in_features, 20_000)
+    report = parity_report(model, export_model(model), features)
+    assert check_parity(report), report
+
+# A saved artifact loads without the model class and scores like the exported module
+def test_exported_artifact_roundtrip(tmp_path):
+    model = load_checkpoint(CHECKPOINT)
+    exported = export_model(model)
+    path = str(tmp_path / "hybrid_model_int8.pt")
+    torch.jit.save(exported, path)
+    features = sample_features(model.network[0].in_features, 64)
+    with torch.no_grad():
+        assert torch.equal(load_scoring_model(path)(features), exported(features))
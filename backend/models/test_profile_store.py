@@ -0,0 +1,174 @@
+import os
+import sys
+import threading
+
+import pytest
+import redis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from badges import FAVORITE_BADGES, FEEDBACK_BADGES, REVIEW_BADGES, badge_message  # noqa: E402
+from event_stream import (DEAD_LETTER_KEY, EVENT_FEEDBACK, EVENT_REVIEW, STREAM_KEY, EventProcessor,  # noqa: E402
+                          ensure_consumer_group, event_fields, publish_user_event, rebuild_derived, replay)
+from profile_codec import ProfileCodec  # noqa: E402
+from profile_store import ProfileScripts, load_profile, profile_key, save_new_profile, update_profile  # noqa: E402
+
+USER_ID = 990001
+NUM_FAVORITES = 40
+NUM_REVIEWS = 20
+NUM_FEEDBACK = 6
+NUM_UPDATES = 60
+
+@pytest.fixture
+def redis_client():
+    """A scratch Redis database, or an in-process fakeredis server if none is reachable."""
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=int(os.getenv("REDIS_PORT", 6379)), db=15)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+# Concurrent favorites, events, notification drains and record updates for one user lose nothing
+def test_concurrent_writes_lose_nothing(redis_client):
+    codec = ProfileCodec("orjson")
+    scripts = ProfileScripts(redis_client)
+    processor = EventProcessor(redis_client, codec)
+    save_new_profile(redis_client, codec, USER_ID, {"user_id": USER_ID, "visits": 0, "favorites": ["ignored"]})
+    ensure_consumer_group(redis_client)
+
+    strains = [f"strain {i}" for i in range(NUM_FAVORITES)]
+    delivered = []
+    published = threading.Event()
+
+    def add_favorites(offset):
+        # Every strain is added by two threads; exactly one add must win.
+        for strain in strains[offset::4] + strains[(offset + 1) % 4::4]:
+            scripts.add_favorite(USER_ID, strain, FAVORITE_BADGES)
+
+    def publish_events():
+        for i in range(NUM_REVIEWS):
+            publish_user_event(scripts, EVENT_REVIEW, USER_ID, {"strain_name": strains[i], "rating": 4.0})
+        for i in range(NUM_FEEDBACK):
+            publish_user_event(scripts, EVENT_FEEDBACK, USER_ID, {"strain_name": strains[i], "feedback_type": "like"})
+        published.set()
+
+    def work():
+        while True:
+            done = published.is_set()
+            response = redis_client.xreadgroup(processor.group, "test", {STREAM_KEY: '>'}, count=3)
+            for _, entries in response or []:
+                processor.apply_batch(entries)
+            if done and not response:
+                return
+
+    def drain_notifications():
+        while not published.is_set() or redis_client.llen(f"user_notifications_{USER_ID}"):
+            delivered.extend(scripts.pop_notifications(USER_ID))
+
+    def bump_visits():
+        for _ in range(NUM_UPDATES):
+            update_profile(redis_client, codec, USER_ID, lambda profile: profile.update(visits=profile["visits"] + 1))
+
+    threads = ([threading.Thread(target=add_favorites, args=(i,)) for i in range(4)]
+               + [threading.Thread(target=bump_visits) for _ in range(2)]
+               + [threading.Thread(target=target) for target in (publish_events, work, drain_notifications)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+        assert not thread.is_alive()
+    delivered.extend(scripts.pop_notifications(USER_ID))
+
+    profile = load_profile(redis_client, codec, USER_ID)
+    assert sorted(profile["favorites"]) == sorted(strains)
+    assert len(profile["reviews"]) == NUM_REVIEWS
+    assert len(profile["strain_feedback"]) == NUM_FEEDBACK
+    assert profile["visits"] == 2 * NUM_UPDATES
+    assert redis_client.zscore("leaderboard", str(USER_ID)) == NUM_REVIEWS
+
+    expected_badges = {FAVORITE_BADGES[5], REVIEW_BADGES[1], REVIEW_BADGES[10], FEEDBACK_BADGES[5]}
+    assert sorted(profile["badges"]) == sorted(expected_badges)
+    assert sorted(delivered) == sorted(badge_message(badge) for badge in expected_badges)
+
+# Missing users are rejected inside the scripts, before anything is written
+def test_missing_user(redis_client):
+    scripts = ProfileScripts(redis_client)
+    assert scripts.add_favorite(USER_ID, "blue dream", FAVORITE_BADGES) is None
+    assert scripts.remove_favorite(USER_ID, "blue dream") is None
+    assert scripts.pop_notifications(USER_ID) is None
+    assert publish_user_event(scripts, EVENT_REVIEW, USER_ID, {"strain_name": "blue dream", "rating": 5.0}) is None
+    assert redis_client.dbsize() == 0
+
+# Records written before the split keep their favorites, badges and notifications
+def test_migrates_inline_fields(redis_client):
+    codec = ProfileCodec("orjson")
+    legacy = {"user_id": USER_ID, "favorites": ["og kush", "blue dream"], "badges": ["First Review"],
+              "notifications": ["welcome"]}
+    redis_client.set(profile_key(USER_ID), codec.encode(legacy))
+    ProfileScripts(redis_client).add_favorite(USER_ID, "sour diesel", FAVORITE_BADGES)
+
+    profile = load_profile(redis_client, codec, USER_ID)
+    assert profile["favorites"] == ["og kush", "blue dream", "sour diesel"]
+    assert profile["badges"] == ["First Review"] and profile["notifications"] == ["welcome"]
+    assert "favorites" not in codec.decode(redis_client.get(profile_key(USER_ID)))
+
+# Bad entries in a batch are dead-lettered and acknowledged; the rest of the batch still applies
+def test_poison_entries_are_dead_lettered(redis_client):
+    codec = ProfileCodec("orjson")
+    scripts = ProfileScripts(redis_client)
+    processor = EventProcessor(redis_client, codec)
+    save_new_profile(redis_client, codec, USER_ID, {"user_id": USER_ID})
+    ensure_consumer_group(redis_client)
+
+    publish_user_event(scripts, EVENT_REVIEW, USER_ID, {"strain_name": "og kush", "rating": 4.0})
+    redis_client.xadd(STREAM_KEY, {"type": EVENT_REVIEW, "user_id": "not a number"})
+    redis_client.xadd(STREAM_KEY, event_fields(EVENT_REVIEW, USER_ID, {"strain_name": "og kush", "rating": "great"}))
+    publish_user_event(scripts, EVENT_FEEDBACK, USER_ID, {"strain_name": "og kush", "feedback_type": "like"})
+
+    (_, entries), = redis_client.xreadgroup(processor.group, "test", {STREAM_KEY: '>'})
+    assert processor.apply_batch(entries) == 2
+
+    dead = redis_client.xrange(DEAD_LETTER_KEY)
+    assert [fields[b"source_id"] for _, fields in dead] == [entries[1][0], entries[2][0]]
+    assert all(b"error" in fields for _, fields in dead)
+    assert redis_client.xpending(STREAM_KEY, processor.group)["pending"] == 0
+    profile = load_profile(redis_client, codec, USER_ID)
+    assert len(profile["reviews"]) == 1 and "og kush" in profile["strain_feedback"]
+    assert redis_client.hgetall("strain_reviews_og kush") == {b"review_count": b"1", b"rating_sum": b"4"}
+
+# Rebuilding derived keys recomputes them from the stream; running it twice, or replaying, doubles nothing
+def test_rebuild_derived_is_idempotent(redis_client):
+    codec = ProfileCodec("orjson")
+    scripts = ProfileScripts(redis_client)
+    processor = EventProcessor(redis_client, codec)
+    save_new_profile(redis_client, codec, USER_ID, {"user_id": USER_ID})
+    ensure_consumer_group(redis_client)
+    for strain in ("og kush", "og kush", "blue dream"):
+        publish_user_event(scripts, EVENT_REVIEW, USER_ID, {"strain_name": strain, "rating": 4.0})
+        publish_user_event(scripts, EVENT_FEEDBACK, USER_ID, {"strain_name": strain, "feedback_type": "like"})
+    pytest.raises(ValueError, rebuild_derived, [processor])  # Not drained yet
+
+    (_, entries), = redis_client.xreadgroup(processor.group, "test", {STREAM_KEY: '>'})
+    processor.apply_batch(entries)
+
+    def snapshot():
+        keys = sorted(redis_client.scan_iter(match="strain_*")) + [b"leaderboard"]
+        derived = {key: redis_client.zrange(key, 0, -1, withscores=True) if redis_client.type(key) == b"zset"
+                   else redis_client.hgetall(key) for key in keys}
+        return derived, load_profile(redis_client, codec, USER_ID)
+
+    expected = snapshot()
+    assert expected[0][b"leaderboard"] == [(str(USER_ID).encode(), 3.0)]
+    assert expected[0][b"strain_reviews_og kush"] == {b"review_count": b"2", b"rating_sum": b"8"}
+    for _ in range(2):
+        assert rebuild_derived([processor]) == 6
+        replay(processor)
+        assert snapshot() == expected
+
+    redis_client.delete("leaderboard", "strain_reviews_og kush", "strain_popularity")
+    rebuild_derived([processor])
+    assert snapshot() == expected
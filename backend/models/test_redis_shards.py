@@ -0,0 +1,110 @@
+import os
+import shutil
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from badges import FAVORITE_BADGES  # noqa: E402
+from event_stream import EVENT_REVIEW, STREAM_KEY, EventProcessor, publish_user_event, replay  # noqa: E402
+from profile_codec import ProfileCodec  # noqa: E402
+from profile_store import ProfileScripts, load_profile, save_new_profile  # noqa: E402
+from redis_shards import HashRing, RedisShards, key_tag, start_local_nodes  # noqa: E402
+from shard_rebalance import rebalance  # noqa: E402
+
+NUM_USERS = 300
+
+@pytest.fixture
+def cluster():
+    """Three local redis-server nodes, or three separate fakeredis servers without the binary."""
+    if shutil.which("redis-server"):
+        with start_local_nodes(3) as nodes:
+            yield nodes, None
+        return
+    fakeredis = pytest.importorskip("fakeredis")
+    servers = {}
+
+    def client_factory(host, port, **kwargs):
+        return fakeredis.FakeRedis(server=servers.setdefault((host, port), fakeredis.FakeServer()), **kwargs)
+    yield ["127.0.0.1:7001", "127.0.0.1:7002", "127.0.0.1:7003"], client_factory
+
+def connect(cluster, count):
+    nodes, client_factory = cluster
+    return RedisShards(nodes[:count], nodes[0], client_factory=client_factory, decode_responses=False)
+
+# Users spread evenly, and adding a node only moves users onto the new node
+def test_ring_balance_and_movement():
+    users = range(30_000)
+    three = HashRing(["a:1", "b:1", "c:1"])
+    four = HashRing(["a:1", "b:1", "c:1", "d:1"])
+    owners = Counter(three.node_for(user) for user in users)
+    assert all(abs(count / len(users) - 1 / 3) < 0.05 for count in owners.values())
+    moved = [user for user in users if three.node_for(user) != four.node_for(user)]
+    assert all(four.node_for(user) == "d:1" for user in moved)
+    assert abs(len(moved) / len(users) - 1 / 4) < 0.05
+
+# All keys of a user share a node; hash tags follow the same user; other keys are global
+def test_key_routing():
+    shards = RedisShards(["a:1", "b:1", "c:1"], "g:1")
+    owner = shards.node_for_user(42)
+    for key in ("user_profile_42", "user_favorites_42", "user_applied_events_42", "{42}:cart", b"user_badges_42"):
+        assert key_tag(key) == "42" and shards.node_for_key(key) == owner
+    for key in ("user_email_someone@example.com", "next_user_id", "leaderboard", "strain_reviews_og kush",
+                "global_applied_events_42"):
+        assert shards.node_for_key(key) == "g:1"
+
+# Growing from two to three shards moves only the users whose owner changed, with all their state
+def test_rebalance(cluster):
+    codec = ProfileCodec("orjson")
+    old, new = connect(cluster, 2), connect(cluster, 3)
+    for user_id in range(1, NUM_USERS + 1):
+        client = old.for_user(user_id)
+        save_new_profile(client, codec, user_id, {"user_id": user_id, "email": f"{user_id}@example.com"})
+        ProfileScripts(client).add_favorite(user_id, f"strain {user_id}", FAVORITE_BADGES)
+        client.zadd("leaderboard", {str(user_id): user_id % 17})
+    old.global_client.set("next_user_id", NUM_USERS)
+    top_before = old.gather_top("leaderboard", 10)
+    scores_before = sorted(old.gather_top("leaderboard", NUM_USERS))
+
+    report = rebalance(old, new)
+    moved = sum(route["tags"] for route in report.values())
+    assert 0.2 < moved / NUM_USERS < 0.5 and all(route.endswith(new.nodes[2]) for route in report)
+
+    for user_id in range(1, NUM_USERS + 1):
+        profile = load_profile(new.for_user(user_id), codec, user_id)
+        assert profile["email"] == f"{user_id}@example.com" and profile["favorites"] == [f"strain {user_id}"]
+    for node, client in new.clients.items():
+        assert all(new.node_for_key(key) == node for key in client.scan_iter() if key_tag(key) is not None)
+    assert new.gather_top("leaderboard", 10) == top_before
+    assert sorted(new.gather_top("leaderboard", NUM_USERS)) == scores_before
+    assert new.global_client.get("next_user_id") == str(NUM_USERS).encode()
+    assert rebalance(new, new) == {}
+
+# Shard workers keep user state on the user's shard and apply strain aggregates once on the global node
+def test_sharded_event_workers(cluster):
+    codec = ProfileCodec("orjson")
+    shards = connect(cluster, 3)
+    scripts = shards.per_shard(ProfileScripts)
+    for user_id in range(1, 31):
+        save_new_profile(shards.for_user(user_id), codec, user_id, {"user_id": user_id})
+        for _ in range(user_id % 4):
+            publish_user_event(scripts[shards.node_for_user(user_id)], EVENT_REVIEW, user_id,
+                               {"strain_name": "og kush", "rating": 4.0})
+    expected_reviews = sum(user_id % 4 for user_id in range(1, 31))
+
+    processors = [EventProcessor(shards.clients[node], codec, global_client=shards.global_client)
+                  for node in shards.nodes]
+    for processor in processors:
+        assert not processor.colocated or processor.redis_client is shards.global_client
+        processor.apply_batch(processor.redis_client.xrange(STREAM_KEY), ack=False)
+        replay(processor)  # Already applied: neither side counts anything twice
+
+    aggregates = shards.global_client.hgetall("strain_reviews_og kush")
+    assert int(aggregates[b"review_count"]) == expected_reviews
+    assert float(aggregates[b"rating_sum"]) == 4.0 * expected_reviews
+    top = shards.gather_top("leaderboard", 30)
+    assert sum(score for _, score in top) == expected_reviews and top[0][1] == 3
+    for user_id in range(1, 31):
+        assert len(load_profile(shards.for_user(user_id), codec, user_id).get("reviews", [])) == user_id % 4
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_replay import (Replayer, TextLogParser, TraceEvent, endpoint_label, parse_structured_line,  # noqa: E402
+                            parse_trace)
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "logs", "deep_hybrid_recommender.log")
+
+# The service log parses into an ordered trace of real endpoint calls
+def test_parse_service_log():
+    events = parse_trace([LOG_FILE])
+    assert events and all(a.ts <= b.ts for a, b in zip(events, events[1:]))
+    labels = {endpoint_label(event.method, event.path) for event in events}
+    assert {"POST /onboarding/", "POST /submit_survey/", "GET /recommend/{user_id}", "POST /review/"} <= labels
+
+# Recommendations logged inside a survey submission are not replayed twice
+def test_survey_recommendation_not_duplicated():
+    parser = TextLogParser()
+    survey = parser.parse(0.0, 'Received survey submission: {"user_id": 7, "desired_effects": ["sleepy"]}')
+    assert survey.path == "/submit_survey/" and survey.user_id == 7
+    assert parser.parse(1.0, "Generating recommendations for user 7") is None
+    assert parser.parse(2.0, "Generating recommendations for user 7").path == "/recommend/7"
+
+# Login events take their user id from the profile save logged just before
+def test_login_user_id():
+    parser = TextLogParser()
+    parser.parse(0.0, "User profile saved for user 133")
+    login = parser.parse(0.0, "User someone@example.com logged in successfully.")
+    assert login.user_id == 133 and login.body["email"] == "someone@example.com"
+
+# Structured access-log lines round-trip through the trace format
+def test_structured_line():
+    event = parse_structured_line('{"ts": 5.0, "method": "get", "path": "/favorites/12", "body": null}')
+    assert event.method == "GET" and event.user_id == 12
+    assert parse_structured_line(event.to_json()) == event
+
+def fake_target(write_behind: bool):
+    """A target that applies reviews one per /metrics/ poll when write-behind, or at once otherwise."""
+    state = {"queued": 0, "reviews": 0, "metrics_calls": 0}
+
+    def handle(request):
+        if request.url.path == "/onboarding/":
+            return httpx.Response(201, json={"user": {"user_id": 501}})
+        if request.url.path == "/review/":
+            state["queued" if write_behind else "reviews"] += 1
+            return httpx.Response(200, json={"event_id": "1-0"})
+        if request.url.path == "/metrics/":
+            state["metrics_calls"] += 1
+            if not write_behind:
+                return httpx.Response(404, json={"detail": "Not Found"})
+            lag = {"length": 2, "lag": state["queued"], "pending": 0, "lag_seconds": 0.0}
+            if state["queued"]:
+                state["queued"] -= 1
+                state["reviews"] += 1
+            return httpx.Response(200, json={"event_stream": lag})
+        return httpx.Response(200, json={"reviews": state["reviews"]})
+    return state, httpx.MockTransport(handle)
+
+# Reads after reviews wait until the target's event workers have applied them; synchronous builds are not polled
+def test_reads_wait_for_write_behind_events():
+    trace = [TraceEvent(float(i), "POST", "/review/", {"user_id": 7, "strain_name": "og kush"}, 7) for i in range(2)]
+    trace.append(TraceEvent(2.0, "GET", "/profile/7", None, 7))
+    for write_behind in (True, False):
+        state, transport = fake_target(write_behind)
+        run = asyncio.run(Replayer("http://target", speed=0, transport=transport).run(trace))
+        assert run["results"][2].status == 200 and json.loads(run["results"][2].body) == {"reviews": 2}
+        assert state["metrics_calls"] == (3 if write_behind else 1)
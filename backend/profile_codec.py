@@ -0,0 +1,188 @@
+# profile_codec.py
+
+import datetime
+import json
+import logging
+import struct
+import threading
+from typing import Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # Optional: falls back to orjson / json
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to json
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: compression is skipped when unavailable
+    zstandard = None
+
+# ---------------------------
+# Record Layout
+# ---------------------------
+# Every binary record starts with a 4 byte header:
+#   MAGIC (2 bytes) | FORMAT_VERSION (1 byte) | flags (1 byte)
+# The low nibble of flags is the codec id, bit 4 marks a zstd-compressed body.
+# Legacy records are plain JSON text and always start with '{'.
+MAGIC = b'\x00P'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('>2sBB')
+FLAG_ZSTD = 0x10
+CODEC_MASK = 0x0F
+
+CODEC_JSON = 0
+CODEC_MSGPACK = 1
+CODEC_ORJSON = 2
+CODEC_NAMES = {"json": CODEC_JSON, "msgpack": CODEC_MSGPACK, "orjson": CODEC_ORJSON}
+
+# ---------------------------
+# Timestamp Helpers
+# ---------------------------
+def now_epoch() -> int:
+    """Current time as integer seconds since the epoch, the stored timestamp format."""
+    return int(datetime.datetime.now().timestamp())
+
+def to_epoch(value) -> Optional[int]:
+    """Converts a legacy `str(datetime.now())` timestamp (or an epoch number) to epoch seconds."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    try:
+        return int(datetime.datetime.fromisoformat(str(value)).timestamp())
+    except ValueError:
+        logging.warning(f"Unparseable profile timestamp: {value!r}")
+        return None
+
+def format_epoch(value) -> Optional[str]:
+    """Renders a stored timestamp in the same local 'YYYY-MM-DD HH:MM:SS' form the API has always returned."""
+    if value is None or isinstance(value, str):
+        return value
+    return str(datetime.datetime.fromtimestamp(value))
+
+def upgrade_legacy_timestamps(profile: dict) -> dict:
+    """Rewrites the string timestamps of a legacy JSON profile as epoch ints, in place."""
+    if "last_login" in profile:
+        profile["last_login"] = to_epoch(profile["last_login"])
+    for review in profile.get("reviews", []):
+        if "date" in review:
+            review["date"] = to_epoch(review["date"])
+    for feedback in profile.get("strain_feedback", {}).values():
+        if "date" in feedback:
+            feedback["date"] = to_epoch(feedback["date"])
+    return profile
+
+def format_profile_timestamps(profile: dict) -> dict:
+    """Returns a copy of the profile with epoch timestamps rendered as strings for API responses."""
+    profile = dict(profile)
+    if "last_login" in profile:
+        profile["last_login"] = format_epoch(profile["last_login"])
+    if "reviews" in profile:
+        profile["reviews"] = [
+            {**review, "date": format_epoch(review.get("date"))} for review in profile["reviews"]
+        ]
+    if "strain_feedback" in profile:
+        profile["strain_feedback"] = {
+            strain_name: {**feedback, "date": format_epoch(feedback.get("date"))}
+            for strain_name, feedback in profile["strain_feedback"].items()
+        }
+    return profile
+
+# ---------------------------
+# Profile Codec
+# ---------------------------
+class ProfileCodec:
+    """
+    Serializes user profiles for Redis.
+
+    Writes use the configured codec (msgpack, orjson or json) behind a
+    versioned header and compress bodies above `compress_threshold` bytes
+    with zstd. Reads dispatch on the header, so records written with any
+    codec, and legacy plain-JSON records, stay readable after a switch.
+    """
+
+    def __init__(self, codec: str = "orjson", compress_threshold: int = 1024, compress_level: int = 3):
+        codec_id = CODEC_NAMES.get(codec)
+        if codec_id is None:
+            raise ValueError(f"Unknown profile codec: {codec}")
+        if codec_id == CODEC_MSGPACK and msgpack is None:
+            logging.warning("msgpack is not installed. Falling back to orjson/json profile codec.")
+            codec_id = CODEC_ORJSON
+        if codec_id == CODEC_ORJSON and orjson is None:
+            logging.warning("orjson is not installed. Falling back to json profile codec.")
+            codec_id = CODEC_JSON
+        self.codec_id = codec_id
+        self.compress_threshold = compress_threshold if zstandard is not None else None
+        self.compress_level = compress_level
+        # zstd contexts are not thread-safe; API handlers and workers share one codec across threads.
+        self._local = threading.local()
+
+    @property
+    def _compressor(self):
+        if zstandard is None:
+            return None
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.compress_level)
+        return self._local.compressor
+
+    @property
+    def _decompressor(self):
+        if zstandard is None:
+            return None
+        if not hasattr(self._local, "decompressor"):
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.decompressor
+
+    def encode(self, profile: dict) -> bytes:
+        """Encodes a profile dict into a headered binary record."""
+        body = _dumps(self.codec_id, profile)
+        flags = self.codec_id
+        if self.compress_threshold is not None and len(body) > self.compress_threshold:
+            body = self._compressor.compress(body)
+            flags |= FLAG_ZSTD
+        return HEADER.pack(MAGIC, FORMAT_VERSION, flags) + body
+
+    def decode(self, data: Union[bytes, str]) -> dict:
+        """Decodes a record written by `encode` or a legacy JSON profile."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if data[:1] == b'{':
+            return upgrade_legacy_timestamps(json.loads(data))
+
+        magic, version, flags = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Unrecognized profile record header.")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported profile record version: {version}")
+
+        body = memoryview(data)[HEADER.size:]
+        if flags & FLAG_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("Profile record is zstd-compressed but zstandard is not installed.")
+            body = self._decompressor.decompress(body)
+        return _loads(flags & CODEC_MASK, body)
+
+def _dumps(codec_id: int, profile: dict) -> bytes:
+    if codec_id == CODEC_MSGPACK:
+        return msgpack.packb(profile, use_bin_type=True)
+    if codec_id == CODEC_ORJSON:
+        return orjson.dumps(profile, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(profile, separators=(',', ':')).encode('utf-8')
+
+def _loads(codec_id: int, body) -> dict:
+    if codec_id == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Profile record is msgpack-encoded but msgpack is not installed.")
+        return msgpack.unpackb(body, raw=False, strict_map_key=False)
+    if codec_id == CODEC_ORJSON:
+        if orjson is None:
+            return json.loads(bytes(body))
+        return orjson.loads(body)
+    if codec_id == CODEC_JSON:
+        return json.loads(bytes(body))
+    raise ValueError(f"Unknown profile codec id: {codec_id}")
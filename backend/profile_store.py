@@ -0,0 +1,260 @@
+# profile_store.py
+#
+# Atomic user profile writes.
+#
+# A profile is one binary record (profile_codec.py) plus three native Redis
+# lists kept beside it: favorites, badges and notifications. The lists are
+# the fields that many requests append to or drain, and they are changed
+# only by the Lua scripts below. Each script checks that the user exists and
+# applies the whole change (favorite, badge, notification) in a single
+# EVALSHA round trip, with no read-modify-write in Python. Lua cannot read
+# the compressed, codec-framed record, which is why these fields live
+# outside it.
+#
+# Writes to the record itself (login, survey, event workers) use
+# WATCH/MULTI in `update_profile`, so concurrent writers retry instead of
+# overwriting each other. Reads merge the record and the lists in one
+# pipelined round trip, so callers still see a single profile dict.
+#
+# Records written before the split still hold these fields inline.
+# `migrate_profile` moves them out. It runs lazily on read, and
+# `python profile_store.py migrate` runs it for every profile.
+
+import argparse
+import logging
+from typing import Callable, Dict, List, Optional
+import redis
+
+from badges import badge_message
+from profile_codec import ProfileCodec
+
+SPLIT_FIELDS = ("favorites", "badges", "notifications")
+
+def profile_key(user_id) -> str:
+    return f"user_profile_{user_id}"
+
+def field_key(field: str, user_id) -> str:
+    return f"user_{field}_{user_id}"
+
+# ---------------------------
+# Lua Scripts
+# ---------------------------
+# Awards the badge whose threshold equals `count` unless the user has it.
+# Thresholds arrive as ARGV pairs (count, badge, message) from `first` on.
+AWARD_FUNCTION = """
+local function award(badges_key, notifications_key, count, first)
+    for i = first, #ARGV, 3 do
+        if tonumber(ARGV[i]) == count and not redis.call('LPOS', badges_key, ARGV[i + 1]) then
+            redis.call('RPUSH', badges_key, ARGV[i + 1])
+            redis.call('RPUSH', notifications_key, ARGV[i + 2])
+            return ARGV[i + 1]
+        end
+    end
+    return ''
+end
+"""
+
+# KEYS: badges, notifications. ARGV: count, thresholds...
+AWARD_BADGE_SCRIPT = AWARD_FUNCTION + """
+return award(KEYS[1], KEYS[2], tonumber(ARGV[1]), 2)
+"""
+
+# KEYS: profile, favorites, badges, notifications. ARGV: strain, thresholds...
+# Returns {status, favorite count, awarded badge}; status -1 = no user, 0 = already a favorite.
+ADD_FAVORITE_SCRIPT = AWARD_FUNCTION + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {-1, 0, ''}
+end
+if redis.call('LPOS', KEYS[2], ARGV[1]) then
+    return {0, redis.call('LLEN', KEYS[2]), ''}
+end
+local count = redis.call('RPUSH', KEYS[2], ARGV[1])
+return {1, count, award(KEYS[3], KEYS[4], count, 2)}
+"""
+
+# KEYS: profile, favorites. ARGV: strain. Returns -1 = no user, else the number removed.
+REMOVE_FAVORITE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+return redis.call('LREM', KEYS[2], 0, ARGV[1])
+"""
+
+# KEYS: profile, notifications. Returns nil if there is no user, else the drained list.
+POP_NOTIFICATIONS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local notifications = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+return notifications
+"""
+
+# KEYS: profile, stream. ARGV: maxlen, then the event's field/value pairs.
+# Returns nil if there is no user, else the new stream entry id.
+PUBLISH_EVENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+return redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[1], '*', unpack(ARGV, 2))
+"""
+
+def _threshold_args(thresholds: Dict[int, str]) -> List:
+    args = []
+    for count, badge_name in sorted(thresholds.items()):
+        args += [count, badge_name, badge_message(badge_name)]
+    return args
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+class ProfileScripts:
+    """The profile Lua scripts, registered on a client and run with EVALSHA (loaded on first use)."""
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self._award_badge = redis_client.register_script(AWARD_BADGE_SCRIPT)
+        self._add_favorite = redis_client.register_script(ADD_FAVORITE_SCRIPT)
+        self._remove_favorite = redis_client.register_script(REMOVE_FAVORITE_SCRIPT)
+        self._pop_notifications = redis_client.register_script(POP_NOTIFICATIONS_SCRIPT)
+        self._publish_event = redis_client.register_script(PUBLISH_EVENT_SCRIPT)
+
+    def award_count_badge(self, user_id: int, thresholds: Dict[int, str], count: int, client=None):
+        """Awards the badge tied to `count`; pass a pipeline as `client` to queue it in a transaction."""
+        if count not in thresholds:
+            return None
+        return self._award_badge(keys=[field_key("badges", user_id), field_key("notifications", user_id)],
+                                 args=[count] + _threshold_args(thresholds), client=client)
+
+    def add_favorite(self, user_id: int, strain_name: str, thresholds: Dict[int, str]) -> Optional[dict]:
+        """Adds a favorite and awards any count badge; None if the user does not exist."""
+        status, count, badge_name = self._add_favorite(
+            keys=[profile_key(user_id), field_key("favorites", user_id),
+                  field_key("badges", user_id), field_key("notifications", user_id)],
+            args=[strain_name] + _threshold_args(thresholds))
+        if status == -1:
+            return None
+        return {"added": status == 1, "count": count, "badge": _text(badge_name) or None}
+
+    def remove_favorite(self, user_id: int, strain_name: str) -> Optional[bool]:
+        """Removes a favorite; None if the user does not exist, else whether it was a favorite."""
+        removed = self._remove_favorite(keys=[profile_key(user_id), field_key("favorites", user_id)],
+                                        args=[strain_name])
+        return None if removed == -1 else removed > 0
+
+    def pop_notifications(self, user_id: int) -> Optional[List[str]]:
+        """Returns and clears the user's notifications; None if the user does not exist."""
+        notifications = self._pop_notifications(keys=[profile_key(user_id), field_key("notifications", user_id)])
+        return None if notifications is None else [_text(item) for item in notifications]
+
+    def publish_event(self, stream_key: str, maxlen: int, user_id: int, fields: Dict[str, str]) -> Optional[str]:
+        """Appends a stream event only if the user exists; returns its id, or None if there is no user."""
+        args = [maxlen]
+        for name, value in fields.items():
+            args += [name, value]
+        event_id = self._publish_event(keys=[profile_key(user_id), stream_key], args=args)
+        return _text(event_id)
+
+# ---------------------------
+# Profile Record Access
+# ---------------------------
+def load_profile(redis_client, codec: ProfileCodec, user_id: int) -> Optional[dict]:
+    """The merged profile (record plus list fields), or None if the user does not exist."""
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(profile_key(user_id))
+        for field in SPLIT_FIELDS:
+            pipe.lrange(field_key(field, user_id), 0, -1)
+        record, *lists = pipe.execute()
+    if record is None:
+        return None
+    profile = codec.decode(record)
+    if any(field in profile for field in SPLIT_FIELDS):
+        migrate_profile(redis_client, codec, user_id)
+        return load_profile(redis_client, codec, user_id)
+    for field, values in zip(SPLIT_FIELDS, lists):
+        profile[field] = [_text(value) for value in values]
+    return profile
+
+def save_new_profile(redis_client, codec: ProfileCodec, user_id: int, profile: dict):
+    """Writes the record of a new user; list fields in `profile` are ignored."""
+    record = {key: value for key, value in profile.items() if key not in SPLIT_FIELDS}
+    redis_client.set(profile_key(user_id), codec.encode(record))
+
+def update_profile(redis_client, codec: ProfileCodec, user_id: int, mutate: Callable[[dict], None]) -> Optional[dict]:
+    """
+    Applies `mutate` to the stored record with optimistic locking and returns the record.
+
+    The record is re-read and `mutate` re-run whenever another writer changed
+    it in between. List fields are not part of the record; use the scripts.
+    """
+    key = profile_key(user_id)
+    with redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                record = pipe.get(key)
+                if record is None:
+                    pipe.reset()
+                    return None
+                profile = codec.decode(record)
+                mutate(profile)
+                pipe.multi()
+                pipe.set(key, codec.encode({k: v for k, v in profile.items() if k not in SPLIT_FIELDS}))
+                pipe.execute()
+                return profile
+            except redis.WatchError:
+                continue
+
+def migrate_profile(redis_client, codec: ProfileCodec, user_id: int) -> bool:
+    """Moves inline list fields of an old record into their lists; True if anything moved."""
+    key = profile_key(user_id)
+    list_keys = [field_key(field, user_id) for field in SPLIT_FIELDS]
+    with redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                pipe.watch(key, *list_keys)
+                record = pipe.get(key)
+                profile = codec.decode(record) if record is not None else {}
+                inline = {field: profile.pop(field) for field in SPLIT_FIELDS if field in profile}
+                if not inline:
+                    pipe.reset()
+                    return False
+                current = {field: [_text(value) for value in pipe.lrange(list_key, 0, -1)]
+                           for field, list_key in zip(SPLIT_FIELDS, list_keys)}
+                pipe.multi()
+                for field, list_key in zip(SPLIT_FIELDS, list_keys):
+                    values = inline.get(field) or []
+                    if field != "notifications":
+                        values = [value for value in dict.fromkeys(values) if value not in current[field]]
+                    if values:
+                        # Inline values are older than anything already in the list.
+                        pipe.lpush(list_key, *reversed(values))
+                pipe.set(key, codec.encode(profile))
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                continue
+
+def migrate_all(redis_client, codec: ProfileCodec) -> int:
+    migrated = 0
+    for key in redis_client.scan_iter(match="user_profile_*", count=1000):
+        user_id = _text(key)[len("user_profile_"):]
+        migrated += migrate_profile(redis_client, codec, user_id)
+    logging.info(f"Moved inline favorites, badges and notifications out of {migrated} profile(s).")
+    return migrated
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile store maintenance.")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--profile-codec", default="orjson")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    redis_client = redis.Redis(host=args.host, port=args.port, db=args.db, decode_responses=False)
+    migrate_all(redis_client, ProfileCodec(args.profile_codec))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# ranking_eval.py
+#
+# Full-population offline ranking evaluation.
+#
+# Replaces the notebook's `evaluate_model` / `precision_recall_at_k_per_user`,
+# which built per-user dicts and intersected Python sets. Here:
+#   - ground truth (and items to exclude, e.g. training interactions) is CSR
+#     encoded: user u's items are indices[indptr[u]:indptr[u+1]], sorted;
+#   - top-K per user comes from chunked matrix scoring (or a FAISS inner-
+#     product search) with seen items masked out;
+#   - hits are found by binary search of packed (row, item) keys, and
+#     Precision@K, Recall@K, NDCG@K, coverage and intra-list diversity are
+#     reduced with array ops per chunk;
+#   - chunks can be spread over a process pool.
+#
+#   python ranking_eval.py --k 10 --workers 4
+
+import argparse
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_K = 10
+RELEVANCE_THRESHOLD = 3.0  # Ratings above this count as relevant, as in the notebook
+DEFAULT_CHUNK_SIZE = 4096
+
+# ---------------------------
+# CSR Encoding
+# ---------------------------
+class CSR(NamedTuple):
+    indptr: np.ndarray   # int64 [num_users + 1]
+    indices: np.ndarray  # int32 item codes, sorted within each user
+
+    @property
+    def num_users(self) -> int:
+        return len(self.indptr) - 1
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def rows(self, start: int, stop: int) -> 'CSR':
+        """Sub-matrix for users [start, stop), with indptr rebased to zero."""
+        indptr = self.indptr[start:stop + 1]
+        return CSR(indptr - indptr[0], self.indices[indptr[0]:indptr[-1]])
+
+def build_csr(user_codes: np.ndarray, item_codes: np.ndarray, num_users: int) -> CSR:
+    """Groups (user, item) pairs by user; duplicate pairs are collapsed."""
+    keys = np.unique(np.asarray(user_codes, dtype=np.int64) << 32 | np.asarray(item_codes, dtype=np.int64))
+    users = keys >> 32
+    indptr = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=num_users), out=indptr[1:])
+    return CSR(indptr, (keys & 0xFFFFFFFF).astype(np.int32))
+
+def relevance_csr(user_codes: np.ndarray, item_codes: np.ndarray, ratings: np.ndarray, num_users: int,
+                  threshold: float = RELEVANCE_THRESHOLD) -> CSR:
+    """Ground truth: the items each user rated above `threshold`."""
+    relevant = np.asarray(ratings) > threshold
+    return build_csr(np.asarray(user_codes)[relevant], np.asarray(item_codes)[relevant], num_users)
+
+def _contains(csr: CSR, items: np.ndarray) -> np.ndarray:
+    """
+    Membership test for a [rows, k] item matrix against the CSR's rows.
+
+    Packs (row, item) into sorted int64 keys on both sides so a single
+    searchsorted answers every lookup.
+    """
+    num_rows, k = items.shape
+    rows = np.repeat(np.arange(num_rows, dtype=np.int64), csr.lengths())
+    truth_keys = rows << 32 | csr.indices.astype(np.int64)
+    query_keys = (np.arange(num_rows, dtype=np.int64)[:, None] << 32 | items.astype(np.int64)).ravel()
+    if len(truth_keys) == 0:
+        return np.zeros((num_rows, k), dtype=bool)
+    position = np.minimum(np.searchsorted(truth_keys, query_keys), len(truth_keys) - 1)
+    return (truth_keys[position] == query_keys).reshape(num_rows, k)
+
+# ---------------------------
+# Top-K Retrieval
+# ---------------------------
+def top_k_items(user_vectors: np.ndarray, item_vectors: np.ndarray, k: int,
+                exclude: Optional[CSR] = None, item_bias: Optional[np.ndarray] = None,
+                use_faiss: bool = False) -> np.ndarray:
+    """
+    Top-k item codes per user by inner product, best first, for one chunk of users.
+
+    With `exclude`, each user's listed items (e.g. training interactions) are
+    never returned. The matrix path scores the whole chunk with one matmul
+    and masks excluded items in place; the FAISS path over-fetches by the
+    chunk's longest exclusion list and drops excluded hits afterwards.
+    """
+    user_vectors = np.ascontiguousarray(user_vectors, dtype=np.float32)
+    item_vectors = np.ascontiguousarray(item_vectors, dtype=np.float32)
+    num_users, num_items = len(user_vectors), len(item_vectors)
+    k = min(k, num_items)
+
+    if use_faiss:
+        if item_bias is not None:
+            # Append the bias as an extra dimension matched by a constant 1 on the query side.
+            user_vectors = np.hstack([user_vectors, np.ones((num_users, 1), dtype=np.float32)])
+            item_vectors = np.hstack([item_vectors, np.asarray(item_bias, dtype=np.float32)[:, None]])
+        index = faiss.IndexFlatIP(item_vectors.shape[1])
+        index.add(item_vectors)
+        fetch = min(num_items, k + (int(exclude.lengths().max()) if exclude is not None and num_users else 0))
+        _, candidates = index.search(user_vectors, fetch)
+        if exclude is None:
+            return candidates[:, :k].astype(np.int32)
+        seen = _contains(exclude, candidates) | (candidates < 0)
+        # Stable sort on the mask moves unseen candidates first, keeping score order.
+        order = np.argsort(seen, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(candidates, order, axis=1).astype(np.int32)
+
+    scores = user_vectors @ item_vectors.T
+    if item_bias is not None:
+        scores += np.asarray(item_bias, dtype=np.float32)[None, :]
+    if exclude is not None:
+        scores[np.repeat(np.arange(num_users), exclude.lengths()), exclude.indices] = -np.inf
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1).astype(np.int32)
+
+# ---------------------------
+# Metrics
+# ---------------------------
+def ranking_metric_sums(recommended: np.ndarray, truth: CSR,
+                        item_vectors_normalized: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-chunk metric sums for [users, k] recommendations against CSR truth.
+
+    Users without relevant items are skipped for precision/recall/NDCG,
+    matching the notebook. Returns sums (not means) so chunks can be
+    combined exactly; see `combine_metric_sums`.
+    """
+    num_rows, k = recommended.shape
+    hits = _contains(truth, recommended)
+    num_true = truth.lengths()
+    evaluated = num_true > 0
+
+    hit_counts = hits.sum(axis=1)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = hits @ discounts
+    ideal = np.concatenate(([0.0], np.cumsum(discounts)))[np.minimum(num_true, k)]
+
+    sums = {
+        "users": np.count_nonzero(evaluated),
+        "precision": (hit_counts[evaluated] / k).sum(),
+        "recall": (hit_counts[evaluated] / num_true[evaluated]).sum(),
+        "ndcg": (dcg[evaluated] / ideal[evaluated]).sum(),
+        "lists": num_rows,
+        "recommended": recommended.ravel(),
+    }
+    if item_vectors_normalized is not None and k > 1:
+        # Mean pairwise cosine of a list is (|sum e|^2 - k) / (k (k - 1)) for unit vectors.
+        summed = item_vectors_normalized[recommended].sum(axis=1)
+        mean_similarity = ((summed * summed).sum(axis=1) - k) / (k * (k - 1))
+        sums["diversity"] = np.clip(1.0 - mean_similarity, 0.0, 1.0).sum()
+    return sums
+
+def combine_metric_sums(parts, num_items: int) -> Dict[str, float]:
+    """Turns per-chunk sums into population means, item coverage and diversity."""
+    users = sum(part["users"] for part in parts)
+    lists = sum(part["lists"] for part in parts)
+    recommended_items = np.zeros(num_items, dtype=bool)
+    for part in parts:
+        recommended_items[part["recommended"]] = True
+    metrics = {
+        "users_evaluated": int(users),
+        "precision": float(sum(part["precision"] for part in parts) / max(users, 1)),
+        "recall": float(sum(part["recall"] for part in parts) / max(users, 1)),
+        "ndcg": float(sum(part["ndcg"] for part in parts) / max(users, 1)),
+        "coverage": float(recommended_items.mean()) if num_items else 0.0,
+    }
+    if parts and "diversity" in parts[0]:
+        metrics["diversity"] = float(sum(part["diversity"] for part in parts) / max(lists, 1))
+    return metrics
+
+# ---------------------------
+# Chunked / Parallel Driver
+# ---------------------------
+# Worker processes receive the arrays once through the pool initializer
+# (inherited on fork), not with every chunk.
+_worker_state: dict = {}
+
+def _init_worker(state: dict):
+    _worker_state.update(state)
+
+def _evaluate_chunk(bounds: Tuple[int, int]) -> Dict[str, np.ndarray]:
+    start, stop = bounds
+    state = _worker_state
+    users = state["users"][start:stop]
+    exclude = _select_rows(state["exclude"], users) if state["exclude"] is not None else None
+    if state["recommend"] is not None:
+        recommended = state["recommend"](users, exclude)
+    else:
+        recommended = top_k_items(state["user_vectors"][users], state["item_vectors"], state["k"], exclude,
+                                  state["item_bias"], state["use_faiss"])
+    return ranking_metric_sums(recommended, _select_rows(state["truth"], users), state["diversity_vectors"])
+
+def _select_rows(csr: CSR, users: np.ndarray) -> CSR:
+    """CSR restricted to `users` (in that order), without Python loops."""
+    if len(users) and np.all(np.diff(users) == 1):
+        return csr.rows(int(users[0]), int(users[-1]) + 1)
+    starts, lengths = csr.indptr[users], csr.lengths()[users]
+    indptr = np.zeros(len(users) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+    return CSR(indptr, csr.indices[positions])
+
+def evaluate_ranking(truth: CSR, item_vectors: np.ndarray, user_vectors: Optional[np.ndarray] = None,
+                     k: int = DEFAULT_K, exclude: Optional[CSR] = None, item_bias: Optional[np.ndarray] = None,
+                     users: Optional[np.ndarray] = None, use_faiss: bool = False,
+                     recommend: Optional[Callable[[np.ndarray, Optional[CSR]], np.ndarray]] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 0) -> Dict[str, float]:
+    """
+    Evaluates top-k recommendations for every user with ground truth.
+
+    By default users are ranked by `user_vectors @ item_vectors.T` (+ bias).
+    A custom `recommend(user_codes, exclude_csr) -> [n, k] items` can be
+    passed instead, e.g. to re-rank factor candidates with the hybrid model;
+    with workers > 1 it must be usable from a forked process.
+    `item_vectors` are also used for intra-list diversity.
+    """
+    if users is None:
+        users = np.flatnonzero(truth.lengths() > 0)
+    norms = np.linalg.norm(item_vectors, axis=1, keepdims=True)
+    state = {
+        "users": np.asarray(users, dtype=np.int64),
+        "truth": truth,
+        "exclude": exclude,
+        "user_vectors": user_vectors,
+        "item_vectors": item_vectors,
+        "item_bias": item_bias,
+        "diversity_vectors": (item_vectors / np.maximum(norms, 1e-12)).astype(np.float32),
+        "k": k,
+        "use_faiss": use_faiss,
+        "recommend": recommend,
+    }
+    bounds = [(start, min(start + chunk_size, len(users))) for start in range(0, len(users), chunk_size)]
+
+    start_time = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as pool:
+            parts = list(pool.map(_evaluate_chunk, bounds))
+    else:
+        _init_worker(state)
+        parts = [_evaluate_chunk(chunk) for chunk in bounds]
+        _worker_state.clear()
+
+    metrics = combine_metric_sums(parts, len(item_vectors))
+    metrics["k"] = k
+    metrics["seconds"] = round(time.perf_counter() - start_time, 2)
+    logger.info(f"Ranking evaluation @{k} over {metrics['users_evaluated']:,} users: "
+                f"P={metrics['precision']:.4f} R={metrics['recall']:.4f} NDCG={metrics['ndcg']:.4f} "
+                f"coverage={metrics['coverage']:.4f} ({metrics['seconds']}s)")
+    return metrics
+
+def _subtract(left: CSR, right: CSR) -> CSR:
+    """Pairs in `left` that are not in `right` (same user space)."""
+    rows = np.repeat(np.arange(left.num_users, dtype=np.int64), left.lengths())
+    right_rows = np.repeat(np.arange(right.num_users, dtype=np.int64), right.lengths())
+    keys = rows << 32 | left.indices.astype(np.int64)
+    keep = ~np.isin(keys, right_rows << 32 | right.indices.astype(np.int64), assume_unique=True)
+    return build_csr(rows[keep], left.indices[keep], left.num_users)
+
+# ---------------------------
+# Command Line
+# ---------------------------
+def main():
+    """Evaluates the saved ALS factors on the held-out test split written by als_training.py."""
+    from als_training import ALSConfig
+    from interaction_store import load_interaction_store, map_codes
+
+    parser = argparse.ArgumentParser(description="Full-population ranking evaluation of the ALS factors.")
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--faiss", action="store_true", help="Use a FAISS inner-product search for top-k")
+    parser.add_argument("--no-exclude-train", action="store_true", help="Allow already-rated items in top-k")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    with open(ALSConfig.USER_MAPPING_PATH, 'rb') as f:
+        user_mapping = pickle.load(f)
+    with open(ALSConfig.STRAIN_MAPPING_PATH, 'rb') as f:
+        strain_mapping = pickle.load(f)
+    user_vectors = np.load(ALSConfig.USER_EMB_PATH, mmap_mode='r')
+    item_vectors = np.load(ALSConfig.STRAIN_EMB_PATH)
+    item_bias = np.load(ALSConfig.STRAIN_BIAS_PATH) if os.path.exists(ALSConfig.STRAIN_BIAS_PATH) else None
+
+    test = load_interaction_store(ALSConfig.TEST_STORE_PATH)
+    truth = relevance_csr(map_codes(test.user_id, user_mapping), map_codes(test.strain_id, strain_mapping),
+                          test.rating, len(user_mapping))
+    exclude = None
+    if not args.no_exclude_train:
+        # The full store includes the test rows; drop them so test items stay rankable.
+        full = load_interaction_store(ALSConfig.INTERACTION_STORE_PATH)
+        seen = build_csr(map_codes(full.user_id, user_mapping), map_codes(full.strain_id, strain_mapping),
+                         len(user_mapping))
+        held_out = build_csr(map_codes(test.user_id, user_mapping), map_codes(test.strain_id, strain_mapping),
+                             len(user_mapping))
+        exclude = _subtract(seen, held_out)
+
+    metrics = evaluate_ranking(truth, item_vectors, user_vectors, k=args.k, exclude=exclude, item_bias=item_bias,
+                               use_faiss=args.faiss, chunk_size=args.chunk_size, workers=args.workers)
+    print(metrics)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# redis_shards.py
+#
+# Client-side sharding of user state across several Redis nodes.
+#
+# User-scoped keys (`user_<field>_<user_id>`, e.g. user_profile_42,
+# user_favorites_42) and keys carrying a `{tag}` hash tag are placed on a
+# consistent-hash ring keyed by the user id or tag. All keys of one user
+# therefore share a node, and multi-key scripts and WATCH/MULTI transactions
+# on them keep working. The hash tag means the same thing as in Redis
+# Cluster: `{42}:cart` lands beside user_profile_42. Adding a node moves only
+# about 1/N of the users.
+#
+# Everything else (email index, next_user_id, strain aggregates, trending,
+# caches) lives on one designated global node. That node may also be a shard.
+#
+# Per-shard structures that cover many users, such as each shard's slice of
+# the leaderboard, are read by scatter-gather: every shard is queried in
+# parallel and the partial results are merged.
+#
+#   REDIS_NODES=10.0.0.1:6379,10.0.0.2:6379,10.0.0.3:6379 REDIS_GLOBAL_NODE=10.0.0.1:6379
+#   python redis_shards.py serve --nodes 3      # local redis-server processes for testing
+#
+# Moving keys after the node list changes: shard_rebalance.py.
+
+import argparse
+import bisect
+import hashlib
+import heapq
+import re
+import shutil
+import socket
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import redis
+
+DEFAULT_VNODES = 160  # Ring points per node; more points, more even spread
+USER_KEY = re.compile(r"^user_[a-z_]+?_(\d+)$")
+HASH_TAG = re.compile(r"\{([^{}]+)\}")
+
+def parse_nodes(spec: str) -> List[str]:
+    """'host:port,host:port' -> ['host:port', ...]; a bare host gets port 6379."""
+    nodes = []
+    for node in spec.split(","):
+        node = node.strip()
+        if node:
+            nodes.append(node if ":" in node else f"{node}:6379")
+    if not nodes:
+        raise ValueError("At least one Redis node is required.")
+    return nodes
+
+def key_tag(key) -> Optional[str]:
+    """The routing tag of a key: its {hash tag}, else the user id of a user key; None for global keys."""
+    if isinstance(key, bytes):
+        key = key.decode()
+    tagged = HASH_TAG.search(key)
+    if tagged:
+        return tagged.group(1)
+    user_key = USER_KEY.match(key)
+    return user_key.group(1) if user_key else None
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+class HashRing:
+    """Consistent hashing of routing tags onto nodes, with virtual nodes."""
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = DEFAULT_VNODES):
+        if len(set(nodes)) != len(nodes):
+            raise ValueError(f"Duplicate nodes in {list(nodes)}.")
+        points = sorted((_ring_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self.nodes = list(nodes)
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, tag) -> str:
+        index = bisect.bisect(self._hashes, _ring_hash(str(tag))) % len(self._hashes)
+        return self._owners[index]
+
+class RedisShards:
+    """
+    One client per node plus the routing between them.
+
+    `client_factory(host, port, **client_kwargs)` builds the clients; it
+    defaults to redis.Redis.
+    """
+
+    def __init__(self, nodes: Sequence[str], global_node: Optional[str] = None, vnodes: int = DEFAULT_VNODES,
+                 client_factory: Optional[Callable] = None, **client_kwargs):
+        self.nodes = list(nodes)
+        self.global_node = global_node or self.nodes[0]
+        self.ring = HashRing(self.nodes, vnodes)
+        client_factory = client_factory or redis.Redis
+        self.clients = {}
+        for node in dict.fromkeys(self.nodes + [self.global_node]):
+            host, port = node.rsplit(":", 1)
+            self.clients[node] = client_factory(host=host, port=int(port), **client_kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.nodes), thread_name_prefix="redis-shards") \
+            if len(self.nodes) > 1 else None
+
+    @property
+    def global_client(self):
+        return self.clients[self.global_node]
+
+    def node_for_user(self, user_id) -> str:
+        return self.ring.node_for(user_id)
+
+    def for_user(self, user_id):
+        return self.clients[self.ring.node_for(user_id)]
+
+    def node_for_key(self, key) -> str:
+        tag = key_tag(key)
+        return self.ring.node_for(tag) if tag is not None else self.global_node
+
+    def for_key(self, key):
+        return self.clients[self.node_for_key(key)]
+
+    def per_shard(self, factory: Callable) -> Dict[str, object]:
+        """factory(client) for every shard node, e.g. script wrappers bound to each node."""
+        return {node: factory(self.clients[node]) for node in self.nodes}
+
+    def scatter(self, fn: Callable) -> Dict[str, object]:
+        """Runs fn(client) on every shard node in parallel; returns {node: result}."""
+        if self._executor is None:
+            return {node: fn(self.clients[node]) for node in self.nodes}
+        futures = {node: self._executor.submit(fn, self.clients[node]) for node in self.nodes}
+        return {node: future.result() for node, future in futures.items()}
+
+    def gather_top(self, key: str, count: int) -> List[Tuple[object, float]]:
+        """
+        The top `count` members of a sorted set partitioned across shards.
+
+        Exact as long as each member lives on one shard (user-keyed sets):
+        the global top k is always within the union of the per-shard top k.
+        Ties are ordered like ZREVRANGE, by member descending.
+        """
+        partials = self.scatter(lambda client: client.zrevrange(key, 0, count - 1, withscores=True))
+        return heapq.nlargest(count, (entry for partial in partials.values() for entry in partial),
+                              key=lambda entry: (entry[1], entry[0]))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
+
+# ---------------------------
+# Local Test Nodes
+# ---------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def start_local_nodes(count: int, ports: Optional[Sequence[int]] = None) -> Iterator[List[str]]:
+    """Runs `count` throwaway, non-persistent redis-server processes; yields their node names."""
+    redis_server = shutil.which("redis-server")
+    if redis_server is None:
+        raise RuntimeError("redis-server is required to start local nodes")
+    ports = list(ports) if ports else [_free_port() for _ in range(count)]
+    processes = [subprocess.Popen([redis_server, "--port", str(port), "--save", "", "--appendonly", "no"],
+                                  stdout=subprocess.DEVNULL) for port in ports]
+    nodes = [f"127.0.0.1:{port}" for port in ports]
+    try:
+        for node in nodes:
+            client = redis.Redis(host="127.0.0.1", port=int(node.rsplit(":", 1)[1]))
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+        yield nodes
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis sharding tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run local redis-server nodes until interrupted")
+    serve.add_argument("--nodes", type=int, default=3)
+    serve.add_argument("--ports", type=int, nargs="+")
+
+    locate = subparsers.add_parser("locate", help="Print the node owning each key or user id")
+    locate.add_argument("keys", nargs="+")
+    locate.add_argument("--redis-nodes", required=True, help="host:port,host:port,...")
+    locate.add_argument("--global-node")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        with start_local_nodes(len(args.ports) if args.ports else args.nodes, args.ports) as nodes:
+            print(f"REDIS_NODES={','.join(nodes)} REDIS_GLOBAL_NODE={nodes[0]}", flush=True)
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+    else:
+        nodes = parse_nodes(args.redis_nodes)
+        ring = HashRing(nodes)
+        global_node = args.global_node or nodes[0]
+        for key in args.keys:
+            tag = key if key.isdigit() else key_tag(key)
+            print(f"{key}\t{ring.node_for(tag) if tag is not None else global_node}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# scoring_executor.py
+#
+# Bounded executor for CPU-heavy recommendation scoring.
+#
+# Scoring runs on its own small thread pool instead of Starlette's shared
+# threadpool, so a burst of /recommend calls cannot starve cheap endpoints.
+# Admission is non-blocking: at most `max_workers + max_queue` requests are
+# in flight, and anything beyond that is shed immediately. Every admitted
+# request has a deadline; work that is still queued when the deadline
+# passes is dropped before it starts, and callers stop waiting at the deadline.
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+class ScoringRejected(Exception):
+    """Raised when a request is shed; `reason` is "saturated" or "deadline"."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class ScoringExecutor:
+    def __init__(self, max_workers: int = 4, max_queue: int = 16, deadline_seconds: float = 2.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scoring")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._counters = {"admitted": 0, "completed": 0, "failed": 0, "shed_saturated": 0,
+                          "shed_deadline": 0, "expired_in_queue": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _try_admit(self) -> bool:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._counters["shed_saturated"] += 1
+                return False
+            self._in_flight += 1
+            self._counters["admitted"] += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _run_job(self, deadline: float, fn: Callable, args: tuple):
+        # Work whose caller has already given up is skipped, not computed.
+        if time.monotonic() >= deadline:
+            self._count("expired_in_queue")
+            self._release()
+            raise ScoringRejected("deadline")
+        with self._lock:
+            self._running += 1
+        try:
+            result = fn(*args)
+            self._count("completed")
+            return result
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._release()
+
+    async def run(self, fn: Callable, *args):
+        """Runs `fn(*args)` on the scoring pool, or raises ScoringRejected."""
+        if not self._try_admit():
+            raise ScoringRejected("saturated")
+        deadline = time.monotonic() + self.deadline_seconds
+        try:
+            future = self._pool.submit(self._run_job, deadline, fn, args)
+        except RuntimeError:
+            self._release()
+            raise
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.deadline_seconds)
+        except asyncio.TimeoutError:
+            # A job that already started finishes in the background and releases its slot then.
+            if future.cancel():
+                self._release()
+            self._count("shed_deadline")
+            raise ScoringRejected("deadline")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.max_queue,
+                "deadline_seconds": self.deadline_seconds,
+                "running": self._running,
+                "queue_depth": max(self._in_flight - self._running, 0),
+                **self._counters,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
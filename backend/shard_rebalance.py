@@ -0,0 +1,122 @@
+# shard_rebalance.py
+#
+# Moves user state to the nodes that own it after the shard list changes.
+#
+# Only users whose ring position changed owner are moved, about 1/N of them
+# when a node is added. Every key of a moved user goes with it: the profile
+# record, favorites, badges, notifications and applied-event set. The
+# user's entry in the per-shard leaderboard moves too. Keys are
+# copied with DUMP/RESTORE, which keeps the value type and TTL, and are
+# deleted from the old node only after the copy succeeds. A run that is
+# interrupted can simply be started again.
+#
+# Run it with API writes paused and the event streams drained. A user's
+# unprocessed events stay on the old node's stream, so the tool refuses to
+# start while any shard's stream has undelivered or pending events unless
+# --force is given. Then point REDIS_NODES at the new list and restart the
+# API and the workers.
+#
+#   python shard_rebalance.py --from-nodes a:6379,b:6379 --to-nodes a:6379,b:6379,c:6379 --dry-run
+
+import argparse
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List
+
+from event_stream import stream_lag
+from redis_shards import RedisShards, key_tag, parse_nodes
+
+logger = logging.getLogger(__name__)
+
+USER_MEMBER_ZSETS = ("leaderboard",)  # Per-shard sorted sets whose members are user ids
+SCAN_COUNT = 1000
+
+def undrained_streams(shards: RedisShards) -> Dict[str, dict]:
+    """Shards whose event stream still has events that no worker has finished."""
+    lags = shards.scatter(stream_lag)
+    return {node: lag for node, lag in lags.items() if lag["pending"] or lag["lag"] or lag["lag_seconds"] != 0.0}
+
+def plan_moves(old: RedisShards, new: RedisShards) -> Dict[tuple, Dict[str, List[bytes]]]:
+    """{(source, target): {tag: [keys]}} for every routed key whose owner changes."""
+    moves = defaultdict(lambda: defaultdict(list))
+    for source in old.nodes:
+        for key in old.clients[source].scan_iter(count=SCAN_COUNT):
+            tag = key_tag(key)
+            if tag is None:
+                continue
+            target = new.ring.node_for(tag)
+            if target != source:
+                moves[(source, target)][tag].append(key)
+    return moves
+
+def move_tags(source_client, target_client, tags: Dict[str, List[bytes]]) -> int:
+    """Copies the keys of `tags` to the target, then deletes them from the source; returns keys moved."""
+    keys = [key for tag_keys in tags.values() for key in tag_keys]
+    with source_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.dump(key)
+            pipe.pttl(key)
+        for zset_key in USER_MEMBER_ZSETS:
+            pipe.zmscore(zset_key, list(tags))
+        dumped = pipe.execute()
+    member_scores = dumped[2 * len(keys):]
+
+    moved = []
+    with target_client.pipeline(transaction=False) as pipe:
+        for index, key in enumerate(keys):
+            payload, ttl = dumped[2 * index], dumped[2 * index + 1]
+            if payload is None:  # Expired or deleted since the scan
+                continue
+            pipe.restore(key, max(ttl, 0), payload, replace=True)
+            moved.append(key)
+        for zset_key, scores in zip(USER_MEMBER_ZSETS, member_scores):
+            members = {tag: score for tag, score in zip(tags, scores) if score is not None}
+            if members:
+                pipe.zadd(zset_key, members)
+        pipe.execute()
+
+    with source_client.pipeline(transaction=False) as pipe:
+        if moved:
+            pipe.delete(*moved)
+        for zset_key in USER_MEMBER_ZSETS:
+            pipe.zrem(zset_key, *tags)
+        pipe.execute()
+    return len(moved)
+
+def rebalance(old: RedisShards, new: RedisShards, dry_run: bool = False, batch_size: int = 500) -> dict:
+    """Moves every routed key to its owner under `new`; returns per-route counts of tags and keys."""
+    report = {}
+    for (source, target), tags in plan_moves(old, new).items():
+        route = f"{source} -> {target}"
+        report[route] = {"tags": len(tags), "keys": sum(len(keys) for keys in tags.values())}
+        if dry_run:
+            continue
+        tag_items = list(tags.items())
+        for start in range(0, len(tag_items), batch_size):
+            move_tags(old.clients[source], new.clients[target], dict(tag_items[start:start + batch_size]))
+        logger.info(f"Moved {report[route]['tags']} user(s), {report[route]['keys']} key(s): {route}.")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Move user state after the Redis shard list changes.")
+    parser.add_argument("--from-nodes", required=True, help="Current REDIS_NODES, host:port,host:port,...")
+    parser.add_argument("--to-nodes", required=True, help="New REDIS_NODES")
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=500, help="Users moved per round trip")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would move")
+    parser.add_argument("--force", action="store_true", help="Move even if event streams are not drained")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    old = RedisShards(parse_nodes(args.from_nodes), db=args.db, decode_responses=False)
+    new = RedisShards(parse_nodes(args.to_nodes), db=args.db, decode_responses=False)
+    undrained = undrained_streams(old)
+    if undrained and not args.force and not args.dry_run:
+        raise SystemExit(f"Event streams are not drained; stop writes and let the workers finish first: "
+                         f"{json.dumps(undrained, default=str)}")
+    print(json.dumps(rebalance(old, new, dry_run=args.dry_run, batch_size=args.batch_size), indent=2))
+
+if __name__ == "__main__":
+    main()
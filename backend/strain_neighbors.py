@@ -0,0 +1,137 @@
+# strain_neighbors.py
+#
+# Offline top-M item-item neighbor lists over the strain embeddings.
+#
+# Every strain's M most similar strains (cosine similarity) are found with a
+# batched FAISS inner-product search over L2-normalized embeddings, chunk by
+# chunk and optionally on several threads (FAISS releases the GIL during a
+# search). The result is stored as two dense matrices indexed by strain_id:
+#
+#   ids.npy     int32   [num_strains, M]  neighbor strain_ids, best first (-1 = none)
+#   scores.npy  float16 [num_strains, M]  cosine similarities
+#
+# so serving a "similar strains" list is a single row read, and the union of
+# the rows of a user's liked strains is a cheap candidate set for ranking.
+#
+#   python strain_neighbors.py data/strain_embeddings.npy data/strain_neighbors --neighbors 50 --workers 4
+
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEIGHBORS = 50
+DEFAULT_CHUNK_SIZE = 4096
+IDS_FILE = 'ids.npy'
+SCORES_FILE = 'scores.npy'
+META_FILE = 'meta.json'
+
+# ---------------------------
+# Offline Build
+# ---------------------------
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _drop_self(queries: np.ndarray, ids: np.ndarray, scores: np.ndarray, m: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Removes each query from its own result row (searched with one extra slot) and keeps M columns."""
+    is_self = ids == queries[:, None]
+    # Rows where ties pushed the query itself out of the results drop their last entry instead.
+    is_self[~is_self.any(axis=1), -1] = True
+    order = np.argsort(is_self, axis=1, kind='stable')[:, :m]
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+def build_neighbors(strain_embeddings: np.ndarray, m: int = DEFAULT_NEIGHBORS,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-`m` cosine neighbors of every strain as (int32 ids, float16 scores)."""
+    vectors = normalize_rows(strain_embeddings)
+    num_strains = len(vectors)
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+
+    ids = np.full((num_strains, m), -1, dtype=np.int32)
+    scores = np.zeros((num_strains, m), dtype=np.float16)
+
+    def search_chunk(start: int):
+        stop = min(start + chunk_size, num_strains)
+        chunk_scores, chunk_ids = index.search(vectors[start:stop], min(m + 1, num_strains))
+        if chunk_ids.shape[1] < m + 1:
+            pad = m + 1 - chunk_ids.shape[1]
+            chunk_ids = np.pad(chunk_ids, ((0, 0), (0, pad)), constant_values=-1)
+            chunk_scores = np.pad(chunk_scores, ((0, 0), (0, pad)))
+        chunk_ids, chunk_scores = _drop_self(np.arange(start, stop), chunk_ids, chunk_scores, m)
+        ids[start:stop] = chunk_ids
+        scores[start:stop] = np.where(chunk_ids >= 0, chunk_scores, 0)
+
+    starts = range(0, num_strains, chunk_size)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(search_chunk, starts))
+    else:
+        for start in starts:
+            search_chunk(start)
+    return ids, scores
+
+def save_neighbors(output_dir: str, ids: np.ndarray, scores: np.ndarray, **meta):
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, IDS_FILE), ids)
+    np.save(os.path.join(output_dir, SCORES_FILE), scores)
+    with open(os.path.join(output_dir, META_FILE), 'w') as f:
+        json.dump({'strains': int(ids.shape[0]), 'neighbors': int(ids.shape[1]), **meta}, f, indent=2)
+
+# ---------------------------
+# Serving
+# ---------------------------
+class StrainNeighbors(NamedTuple):
+    ids: np.ndarray
+    scores: np.ndarray
+
+    def similar(self, strain_id: int, count: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """The stored neighbors of one strain, best first."""
+        if not 0 <= strain_id < len(self.ids):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float16)
+        ids, scores = self.ids[strain_id, :count], self.scores[strain_id, :count]
+        valid = ids >= 0
+        return ids[valid], scores[valid]
+
+    def candidates(self, strain_ids: np.ndarray) -> np.ndarray:
+        """Union of the neighbor lists of `strain_ids`, excluding those strains themselves."""
+        strain_ids = np.asarray(strain_ids, dtype=np.int64)
+        strain_ids = strain_ids[(strain_ids >= 0) & (strain_ids < len(self.ids))]
+        neighbors = np.unique(self.ids[strain_ids])
+        return np.setdiff1d(neighbors[neighbors >= 0], strain_ids)
+
+def load_neighbors(neighbors_dir: str) -> StrainNeighbors:
+    """Memory-maps stored neighbor lists."""
+    return StrainNeighbors(np.load(os.path.join(neighbors_dir, IDS_FILE), mmap_mode='r'),
+                           np.load(os.path.join(neighbors_dir, SCORES_FILE), mmap_mode='r'))
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-M similar strains from strain embeddings.")
+    parser.add_argument("embeddings", help="Strain embeddings .npy, one row per strain_id")
+    parser.add_argument("output_dir")
+    parser.add_argument("--neighbors", type=int, default=DEFAULT_NEIGHBORS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    strain_embeddings = np.load(args.embeddings, mmap_mode='r')
+    start = time.perf_counter()
+    ids, scores = build_neighbors(strain_embeddings, args.neighbors, args.chunk_size, args.workers)
+    seconds = round(time.perf_counter() - start, 2)
+    save_neighbors(args.output_dir, ids, scores, metric='cosine', seconds=seconds,
+                   embeddings=os.path.abspath(args.embeddings))
+    logger.info(f"Built {args.neighbors} neighbors for {len(ids):,} strains in {seconds}s "
+                f"({(ids.nbytes + scores.nbytes) / 2**20:.1f} MiB).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# strain_search.py
+
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from rapidfuzz import process as fuzzy_process
+
+# ---------------------------
+# Prefix / Typeahead Search Index
+# ---------------------------
+class StrainSearchIndex:
+    """
+    In-memory typeahead index over normalized strain names.
+
+    Names are kept in a sorted list so a prefix maps to one contiguous slice
+    found with two binary searches. Popularity scores from the
+    `strain_popularity` sorted set are cached in an array aligned with that
+    list. `start_refresher` reloads it every `popularity_ttl` seconds on a
+    background thread and swaps the new array in with a single assignment,
+    so a lookup only ever reads the current array and never touches Redis.
+    """
+
+    def __init__(self, strain_names, redis_client=None, popularity_ttl: float = 30.0,
+                 fuzzy_threshold: int = 70):
+        self.names: List[str] = sorted(set(strain_names))
+        self.positions: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.popularity = np.zeros(len(self.names), dtype=np.float64)
+        self.redis_client = redis_client
+        self.popularity_ttl = popularity_ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._popularity_loaded_at = 0.0
+        self._stop_refresher = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        logging.info(f"Strain search index built with {len(self.names)} names.")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def refresh_popularity(self, force: bool = False):
+        """Reloads the popularity array from Redis when the cached copy is stale."""
+        if self.redis_client is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._popularity_loaded_at < self.popularity_ttl:
+            return
+        try:
+            scores = self.redis_client.zrange('strain_popularity', 0, -1, withscores=True)
+        except Exception as e:
+            logging.error(f"Error refreshing strain popularity for search index: {e}")
+            self._popularity_loaded_at = now
+            return
+
+        popularity = np.zeros(len(self.names), dtype=np.float64)
+        for strain_name, score in scores:
+            position = self.positions.get(strain_name)
+            if position is not None:
+                popularity[position] = score
+        self.popularity = popularity
+        self._popularity_loaded_at = now
+
+    def start_refresher(self):
+        """Loads popularity now, then keeps it fresh from a daemon thread until `stop_refresher`."""
+        if self.redis_client is None or self._refresher is not None:
+            return
+        self.refresh_popularity(force=True)
+        self._stop_refresher.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="strain-search-popularity", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        if self._refresher is not None:
+            self._stop_refresher.set()
+            self._refresher.join(timeout=5)
+            self._refresher = None
+
+    def _refresh_loop(self):
+        while not self._stop_refresher.wait(self.popularity_ttl):
+            self.refresh_popularity(force=True)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Returns the [start, end) slice of sorted names that begin with `prefix`."""
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + '\uffff', lo=start)
+        return start, end
+
+    def _ranked_slice(self, start: int, end: int, offset: int, limit: int) -> List[int]:
+        """Positions in [start, end) ordered by popularity desc, then name, for one page."""
+        wanted = offset + limit
+        scores = self.popularity[start:end]
+        if wanted < len(scores):
+            # Only the top `wanted` entries need a full sort.
+            candidates = np.argpartition(-scores, wanted - 1)[:wanted]
+        else:
+            candidates = np.arange(len(scores))
+        # lexsort keys are last-major: popularity desc first, position (= name order) as tiebreak.
+        order = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return (order[offset:wanted] + start).tolist()
+
+    def search(self, prefix: str = "", limit: int = 20, cursor: Optional[str] = None) -> dict:
+        """
+        Looks up strains for a typeahead box or pages through the full list.
+
+        An empty prefix pages through every strain alphabetically. A non-empty
+        prefix returns matches ranked by popularity, falling back to fuzzy
+        matching when nothing starts with the prefix. `cursor` is the opaque
+        value returned as `next_cursor` by the previous page.
+        """
+        offset = decode_cursor(cursor)
+
+        if not prefix:
+            page = self.names[offset:offset + limit]
+            next_offset = offset + len(page)
+            return {
+                "strains": page,
+                "next_cursor": encode_cursor(next_offset) if next_offset < len(self.names) else None,
+                "fuzzy": False,
+            }
+
+        start, end = self.prefix_range(prefix)
+        if end > start:
+            positions = self._ranked_slice(start, end, offset, limit)
+            next_offset = offset + len(positions)
+            return {
+                "strains": [self.names[p] for p in positions],
+                "next_cursor": encode_cursor(next_offset) if start + next_offset < end else None,
+                "fuzzy": False,
+            }
+
+        return {"strains": self.fuzzy_search(prefix, limit), "next_cursor": None, "fuzzy": True}
+
+    def fuzzy_search(self, query: str, limit: int) -> List[str]:
+        """Typo-tolerant fallback used when no name starts with the query."""
+        matches = fuzzy_process.extract(query, self.names, limit=limit, score_cutoff=self.fuzzy_threshold)
+        matches.sort(key=lambda match: (-match[1], -self.popularity[match[2]], match[2]))
+        logging.info(f"Fuzzy search fallback for '{query}' returned {len(matches)} match(es).")
+        return [match[0] for match in matches]
+
+# ---------------------------
+# Cursor Helpers
+# ---------------------------
+def encode_cursor(offset: int) -> str:
+    """Encodes a result offset as an opaque cursor string."""
+    return format(offset, 'x')
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Decodes a cursor produced by `encode_cursor`; a missing cursor means the first page."""
+    if not cursor:
+        return 0
+    try:
+        offset = int(cursor, 16)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if offset < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return offset
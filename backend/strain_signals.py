@@ -0,0 +1,143 @@
+# strain_signals.py
+#
+# Sparse strain attribute matrices and multi-signal scoring.
+#
+# The catalog's one-hot columns (Effects_*, Terpene Profile_*, May Relieve_*,
+# Cannabinoid Profile_*) are turned into CSR matrices once per catalog load.
+# A user's survey answers become small indicator vectors over the same
+# vocabularies, so filtering and every score component are sparse
+# matrix-vector products over the candidate rows:
+#
+#   score = w_sim * cosine(user, strain)
+#         + w_terpene * (desired terpenes the strain has / desired terpenes)
+#         + w_relief  * (conditions the strain may relieve / requested conditions)
+#         + w_synergy * (synergy partners of the desired terpenes present / partners)
+#
+# Synergy partners come from `synergistic_terpenes` and
+# `synergistic_cannabinoids` in terpene_info.json. Terpenes the user
+# already asked for are not counted again as partners.
+
+import json
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+EFFECT_PREFIX = 'Effects_'
+TERPENE_PREFIX = 'Terpene Profile_'
+RELIEF_PREFIX = 'May Relieve_'
+CANNABINOID_PREFIX = 'Cannabinoid Profile_'
+
+DEFAULT_WEIGHTS = {"similarity": 1.0, "terpene": 0.3, "relief": 0.3, "synergy": 0.1}
+
+def _normalize(name: str) -> str:
+    return str(name).lower().strip()
+
+def _one_hot_block(strain_data: pd.DataFrame, prefix: str):
+    """(vocabulary, CSR strains x vocabulary) for the one-hot columns with `prefix`."""
+    columns = [col for col in strain_data.columns if col.startswith(prefix)]
+    vocabulary = [_normalize(col[len(prefix):]) for col in columns]
+    if not columns:
+        return vocabulary, sparse.csr_matrix((len(strain_data), 0), dtype=np.float32)
+    matrix = sparse.csr_matrix((strain_data[columns].to_numpy() == 1).astype(np.float32))
+    return vocabulary, matrix
+
+class StrainSignals:
+    """Sparse strain x {effect, terpene, condition, cannabinoid} matrices plus terpene synergy."""
+
+    def __init__(self, strain_data: pd.DataFrame, terpene_info: Optional[Dict] = None):
+        self.effects, self.effect_matrix = _one_hot_block(strain_data, EFFECT_PREFIX)
+        self.terpenes, self.terpene_matrix = _one_hot_block(strain_data, TERPENE_PREFIX)
+        self.conditions, self.relief_matrix = _one_hot_block(strain_data, RELIEF_PREFIX)
+        self.cannabinoids, self.cannabinoid_matrix = _one_hot_block(strain_data, CANNABINOID_PREFIX)
+        self.terpene_synergy, self.cannabinoid_synergy = self._synergy_matrices(terpene_info or {})
+        # Dense strain_id -> catalog row lookup (-1 for ids not in the catalog).
+        strain_ids = strain_data['strain_id'].to_numpy(dtype=np.int64) if 'strain_id' in strain_data else np.arange(0)
+        self.strain_rows = np.full(strain_ids.max() + 1 if len(strain_ids) else 0, -1, dtype=np.int64)
+        self.strain_rows[strain_ids] = np.arange(len(strain_ids))
+
+    def _synergy_matrices(self, terpene_info: Dict):
+        """
+        Terpene x terpene (symmetric) and terpene x cannabinoid synergy matrices.
+
+        Only names present in the catalog vocabularies are kept.
+        """
+        terpene_index = {name: i for i, name in enumerate(self.terpenes)}
+        cannabinoid_index = {name: i for i, name in enumerate(self.cannabinoids)}
+        terpene_pairs, cannabinoid_pairs = set(), set()
+        for terpene, details in terpene_info.items():
+            row = terpene_index.get(_normalize(terpene))
+            if row is None:
+                continue
+            for partner in details.get("synergistic_terpenes", []):
+                col = terpene_index.get(_normalize(partner))
+                if col is not None and col != row:
+                    terpene_pairs.update({(row, col), (col, row)})
+            for partner in details.get("synergistic_cannabinoids", []):
+                col = cannabinoid_index.get(_normalize(partner))
+                if col is not None:
+                    cannabinoid_pairs.add((row, col))
+        return (_pairs_to_csr(terpene_pairs, (len(self.terpenes), len(self.terpenes))),
+                _pairs_to_csr(cannabinoid_pairs, (len(self.terpenes), len(self.cannabinoids))))
+
+    @classmethod
+    def from_files(cls, strain_data: pd.DataFrame, terpene_info_path: str) -> 'StrainSignals':
+        with open(terpene_info_path, 'r', encoding='utf-8') as f:
+            return cls(strain_data, json.load(f))
+
+    @staticmethod
+    def indicator(vocabulary: List[str], values: Iterable[str]) -> np.ndarray:
+        wanted = {_normalize(value) for value in values or []}
+        return np.fromiter((name in wanted for name in vocabulary), dtype=np.float32, count=len(vocabulary))
+
+    def effect_candidates(self, desired_effects: Iterable[str]) -> np.ndarray:
+        """Row indices of strains with at least one desired effect."""
+        return np.flatnonzero(self.effect_matrix @ self.indicator(self.effects, desired_effects))
+
+    def rows_for_strains(self, strain_ids: np.ndarray) -> np.ndarray:
+        """Catalog rows of `strain_ids`, sorted; ids missing from the catalog are dropped."""
+        strain_ids = np.asarray(strain_ids, dtype=np.int64)
+        strain_ids = strain_ids[(strain_ids >= 0) & (strain_ids < len(self.strain_rows))]
+        rows = self.strain_rows[strain_ids]
+        return np.unique(rows[rows >= 0])
+
+    def score(self, rows: np.ndarray, similarity: np.ndarray, preferences: dict,
+              weights: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+        """
+        Combined score and its components for the candidate `rows`.
+
+        `similarity` is the embedding cosine similarity of each candidate,
+        aligned with `rows`. Every component is in [0, 1] except similarity.
+        """
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        desired_terpenes = self.indicator(self.terpenes, preferences.get("terpenes"))
+        requested_relief = self.indicator(self.conditions, preferences.get("may_relieve"))
+
+        terpene_match = _match_fraction(self.terpene_matrix[rows], desired_terpenes)
+        relief_match = _match_fraction(self.relief_matrix[rows], requested_relief)
+
+        # Partners of the desired terpenes, excluding terpenes already desired.
+        terpene_partners = ((self.terpene_synergy @ desired_terpenes) > 0) & (desired_terpenes == 0)
+        cannabinoid_partners = (self.cannabinoid_synergy.T @ desired_terpenes) > 0
+        partner_count = terpene_partners.sum() + cannabinoid_partners.sum()
+        if partner_count:
+            synergy = (self.terpene_matrix[rows] @ terpene_partners.astype(np.float32)
+                       + self.cannabinoid_matrix[rows] @ cannabinoid_partners.astype(np.float32)) / partner_count
+        else:
+            synergy = np.zeros(len(rows), dtype=np.float32)
+
+        total = (weights["similarity"] * similarity + weights["terpene"] * terpene_match
+                 + weights["relief"] * relief_match + weights["synergy"] * synergy)
+        return {"score": total, "terpene_match": terpene_match, "relief_match": relief_match, "synergy": synergy}
+
+def _match_fraction(matrix: sparse.csr_matrix, wanted: np.ndarray) -> np.ndarray:
+    count = wanted.sum()
+    if not count:
+        return np.zeros(matrix.shape[0], dtype=np.float32)
+    return np.asarray(matrix @ wanted, dtype=np.float32) / count
+
+def _pairs_to_csr(pairs, shape) -> sparse.csr_matrix:
+    if not pairs:
+        return sparse.csr_matrix(shape, dtype=np.float32)
+    rows, cols = zip(*sorted(pairs))
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
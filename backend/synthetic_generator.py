@@ -0,0 +1,233 @@
+# synthetic_generator.py
+#
+# Streaming, sharded generator for synthetic (user_id, strain_id, rating)
+# interactions, replacing the notebook's per-review generator for scale
+# testing.
+#
+# Users are split into fixed-size shards. Each shard draws its users' rating
+# counts, strains and ratings as whole NumPy blocks from its own seed,
+# derived from (--seed, shard index), and is written as one Parquet file.
+# Output is therefore identical whatever the worker count, and an
+# interrupted run can be resumed shard by shard; --resume refuses to mix
+# in shards from a run with different parameters. Like the notebook, strains
+# are drawn uniformly and, given --review-templates, each rating is that of
+# a randomly drawn template. Review text is not generated: training only
+# consumes the three interaction columns, and the template row is kept so
+# text can be joined back on later.
+#
+#   python synthetic_generator.py out/interactions_20m --total-ratings 20000000 --workers 8
+#   python interaction_store.py out/interactions_20m data/interactions
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+MIN_RATINGS_PER_USER = 50
+MAX_RATINGS_PER_USER = 300
+DEFAULT_TOTAL_RATINGS = 20_000_000
+DEFAULT_NUM_STRAINS = 34_971
+DEFAULT_SHARD_USERS = 10_000
+MANIFEST_FILE = '_manifest.json'
+
+# 1-5 rating mix used when no review templates are given (skewed positive,
+# as user reviews tend to be).
+DEFAULT_RATING_PROBABILITIES = np.array([0.08, 0.12, 0.20, 0.30, 0.30])
+
+# ---------------------------
+# Inputs
+# ---------------------------
+def load_strain_ids(strain_data_path: Optional[str], num_strains: int) -> np.ndarray:
+    """Strain ids from the strain CSV (1-based row ids if it has none), or 1..num_strains."""
+    if not strain_data_path:
+        return np.arange(1, num_strains + 1, dtype=np.int32)
+    strain_data = pd.read_csv(strain_data_path)
+    if 'strain_id' not in strain_data.columns:
+        return np.arange(1, len(strain_data) + 1, dtype=np.int32)
+    return np.unique(strain_data['strain_id'].to_numpy(dtype=np.int32))
+
+def load_template_ratings(reviews_path: Optional[str]) -> Optional[np.ndarray]:
+    """The rating of each review template row, or None to use the default mix."""
+    if not reviews_path:
+        return None
+    return pd.read_csv(reviews_path, usecols=['rating'])['rating'].to_numpy(dtype=np.float32)
+
+# ---------------------------
+# Shard Generation
+# ---------------------------
+def shard_seed(seed: int, shard_index: int) -> np.random.SeedSequence:
+    return np.random.SeedSequence([seed, shard_index])
+
+def generate_shard(shard_index: int, first_user_id: int, num_users: int, strain_ids: np.ndarray,
+                   template_ratings: Optional[np.ndarray], seed: int,
+                   min_ratings: int = MIN_RATINGS_PER_USER,
+                   max_ratings: int = MAX_RATINGS_PER_USER) -> Dict[str, np.ndarray]:
+    """Generates all interactions of one user shard as NumPy columns."""
+    rng = np.random.default_rng(shard_seed(seed, shard_index))
+    ratings_per_user = rng.integers(min_ratings, max_ratings + 1, num_users)
+    user_ids = np.repeat(np.arange(first_user_id, first_user_id + num_users, dtype=np.int32), ratings_per_user)
+    num_rows = len(user_ids)
+
+    columns = {
+        'user_id': user_ids,
+        'strain_id': strain_ids[rng.integers(0, len(strain_ids), num_rows)],
+    }
+    if template_ratings is not None:
+        template_rows = rng.integers(0, len(template_ratings), num_rows).astype(np.int32)
+        columns['rating'] = template_ratings[template_rows]
+        columns['review_template'] = template_rows
+    else:
+        columns['rating'] = (rng.choice(5, num_rows, p=DEFAULT_RATING_PROBABILITIES) + 1).astype(np.float32)
+    return columns
+
+def _write_shard(task: dict) -> dict:
+    """Generates and writes one shard; runs in a worker process."""
+    path = task['path']
+    if task['resume'] and os.path.exists(path):
+        return {'shard': task['shard_index'], 'rows': pq.ParquetFile(path).metadata.num_rows, 'skipped': True}
+
+    columns = generate_shard(task['shard_index'], task['first_user_id'], task['num_users'], task['strain_ids'],
+                             task['template_ratings'], task['seed'], task['min_ratings'], task['max_ratings'])
+    table = pa.table(columns)
+    # Write to a hidden temporary name first so a killed run never leaves a
+    # partial shard behind (Parquet readers skip dot-files).
+    tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    pq.write_table(table, tmp_path, compression=task['compression'])
+    os.replace(tmp_path, path)
+    return {'shard': task['shard_index'], 'rows': table.num_rows, 'skipped': False}
+
+def _inputs_digest(strain_ids: np.ndarray, template_ratings: Optional[np.ndarray]) -> str:
+    digest = hashlib.sha1(np.ascontiguousarray(strain_ids).tobytes())
+    if template_ratings is not None:
+        digest.update(np.ascontiguousarray(template_ratings).tobytes())
+    return digest.hexdigest()
+
+def check_resume(output_dir: str, params: dict):
+    """Raises ValueError unless shards already in `output_dir` were generated with `params`."""
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        if any(name.startswith('part-') for name in os.listdir(output_dir)):
+            raise ValueError(f"{output_dir} has shards but no {MANIFEST_FILE}; cannot verify them for --resume.")
+        return
+    with open(manifest_path) as f:
+        stored = json.load(f)
+    mismatched = {key: (stored.get(key), value) for key, value in params.items() if stored.get(key) != value}
+    if mismatched:
+        details = ", ".join(f"{key}: {old!r} -> {new!r}" for key, (old, new) in mismatched.items())
+        raise ValueError(f"Cannot resume {output_dir}: existing shards were generated with different "
+                         f"parameters ({details}). Use a new directory or drop --resume.")
+
+def generate_dataset(output_dir: str, num_users: int, strain_ids: np.ndarray,
+                     template_ratings: Optional[np.ndarray] = None, seed: int = 42,
+                     shard_users: int = DEFAULT_SHARD_USERS, workers: int = 1,
+                     min_ratings: int = MIN_RATINGS_PER_USER, max_ratings: int = MAX_RATINGS_PER_USER,
+                     compression: str = 'zstd', resume: bool = False) -> dict:
+    """Writes `num_users` users' interactions as Parquet shards and returns the manifest."""
+    if pq is None:
+        raise RuntimeError("pyarrow is required to write Parquet shards (pip install pyarrow).")
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    # Everything that decides shard contents; stored before any shard is written
+    # so an interrupted run can be checked on --resume.
+    params = {
+        'users': num_users,
+        'strains': int(len(strain_ids)),
+        'shard_users': shard_users,
+        'seed': seed,
+        'ratings_per_user': [min_ratings, max_ratings],
+        'rating_source': 'review_templates' if template_ratings is not None else 'default_distribution',
+        'inputs_digest': _inputs_digest(strain_ids, template_ratings),
+    }
+    if resume:
+        check_resume(output_dir, params)
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(params, f, indent=2)
+
+    tasks = []
+    for shard_index, first in enumerate(range(0, num_users, shard_users)):
+        tasks.append({
+            'shard_index': shard_index,
+            'first_user_id': first + 1,  # User ids are 1-based, as in the notebook
+            'num_users': min(shard_users, num_users - first),
+            'path': os.path.join(output_dir, f"part-{shard_index:05d}.parquet"),
+            'strain_ids': strain_ids,
+            'template_ratings': template_ratings,
+            'seed': seed,
+            'min_ratings': min_ratings,
+            'max_ratings': max_ratings,
+            'compression': compression,
+            'resume': resume,
+        })
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    results = []
+    try:
+        for result in (pool.map if pool else map)(_write_shard, tasks):
+            results.append(result)
+            logger.info(f"Shard {result['shard']} {'kept' if result['skipped'] else 'written'}: "
+                        f"{result['rows']:,} rows")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    manifest = {
+        **params,
+        'rows': int(sum(result['rows'] for result in results)),
+        'shards': len(tasks),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Generated {manifest['rows']:,} ratings for {num_users:,} users in {manifest['seconds']}s.")
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate sharded synthetic interaction data as Parquet.")
+    parser.add_argument("output_dir")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--total-ratings", type=int, default=DEFAULT_TOTAL_RATINGS,
+                      help="Approximate number of ratings; sets the user count from the mean ratings per user")
+    size.add_argument("--users", type=int, help="Exact number of users")
+    parser.add_argument("--min-ratings", type=int, default=MIN_RATINGS_PER_USER)
+    parser.add_argument("--max-ratings", type=int, default=MAX_RATINGS_PER_USER)
+    parser.add_argument("--strain-data", help="Strain CSV to draw strain ids from")
+    parser.add_argument("--num-strains", type=int, default=DEFAULT_NUM_STRAINS,
+                        help="Strain count when no strain CSV is given")
+    parser.add_argument("--review-templates", help="Review template CSV whose ratings set the rating mix")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shard-users", type=int, default=DEFAULT_SHARD_USERS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--resume", action="store_true", help="Keep shards that already exist; refuses if they were generated with other parameters")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    num_users = args.users or max(1, round(args.total_ratings / ((args.min_ratings + args.max_ratings) / 2)))
+    try:
+        manifest = generate_dataset(
+            args.output_dir, num_users, load_strain_ids(args.strain_data, args.num_strains),
+            load_template_ratings(args.review_templates), seed=args.seed, shard_users=args.shard_users,
+            workers=args.workers, min_ratings=args.min_ratings, max_ratings=args.max_ratings,
+            compression=args.compression, resume=args.resume,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+# traffic_replay.py
+#
+# Replays recorded production traffic against local builds of the API.
+#
+# A trace is rebuilt from the service log. Two formats are read, line by line:
+#
+#   * the text log written by app.py ("YYYY-MM-DD HH:MM:SS [LEVEL]: message"),
+#     where each request is recognised by the message its endpoint logs;
+#   * structured access-log lines (JSON objects with ts, method, path, body),
+#     written when ACCESS_LOG_FILE is set. --dump-trace writes this format too.
+#
+# Text logs do not record everything a request carried, so some fields are
+# filled in: passwords are REPLAY_PASSWORD, review ratings are
+# REPLAY_REVIEW_RATING, and recommendations logged inside a survey
+# submission are not replayed as separate requests.
+#
+# Every user in the trace gets an account on the target before the replay
+# starts, or it is created by the trace's own onboarding request. Logged
+# user ids are mapped to the ids the target assigns. Each user's requests
+# are sent in order, one at a time, like a client waiting for each response.
+# Different users run concurrently. Requests are sent at their logged times
+# divided by --speed, or as fast as possible with --speed 0.
+#
+# Reviews and feedback are applied by the event-stream workers after the
+# request returns (event_stream.py). After such a write, the next request
+# waits, outside its measured latency, until the target's /metrics/ shows
+# the stream drained, so reads see the same state as on a synchronous
+# build. --spawn starts a worker next to each instance; a --url target
+# needs its own `python event_stream.py work` running.
+#
+# The report gives latency percentiles per endpoint. With two targets, the
+# same trace is replayed against each (each should start from an empty
+# Redis) and responses are diffed after ignoring volatile fields.
+#
+#   python traffic_replay.py logs/deep_hybrid_recommender.log --url http://localhost:8000 --speed 10
+#   python traffic_replay.py logs/deep_hybrid_recommender.log --spawn . --spawn ../../baseline/backend --speed 0
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+from typing import Dict, Iterator, List, NamedTuple, Optional
+import numpy as np
+import httpx
+
+REPLAY_PASSWORD = "replay-password"
+REPLAY_REVIEW_RATING = 4.0
+# Response fields that legitimately differ between runs.
+VOLATILE_FIELDS = {"timestamp", "created_at", "updated_at", "last_login", "event_id", "date", "time", "seconds"}
+STARTUP_TIMEOUT = 120
+WRITE_BEHIND_PATHS = ("/review/", "/feedback/")  # Applied by event-stream workers, not in the request
+SETTLE_TIMEOUT = 60  # Seconds to wait for the workers to drain the stream
+
+LOG_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \[(\w+)\]: (.*)$")
+USER_PATH = re.compile(r"^/(recommend|feedbacks|notifications|profile|favorites)/(\d+)(.*)$")
+
+class TraceEvent(NamedTuple):
+    ts: float
+    method: str
+    path: str
+    body: Optional[dict]
+    user_id: Optional[int]  # Logged user id the request belongs to, if any
+
+    def to_json(self) -> str:
+        return json.dumps({"ts": self.ts, "method": self.method, "path": self.path, "body": self.body,
+                           "user_id": self.user_id})
+
+# ---------------------------
+# Trace Parsing
+# ---------------------------
+def _event_user(path: str, body: Optional[dict]) -> Optional[int]:
+    if isinstance(body, dict) and isinstance(body.get("user_id"), int):
+        return body["user_id"]
+    match = USER_PATH.match(path.split("?")[0])
+    return int(match.group(2)) if match else None
+
+def parse_structured_line(line: str) -> Optional[TraceEvent]:
+    record = json.loads(line)
+    if "method" not in record or "path" not in record:
+        return None
+    body = record.get("body")
+    user_id = record.get("user_id")
+    return TraceEvent(float(record["ts"]), record["method"].upper(), record["path"], body,
+                      user_id if user_id is not None else _event_user(record["path"], body))
+
+class TextLogParser:
+    """Turns app.py's text log messages back into requests."""
+
+    def __init__(self):
+        self.last_saved_user = None
+        self.survey_pending = set()  # Users whose survey request also logged a recommendation
+
+    def parse(self, ts: float, message: str) -> Optional[TraceEvent]:
+        match = re.match(r"User profile saved for user (\d+)", message)
+        if match:
+            self.last_saved_user = int(match.group(1))
+            return None
+
+        match = re.match(r"User (\S+) registered successfully with ID (\d+)\.", message)
+        if match:
+            return TraceEvent(ts, "POST", "/onboarding/", {"email": match.group(1), "password": REPLAY_PASSWORD},
+                              int(match.group(2)))
+
+        match = re.match(r"User (\S+) logged in successfully\.", message)
+        if match:
+            # Login saves the profile just before logging, which gives its user id.
+            return TraceEvent(ts, "POST", "/login/", {"email": match.group(1), "password": REPLAY_PASSWORD},
+                              self.last_saved_user)
+
+        if message.startswith("Received survey submission: "):
+            body = json.loads(message[len("Received survey submission: "):])
+            self.survey_pending.add(body["user_id"])
+            return TraceEvent(ts, "POST", "/submit_survey/", body, body["user_id"])
+
+        match = re.match(r"Generating recommendations for user (\d+)$", message)
+        if match:
+            user_id = int(match.group(1))
+            if user_id in self.survey_pending:
+                self.survey_pending.discard(user_id)
+                return None
+            return TraceEvent(ts, "GET", f"/recommend/{user_id}", None, user_id)
+
+        match = re.match(r"Strain '(.*)' added to favorites for user (\d+)\.", message)
+        if match:
+            user_id = int(match.group(2))
+            return TraceEvent(ts, "POST", "/favorites/", {"user_id": user_id, "strain_name": match.group(1)}, user_id)
+
+        match = re.match(r"Strain '(.*)' removed from favorites for user (\d+)\.", message)
+        if match:
+            user_id = int(match.group(2))
+            return TraceEvent(ts, "DELETE", "/favorites/", {"user_id": user_id, "strain_name": match.group(1)},
+                              user_id)
+
+        match = re.match(r"Review submitted for strain '(.*)' by user (\d+)\.", message)
+        if match:
+            user_id = int(match.group(2))
+            return TraceEvent(ts, "POST", "/review/", {"user_id": user_id, "strain_name": match.group(1),
+                                                       "rating": REPLAY_REVIEW_RATING}, user_id)
+
+        match = re.match(r"Feedback recorded for strain '(.*)' by user (\d+): (like|dislike)", message)
+        if match:
+            user_id = int(match.group(2))
+            return TraceEvent(ts, "POST", "/feedback/", {"user_id": user_id, "strain_id": match.group(1),
+                                                         "feedback_type": match.group(3)}, user_id)
+
+        simple = [
+            (r"Profile retrieved for user (\d+)\.", "/profile/{}"),
+            (r"Retrieving favorites for user (\d+)$", "/favorites/{}"),
+            (r"Retrieving feedbacks for user (\d+)$", "/feedbacks/{}"),
+            (r"Notifications retrieved for user (\d+)\.", "/notifications/{}"),
+        ]
+        for pattern, path in simple:
+            match = re.match(pattern, message)
+            if match:
+                return TraceEvent(ts, "GET", path.format(match.group(1)), None, int(match.group(1)))
+
+        match = re.match(r"Strain details fetched for strain '(.*)'$", message)
+        if match:
+            return TraceEvent(ts, "GET", f"/strain/{quote(match.group(1), safe='')}", None, None)
+        match = re.match(r"Feedback retrieved for strain '(.*)'$", message)
+        if match:
+            return TraceEvent(ts, "GET", f"/feedback/{quote(match.group(1), safe='')}", None, None)
+        match = re.match(r"Popular strains retrieved successfully for window '(\w+)'\.", message)
+        if match:
+            return TraceEvent(ts, "GET", f"/popular_strains/?window={match.group(1)}", None, None)
+        if message == "Strains list fetched successfully.":
+            return TraceEvent(ts, "GET", "/strains_list/", None, None)
+        if message == "Leaderboard retrieved successfully.":
+            return TraceEvent(ts, "GET", "/leaderboard/", None, None)
+        return None
+
+def parse_trace(paths: List[str]) -> List[TraceEvent]:
+    """Reads text and structured log lines from `paths` into a time-ordered trace."""
+    events = []
+    for path in paths:
+        parser = TextLogParser()
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("{"):
+                    event = parse_structured_line(line)
+                else:
+                    match = LOG_LINE.match(line)
+                    if not match:
+                        continue  # Traceback and other continuation lines
+                    ts = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+                    event = parser.parse(ts, match.group(3))
+                if event is not None:
+                    events.append(event)
+    return sorted(events, key=lambda event: event.ts)
+
+def endpoint_label(method: str, path: str) -> str:
+    """Groups paths by route, e.g. GET /profile/{user_id}."""
+    path = path.split("?")[0]
+    match = USER_PATH.match(path)
+    if match:
+        path = f"/{match.group(1)}/{{user_id}}{match.group(3)}"
+    path = re.sub(r"^/strain/[^/]+", "/strain/{name}", path)
+    path = re.sub(r"^/feedback/(?!$)[^/]+", "/feedback/{name}", path)
+    return f"{method} {path}"
+
+# ---------------------------
+# Replay
+# ---------------------------
+class ReplayResult(NamedTuple):
+    index: int
+    label: str
+    status: int
+    latency: float
+    body: Optional[str]
+
+class Replayer:
+    def __init__(self, base_url: str, speed: float = 1.0, concurrency: int = 16, timeout: float = 60.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url
+        self.transport = transport
+        self.speed = speed
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.user_map: Dict[int, int] = {}  # Logged user id -> id on the target
+        self.writes_published = 0  # Write-behind requests accepted by the target
+        self.writes_settled = 0  # Of those, how many the workers are known to have applied
+        self.write_behind: Optional[bool] = None  # Whether the target reports an event stream; None: unknown
+
+    def _remap(self, event: TraceEvent):
+        live_id = self.user_map.get(event.user_id, event.user_id)
+        path, body = event.path, event.body
+        match = USER_PATH.match(path)
+        if match and event.user_id is not None:
+            path = f"/{match.group(1)}/{live_id}{match.group(3)}"
+        if isinstance(body, dict) and "user_id" in body:
+            body = {**body, "user_id": live_id}
+        if event.path in ("/login/", "/onboarding/") and isinstance(body, dict):
+            body = {**body, "password": REPLAY_PASSWORD}
+        return path, body
+
+    async def _send(self, client: httpx.AsyncClient, index: int, event: TraceEvent) -> ReplayResult:
+        path, body = self._remap(event)
+        start = time.perf_counter()
+        try:
+            response = await client.request(event.method, path, json=body)
+            status, text = response.status_code, response.text
+        except httpx.HTTPError as e:
+            status, text = 0, f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start
+        if event.path in ("/onboarding/", "/login/") and event.user_id is not None and status in (200, 201):
+            self.user_map[event.user_id] = json.loads(text)["user"]["user_id"]
+        if event.method == "POST" and event.path in WRITE_BEHIND_PATHS and status == 200:
+            self.writes_published += 1
+        return ReplayResult(index, endpoint_label(event.method, event.path), status, latency, text)
+
+    async def _settle(self, client: httpx.AsyncClient):
+        """Waits until the target's event workers have applied every write-behind request sent so far."""
+        published = self.writes_published
+        if published == self.writes_settled or self.write_behind is False:
+            return
+        deadline = time.monotonic() + SETTLE_TIMEOUT
+        while True:
+            response = await client.get("/metrics/")
+            lag = response.json().get("event_stream") if response.status_code == 200 else None
+            if response.status_code == 404 or (response.status_code == 200 and lag is None):
+                self.write_behind = False  # Synchronous build: writes are applied in the request
+                return
+            if lag is not None and not (lag["pending"] or lag["lag"] or lag["lag_seconds"] != 0.0):
+                self.write_behind = True
+                self.writes_settled = max(self.writes_settled, published)
+                return
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"The target's event stream did not drain within {SETTLE_TIMEOUT}s "
+                                   f"(is `python event_stream.py work` running?): {lag}")
+            await asyncio.sleep(0.05)
+
+    async def _prepare_users(self, client: httpx.AsyncClient, events: List[TraceEvent]):
+        """Creates accounts for users who log in or act in the trace without onboarding in it."""
+        onboardings = [event for event in events if event.path == "/onboarding/"]
+        onboarded_emails = {event.body["email"] for event in onboardings}
+        accounts: Dict[str, Optional[int]] = {}  # Email -> logged user id, if known
+        for event in events:
+            if event.path == "/login/" and event.body["email"] not in onboarded_emails:
+                if accounts.get(event.body["email"]) is None:
+                    accounts[event.body["email"]] = event.user_id
+        users = {event.user_id for event in events if event.user_id is not None}
+        users -= {event.user_id for event in onboardings} | set(accounts.values())
+        accounts.update({f"replay-user-{user_id}@replay.invalid": user_id for user_id in users})
+
+        for email, user_id in sorted(accounts.items()):
+            response = await client.post("/onboarding/", json={"email": email, "password": REPLAY_PASSWORD})
+            if response.status_code != 201:
+                raise RuntimeError(f"Could not create replay user {email} (is the target's Redis empty?): "
+                                   f"{response.status_code} {response.text}")
+            if user_id is not None:
+                self.user_map[user_id] = response.json()["user"]["user_id"]
+
+    async def _run_session(self, client, session, start, first_ts, results, limit):
+        async with limit:
+            for index, event in session:
+                if self.speed > 0:
+                    delay = start + (event.ts - first_ts) / self.speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                if not (event.method == "POST" and event.path in WRITE_BEHIND_PATHS):
+                    await self._settle(client)
+                results[index] = await self._send(client, index, event)
+
+    async def run(self, events: List[TraceEvent]) -> dict:
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                     transport=self.transport) as client:
+            await self._prepare_users(client, events)
+            # One ordered session per user; requests without a user are independent.
+            sessions: Dict[object, list] = {}
+            for index, event in enumerate(events):
+                key = event.user_id if event.user_id is not None else ("anonymous", index)
+                sessions.setdefault(key, []).append((index, event))
+
+            results: List[Optional[ReplayResult]] = [None] * len(events)
+            limit = asyncio.Semaphore(self.concurrency if self.speed == 0 else len(sessions) or 1)
+            first_ts = events[0].ts if events else 0.0
+            start = time.perf_counter()
+            await asyncio.gather(*(self._run_session(client, session, start, first_ts, results, limit)
+                                   for session in sessions.values()))
+            elapsed = time.perf_counter() - start
+        return {"results": results, "seconds": elapsed, "user_map": dict(self.user_map)}
+
+def replay(base_url: str, events: List[TraceEvent], speed: float, concurrency: int) -> dict:
+    return asyncio.run(Replayer(base_url, speed, concurrency).run(events))
+
+# ---------------------------
+# Reporting
+# ---------------------------
+def latency_report(results: List[ReplayResult], seconds: float) -> dict:
+    """Per-endpoint request counts, error counts and latency percentiles in milliseconds."""
+    by_label: Dict[str, List[ReplayResult]] = {}
+    for result in results:
+        by_label.setdefault(result.label, []).append(result)
+    endpoints = {}
+    for label, group in sorted(by_label.items()):
+        latencies = np.array([result.latency for result in group]) * 1e3
+        endpoints[label] = {
+            "requests": len(group),
+            "errors": sum(1 for result in group if result.status == 0 or result.status >= 500),
+            "non_2xx": sum(1 for result in group if not 200 <= result.status < 300),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p90_ms": round(float(np.percentile(latencies, 90)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "max_ms": round(float(latencies.max()), 2),
+        }
+    latencies = np.array([result.latency for result in results]) * 1e3 if results else np.zeros(1)
+    return {
+        "requests": len(results),
+        "seconds": round(seconds, 2),
+        "requests_per_second": round(len(results) / seconds, 1) if seconds else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "endpoints": endpoints,
+    }
+
+def normalize_response(text: Optional[str], reverse_user_map: Dict[int, int]):
+    """Parsed response with volatile fields dropped and target user ids mapped back to logged ids."""
+    try:
+        value = json.loads(text) if text else text
+    except ValueError:
+        return text
+
+    def clean(node, key=None):
+        if isinstance(node, dict):
+            return {k: clean(v, k) for k, v in sorted(node.items()) if k not in VOLATILE_FIELDS}
+        if isinstance(node, list):
+            return [clean(item) for item in node]
+        if key == "user_id" and isinstance(node, int):
+            return reverse_user_map.get(node, node)
+        if isinstance(node, float):
+            return round(node, 4)
+        return node
+
+    return clean(value)
+
+def diff_runs(events: List[TraceEvent], run_a: dict, run_b: dict, max_examples: int = 10) -> dict:
+    """Requests whose status or normalized response differs between two runs."""
+    reverse_a = {live: logged for logged, live in run_a["user_map"].items()}
+    reverse_b = {live: logged for logged, live in run_b["user_map"].items()}
+    differences, examples = {}, []
+    for event, a, b in zip(events, run_a["results"], run_b["results"]):
+        body_a, body_b = normalize_response(a.body, reverse_a), normalize_response(b.body, reverse_b)
+        if a.status == b.status and body_a == body_b:
+            continue
+        differences[a.label] = differences.get(a.label, 0) + 1
+        if len(examples) < max_examples:
+            examples.append({"index": a.index, "request": f"{event.method} {event.path}",
+                             "status": [a.status, b.status], "a": body_a, "b": body_b})
+    return {"differing_requests": sum(differences.values()), "by_endpoint": differences, "examples": examples}
+
+# ---------------------------
+# Throwaway Instances
+# ---------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_until_ready(url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API process exited with code {process.returncode} before becoming ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"API at {url} did not become ready within {STARTUP_TIMEOUT}s")
+
+@contextmanager
+def spawn_instance(backend_dir: str) -> Iterator[str]:
+    """
+    Runs the API in `backend_dir` on a free port, backed by a fresh,
+    non-persistent redis-server, plus an event-stream worker if the build
+    has one.
+    """
+    redis_server = shutil.which("redis-server")
+    if redis_server is None:
+        raise RuntimeError("redis-server is required to spawn instances; use --url for running ones")
+    redis_port, api_port = _free_port(), _free_port()
+    redis_process = subprocess.Popen([redis_server, "--port", str(redis_port), "--save", "", "--appendonly", "no"],
+                                     stdout=subprocess.DEVNULL)
+    env = {key: value for key, value in os.environ.items() if key not in ("REDIS_NODES", "REDIS_GLOBAL_NODE")}
+    env.update(REDIS_HOST="127.0.0.1", REDIS_PORT=str(redis_port))
+    processes = [redis_process]
+    if os.path.exists(os.path.join(backend_dir, "event_stream.py")):
+        processes.append(subprocess.Popen(
+            [sys.executable, "event_stream.py", "--host", "127.0.0.1", "--port", str(redis_port), "work"],
+            cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    api_process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(api_port)],
+                                   cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    processes.insert(0, api_process)
+    try:
+        url = f"http://127.0.0.1:{api_port}"
+        _wait_until_ready(url + "/", api_process)
+        yield url
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged traffic against one or two API builds.")
+    parser.add_argument("logs", nargs="+", help="Text or structured (JSON lines) service logs")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", action="append", help="Running instance with an empty Redis (give twice to compare)")
+    target.add_argument("--spawn", action="append", metavar="BACKEND_DIR",
+                        help="Build to start with a throwaway Redis (give twice to compare)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale: 1 = as logged, 10 = 10x, 0 = no waits")
+    parser.add_argument("--concurrency", type=int, default=16, help="Users replayed at once with --speed 0")
+    parser.add_argument("--dump-trace", help="Write the parsed trace as JSON lines and exit")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    events = parse_trace(args.logs)
+    print(f"Parsed {len(events)} requests from {len(args.logs)} log file(s).")
+    if args.dump_trace:
+        with open(args.dump_trace, "w") as f:
+            f.writelines(event.to_json() + "\n" for event in events)
+        return
+    targets = args.url or args.spawn
+    if not targets or len(targets) > 2:
+        parser.error("give one or two targets with --url or --spawn")
+
+    runs = []
+    try:
+        for target_ in targets:
+            if args.spawn:
+                with spawn_instance(os.path.abspath(target_)) as url:
+                    runs.append(replay(url, events, args.speed, args.concurrency))
+            else:
+                runs.append(replay(target_, events, args.speed, args.concurrency))
+    except RuntimeError as e:
+        raise SystemExit(f"Replay failed: {e}")
+
+    report = {"targets": targets, "speed": args.speed,
+              "latency": [latency_report(run["results"], run["seconds"]) for run in runs]}
+    if len(runs) == 2:
+        report["diff"] = diff_runs(events, runs[0], runs[1])
+
+    for target_, latency in zip(targets, report["latency"]):
+        print(f"\n{target_}: {latency['requests']} requests in {latency['seconds']}s "
+              f"({latency['requests_per_second']} req/s), p50 {latency['p50_ms']} ms, p99 {latency['p99_ms']} ms")
+        print(f"  {'endpoint':<34} {'n':>5} {'err':>4} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+        for label, stats in latency["endpoints"].items():
+            print(f"  {label:<34} {stats['requests']:>5} {stats['errors']:>4} {stats['p50_ms']:>9} "
+                  f"{stats['p90_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}")
+    if "diff" in report:
+        print(f"\nResponses differing between builds: {report['diff']['differing_requests']} "
+              f"{report['diff']['by_endpoint']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# trending.py
+
+import logging
+import time
+from typing import List, Optional, Tuple
+
+# ---------------------------
+# Windows and Buckets
+# ---------------------------
+HOUR = 3600
+DAY = 24 * HOUR
+
+# window name -> (bucket size, number of buckets, decay half-life, cache ttl), all in seconds
+TRENDING_WINDOWS = {
+    "24h": (HOUR, 24, 6 * HOUR, 60),
+    "7d": (DAY, 7, 2 * DAY, 300),
+    "30d": (DAY, 30, 7 * DAY, 900),
+}
+
+# Buckets are kept one period longer than the longest window that reads them.
+BUCKET_RETENTION = {
+    HOUR: 25 * HOUR,
+    DAY: 31 * DAY,
+}
+
+ALL_TIME_KEY = 'strain_popularity'
+TRENDING_CACHE_SIZE = 100  # Entries kept in each cached trending view
+REBUILD_LOCK_MS = 5000  # One rebuild per window at a time; expires if the builder dies
+REBUILD_WAIT_SECONDS = 1.0  # How long other readers wait for that rebuild
+
+def bucket_key(bucket_size: int, bucket_start: int) -> str:
+    prefix = "h" if bucket_size == HOUR else "d"
+    return f"strain_popularity_{prefix}_{bucket_start}"
+
+def trending_cache_key(window: str) -> str:
+    return f"strain_trending_{window}"
+
+def trending_built_key(window: str) -> str:
+    # Marks a fresh view even when it is empty (an empty ZUNIONSTORE leaves no key).
+    return f"strain_trending_{window}_built"
+
+def trending_lock_key(window: str) -> str:
+    return f"strain_trending_{window}_lock"
+
+# ---------------------------
+# Trending Strains
+# ---------------------------
+class TrendingStrains:
+    """
+    Time-windowed strain popularity.
+
+    Each like bumps the all-time `strain_popularity` set plus one hourly and
+    one daily bucket set that expire after their retention period, so memory
+    is bounded by the longest window. A trending view is the ZUNIONSTORE of
+    the window's buckets weighted by exponential decay on bucket age, cached
+    under one key for a short ttl so reads are a single ZREVRANGE. When the
+    cache expires, one reader rebuilds it under a short SET NX lock and the
+    others wait for that result.
+    """
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def record_like(self, strain_name: str, amount: float = 1, timestamp: Optional[float] = None, pipe=None):
+        """
+        Counts a like for `strain_name` in the all-time set and the time bucket of `timestamp`.
+
+        When `pipe` is given the commands are queued on it (e.g. inside a
+        caller's MULTI) and the caller is responsible for executing it.
+        """
+        now = int(timestamp if timestamp is not None else time.time())
+        own_pipe = pipe is None
+        if own_pipe:
+            pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zincrby(ALL_TIME_KEY, amount, strain_name)
+        for bucket_size, retention in BUCKET_RETENTION.items():
+            bucket_start = now - now % bucket_size
+            key = bucket_key(bucket_size, bucket_start)
+            pipe.zincrby(key, amount, strain_name)
+            # Expire relative to the bucket, so replayed old events do not extend retention.
+            pipe.expireat(key, bucket_start + retention)
+        if own_pipe:
+            pipe.execute()
+
+    def top(self, window: str = "all", count: int = 10) -> List[Tuple[str, float]]:
+        """Returns the top `count` (strain_name, score) pairs for a window, building the cached view if needed."""
+        if window == "all":
+            return self.redis_client.zrevrange(ALL_TIME_KEY, 0, count - 1, withscores=True)
+        if window not in TRENDING_WINDOWS:
+            raise ValueError(f"Unknown trending window: {window}")
+
+        top_strains, built = self._read_view(window, count)
+        if built:
+            return top_strains
+
+        lock_key = trending_lock_key(window)
+        if self.redis_client.set(lock_key, 1, nx=True, px=REBUILD_LOCK_MS):
+            try:
+                self.rebuild(window)
+            finally:
+                self.redis_client.delete(lock_key)
+        else:
+            deadline = time.monotonic() + REBUILD_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                top_strains, built = self._read_view(window, count)
+                if built:
+                    return top_strains
+        return self._read_view(window, count)[0]
+
+    def _read_view(self, window: str, count: int):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrevrange(trending_cache_key(window), 0, count - 1, withscores=True)
+        pipe.exists(trending_built_key(window))
+        top_strains, built = pipe.execute()
+        return top_strains, bool(built)
+
+    def rebuild(self, window: str, timestamp: Optional[float] = None):
+        """Recomputes the cached decayed view for `window` from its buckets."""
+        bucket_size, num_buckets, half_life, cache_ttl = TRENDING_WINDOWS[window]
+        now = int(timestamp if timestamp is not None else time.time())
+        current_bucket = now - now % bucket_size
+
+        weights = {}
+        for age in range(num_buckets):
+            bucket_start = current_bucket - age * bucket_size
+            # Decay from the bucket midpoint so the current partial bucket is not over-weighted.
+            age_seconds = max(now - (bucket_start + bucket_size / 2), 0)
+            weights[bucket_key(bucket_size, bucket_start)] = 0.5 ** (age_seconds / half_life)
+
+        cache_key = trending_cache_key(window)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.zunionstore(cache_key, weights)
+        pipe.zremrangebyrank(cache_key, 0, -(TRENDING_CACHE_SIZE + 1))
+        pipe.expire(cache_key, cache_ttl)
+        pipe.set(trending_built_key(window), 1, ex=cache_ttl)
+        pipe.execute()
+        logging.info(f"Rebuilt trending view '{window}' from {num_buckets} bucket(s).")